@@ -0,0 +1,583 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_SCRIPT = os.path.join(SCRIPT_DIR, "build_dcc.py")
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_TOLERANCE = 20.0  # percent
+
+# Synthetic workloads; every value can be overridden on the command line
+SCENARIOS = {
+    # Many projects with dependency chains: graph scheduling and per-step overhead
+    "wide": {"projects": 300, "compilers": 1, "platforms": 1, "openssl_versions": 2, "test_ratio": 0.4,
+             "matrix_ratio": 0.1, "deps": 3, "build_sleep": 0.02, "test_sleep": 0.02, "cpu_ms": 0,
+             "output_lines": 20, "tests": 20, "jobs": 1, "project_jobs": 8, "matrix_jobs": 2},
+    # Few projects over many targets and OpenSSL versions: target and matrix parallelism
+    "matrix": {"projects": 30, "compilers": 3, "platforms": 2, "openssl_versions": 8, "test_ratio": 0.5,
+               "matrix_ratio": 1.0, "deps": 2, "build_sleep": 0.05, "test_sleep": 0.05, "cpu_ms": 0,
+               "output_lines": 20, "tests": 50, "jobs": 3, "project_jobs": 4, "matrix_jobs": 4},
+    # Chatty compilers and tests: output streaming, scanning and step logs
+    "output": {"projects": 20, "compilers": 1, "platforms": 2, "openssl_versions": 2, "test_ratio": 0.5,
+               "matrix_ratio": 0.5, "deps": 2, "build_sleep": 0.05, "test_sleep": 0.05, "cpu_ms": 20,
+               "output_lines": 20000, "tests": 500, "jobs": 2, "project_jobs": 4, "matrix_jobs": 2},
+}
+PLATFORM_NAMES = ["Win64", "Win32", "Win64x", "Linux64", "OSX64", "Android64"]
+STEP_JITTER = 0.5  # stand-in durations vary by +-50% per step, the same in every run
+
+# Reported metrics: (key, label, unit, lower is better, smallest change that counts)
+METRICS = [
+    ("wall_s", "Wall time", "s", True, 0.5),
+    ("work_s", "Stand-in work", "s", True, 0.5),
+    ("critical_path_s", "Critical path", "s", True, 0.5),
+    ("efficiency", "Critical path / wall", "", False, 0.05),
+    ("parallelism", "Work / wall", "", False, 0.2),
+    ("overhead_s", "Orchestrator only", "s", True, 0.5),
+    ("startup_s", "  before first step", "s", True, 0.2),
+    ("teardown_s", "  after last step", "s", True, 0.2),
+    ("step_overhead_ms", "Overhead per step", "ms", True, 5.0),
+    ("orchestrator_cpu_s", "Orchestrator CPU", "s", True, 0.5),
+    ("peak_rss_mb", "Peak RSS", "MB", True, 10.0),
+    ("log_mb", "Step logs", "MB", True, 1.0),
+    ("log_mb_per_s", "Log throughput", "MB/s", False, 0.5),
+]
+
+# ==============================================================================
+# UTILITIES
+# ==============================================================================
+def log(msg, level="INFO"):
+    print(f"[{level}] {msg}", flush=True)
+
+def step_factor(*key):
+    """Deterministic duration factor of one step, so runs stay comparable."""
+    return 1 + random.Random("|".join(str(k) for k in key)).uniform(-STEP_JITTER, STEP_JITTER)
+
+def write_script(path, lines):
+    with open(path, "w", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+    os.chmod(path, 0o755)
+
+def stand_in_script(path, call):
+    # -S: no site import, the stand-ins should start as fast as the interpreter allows
+    write_script(path, [
+        f"#!{sys.executable} -S",
+        "import sys",
+        f"sys.path.insert(0, {SCRIPT_DIR!r})",
+        "import bench_dcc",
+        f"sys.exit(bench_dcc.{call})",
+    ])
+
+# ==============================================================================
+# STAND-INS
+# ==============================================================================
+# Run by the generated 'msbuild' and '<project>.exe' scripts. Every step appends
+# one JSON line to the events file: its kind, key, start/end and own CPU time.
+def simulate_step(settings, kind, sleep, lines, **key):
+    import resource
+    start = time.time()
+    if settings["cpu_ms"]:
+        deadline = time.perf_counter() + settings["cpu_ms"] / 1000.0
+        while time.perf_counter() < deadline:
+            pass
+    out = sys.stdout
+    written = 0
+    for i in range(lines):
+        if i % 10 == 9:
+            line = f"Unit{i}.pas({i}): warning W1000: Symbol 'Bench{i}' is deprecated [{key.get('project')}]\n"
+        else:
+            line = f"  Compiling Unit{i}.pas ({i + 1}/{lines}) {'.' * 40}\n"
+        out.write(line)
+        written += len(line)
+    out.flush()
+    time.sleep(sleep)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    event = dict(key, kind=kind, start=start, end=time.time(), cpu=usage.ru_utime + usage.ru_stime, bytes=written)
+    fd = os.open(settings["events"], os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(fd, (json.dumps(event) + "\n").encode("utf-8"))
+    finally:
+        os.close(fd)
+
+def load_settings(settings_path):
+    with open(settings_path, "r") as f:
+        return json.load(f)
+
+def standin_msbuild(settings_path, argv):
+    """Fake MSBuild: one project per call, or all projects of a traversal project (--batch)."""
+    settings = load_settings(settings_path)
+    project = next(a for a in argv if not a.startswith("/"))
+    props = {}
+    for arg in argv:
+        if arg.startswith("/p:"):
+            name, _, value = arg[3:].partition("=")
+            props[name] = value
+    if project.endswith(".proj"):
+        return batch_build(settings, project, argv, props)
+    return build_one(settings, project, props)
+
+def build_one(settings, project, props):
+    stem = os.path.splitext(os.path.basename(project))[0]
+    compiler = os.environ.get("BENCH_COMPILER", "")
+    info = settings["projects"][stem]
+    simulate_step(settings, "build", settings["build_sleep"] * step_factor("build", stem, compiler, props["Platform"]),
+                  settings["output_lines"], compiler=compiler, platform=props["Platform"], project=stem)
+    out_dir = props["DCC_ExeOutput"]
+    os.makedirs(out_dir, exist_ok=True)
+    dcu_dir = props.get("DCC_DcuOutput")
+    if dcu_dir:
+        os.makedirs(dcu_dir, exist_ok=True)
+        with open(os.path.join(dcu_dir, stem + ".dcu"), "w") as f:
+            f.write(stem)
+    if info["type"] == "test":
+        call = (f"standin_test({settings['settings_path']!r}, "
+                f"{compiler!r}, {props['Platform']!r}, {stem!r}, sys.argv[1:])")
+        stand_in_script(os.path.join(out_dir, stem + ".exe"), call)
+    else:
+        with open(os.path.join(out_dir, stem + ".bpl"), "w") as f:
+            f.write(stem)
+    return 0
+
+def batch_build(settings, proj_path, argv, props):
+    """Builds the waves of a traversal project in order, each wave on /m:N threads."""
+    import xml.etree.ElementTree as ET
+    from concurrent.futures import ThreadPoolExecutor
+    ns = {"m": "http://schemas.microsoft.com/developer/msbuild/2003"}
+    props["MSBuildThisFileDirectory"] = os.path.dirname(os.path.abspath(proj_path)) + os.sep
+    nodes = next((int(a[3:]) for a in argv if a.startswith("/m:")), 1)
+    file_log = next(a[5:] for a in argv if a.startswith("/flp:")).split(";")[0].partition("=")[2]
+
+    def expand(value):
+        value = re.sub(r"%([0-9A-Fa-f]{2})", lambda m: chr(int(m.group(1), 16)), value or "")
+        for _ in range(3):
+            value = re.sub(r"\$\((\w+)\)", lambda m: props.get(m.group(1), ""), value)
+        return value
+
+    root = ET.parse(proj_path).getroot()
+    for group in root.findall("m:PropertyGroup", ns):
+        for elem in group:
+            props[elem.tag.split("}")[1]] = elem.text or ""
+    common = dict(p.partition("=")[::2] for p in expand(props["BatchProperties"]).split(";"))
+    waves = []
+    for group in root.findall("m:ItemGroup", ns):
+        waves.append([(expand(item.get("Include")),
+                       dict(p.partition("=")[::2] for p in expand(item.findtext("m:AdditionalProperties", "", ns)).split(";")))
+                      for item in group])
+
+    with open(file_log, "w") as lf:
+        def stamp():
+            now = time.time()
+            return time.strftime("%H:%M:%S", time.localtime(now)) + f".{int(now % 1 * 1000):03d}"
+
+        def build(item):
+            path, extra = item
+            lf.write(f'{stamp()}   1>Project "{proj_path}" (1) is building "{path}" (2) on node 1 (Build target(s)).\n')
+            build_one(settings, path, dict(common, **extra))
+            lf.write(f'{stamp()}   2>Done Building Project "{path}" (Build target(s)).\n')
+
+        for wave in waves:
+            with ThreadPoolExecutor(max_workers=max(1, nodes)) as pool:
+                list(pool.map(build, wave))
+    print("Build succeeded.")
+    return 0
+
+def standin_test(settings_path, compiler, platform_name, project, argv):
+    """Fake DUnitX test executable: writes the '-xml' results of settings["tests"] passing tests."""
+    settings = load_settings(settings_path)
+    if argv == ["--calibrate"]:
+        print(time.time())
+        return 0
+    # -osp:<root>/lib/openssl/<version>/<platform>
+    version = next((os.path.basename(os.path.dirname(a[5:])) for a in argv if a.startswith("-osp:")), "")
+    xml_path = next((a[5:] for a in argv if a.startswith("-xml:")), None)
+    simulate_step(settings, "test", settings["test_sleep"] * step_factor("test", project, compiler, platform_name, version),
+                  settings["output_lines"], compiler=compiler, platform=platform_name, project=project, version=version)
+    if xml_path:
+        tests = settings["tests"]
+        fixtures = max(1, tests // 10)
+        with open(xml_path, "w") as f:
+            f.write(f'<?xml version="1.0"?>\n<test-results name="{project}" total="{tests}">\n'
+                    f'<test-suite type="Assembly" name="{project}"><results>\n')
+            for fx in range(fixtures):
+                f.write(f'<test-suite type="TestFixture" name="{project}.TFixture{fx}"><results>\n')
+                for i in range(fx, tests, fixtures):
+                    f.write(f'<test-case name="{project}.TFixture{fx}.Test{i}" executed="True" '
+                            f'result="Success" success="True" time="0.001"/>\n')
+                f.write("</results></test-suite>\n")
+            f.write("</results></test-suite>\n</test-results>\n")
+    print(f"Tests Found   : {settings['tests']}\nTests Failed  : 0")
+    return 0
+
+# ==============================================================================
+# SYNTHETIC REPOSITORY
+# ==============================================================================
+def generate_repo(work_dir, params, seed=0):
+    """
+    Writes a synthetic repository with its build_dcc config, stand-in tools and
+    settings into 'work_dir'. Returns (config path, settings).
+    """
+    rng = random.Random(seed)
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "Source"), exist_ok=True)
+    with open(os.path.join(work_dir, "Source", "BenchCommon.pas"), "w") as f:
+        f.write("unit BenchCommon;\n\ninterface\n\nimplementation\n\nend.\n")
+
+    projects = []
+    libraries = []
+    for i in range(params["projects"]):
+        name = f"P{i:04d}"
+        is_test = rng.random() < params["test_ratio"]
+        deps = rng.sample(libraries, min(len(libraries), rng.randint(0, params["deps"])))
+        proj_dir = os.path.join(work_dir, "Projects", name)
+        os.makedirs(proj_dir, exist_ok=True)
+        with open(os.path.join(proj_dir, f"{name}.dproj"), "w") as f:
+            f.write(f"<Project><!-- {name} --></Project>\n")
+        with open(os.path.join(proj_dir, f"{name}.dpr"), "w") as f:
+            f.write(f"program {name};\n\nuses BenchCommon;\n\nbegin\nend.\n")
+        project = {"name": name, "path": f"Projects/{name}/{name}.dproj", "depends_on": deps, "env_vars": {}}
+        if is_test:
+            project["type"] = "test"
+            project["matrix"] = rng.random() < params["matrix_ratio"]
+        else:
+            project["type"] = "package"
+            libraries.append(name)
+        projects.append(project)
+
+    # Stand-in OpenSSL libraries of every matrix leg, as setup_libs.py lays them out
+    # (imported here: the stand-ins import this module and should start fast)
+    import setup_libs
+    platforms = PLATFORM_NAMES[:params["platforms"]]
+    versions = [f"3.{v}.0" for v in range(params["openssl_versions"])]
+    openssl_dir = os.path.join(work_dir, "lib", "openssl")
+    for version in versions:
+        for platform_name in platforms:
+            leg_dir = os.path.join(openssl_dir, version, platform_name)
+            os.makedirs(leg_dir, exist_ok=True)
+            for lib in ("libcrypto-3.dll", "libssl-3.dll"):
+                with open(os.path.join(leg_dir, lib), "wb") as f:
+                    f.write(b"MZ")
+            with open(os.path.join(leg_dir, "version.txt"), "w") as f:
+                f.write(version + "\n")
+    setup_libs.write_index(openssl_dir)
+
+    compilers = [f"{20 + i}.0" for i in range(params["compilers"])]
+    dcc = {}
+    for comp_id in compilers:
+        rsvars = os.path.join(bin_dir, f"rsvars_{comp_id}.sh")
+        write_script(rsvars, [
+            "#!/bin/sh",
+            f"export BENCH_COMPILER={comp_id}",
+            f'export PATH="{bin_dir}:$PATH"',
+        ])
+        dcc[comp_id] = {"path": rsvars, "active": True, "variables": {}}
+
+    settings_path = os.path.join(work_dir, "bench_settings.json")
+    settings = {
+        "settings_path": settings_path,
+        "events": os.path.join(work_dir, "events.jsonl"),
+        "projects": {p["name"]: {"type": p["type"]} for p in projects},
+    }
+    for key in ("build_sleep", "test_sleep", "cpu_ms", "output_lines", "tests"):
+        settings[key] = params[key]
+    with open(settings_path, "w") as f:
+        json.dump(settings, f)
+    stand_in_script(os.path.join(bin_dir, "msbuild"), f"standin_msbuild({settings_path!r}, sys.argv[1:])")
+
+    cfg = {
+        "root": ".",
+        "output_root": "_build",
+        "default_config": "Debug",
+        "default_compilers": compilers,
+        "dcc": dcc,
+        "platforms": platforms,
+        "jobs": params["jobs"],
+        "project_jobs": params["project_jobs"],
+        "matrix_jobs": params["matrix_jobs"],
+        "build_cache": {"enabled": True, "dir": "", "inputs": ["Source"]},
+        "build_options": {"common": {"env_vars": {}, "defines": ["CI", "UNITTEST"], "search_paths": []}},
+        "dependencies": {
+            "openssl_root": "lib/openssl/{version}/{platform}",
+            "openssl_versions": versions,
+        },
+        "common_params": {"-xml": "{output_dir}/{project_name}_results.xml"},
+        "projects": projects,
+    }
+    config_path = os.path.join(work_dir, "bench_config.json")
+    with open(config_path, "w") as f:
+        json.dump(cfg, f, indent=2)
+    return config_path, settings, cfg
+
+def calibrate_startup(settings, samples=5):
+    """Median seconds from spawning a stand-in until its step starts (interpreter startup)."""
+    script = os.path.join(os.path.dirname(settings["settings_path"]), "bin", "calibrate.exe")
+    stand_in_script(script, f"standin_test({settings['settings_path']!r}, '', '', 'calibrate', sys.argv[1:])")
+    delays = []
+    for _ in range(samples):
+        spawned = time.time()
+        out = subprocess.run([script, "--calibrate"], stdout=subprocess.PIPE, universal_newlines=True).stdout
+        delays.append(float(out.strip()) - spawned)
+    return statistics.median(delays)
+
+# ==============================================================================
+# MEASUREMENT
+# ==============================================================================
+def load_events(path):
+    events = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    return events
+
+def busy_time(events):
+    """Seconds in which at least one stand-in step was running."""
+    total = 0.0
+    current_start = current_end = None
+    for e in sorted(events, key=lambda e: e["start"]):
+        if current_end is None or e["start"] > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = e["start"], e["end"]
+        else:
+            current_end = max(current_end, e["end"])
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+def critical_path(events, cfg):
+    """
+    Longest chain of dependent steps by their measured durations: builds wait
+    for the builds of 'depends_on', test legs for the build of their project.
+    This is the wall time with unlimited workers and no orchestrator overhead.
+    """
+    depends = {p["name"]: p.get("depends_on", []) for p in cfg["projects"]}
+    builds = {(e["compiler"], e["platform"], e["project"]): e["end"] - e["start"] for e in events if e["kind"] == "build"}
+    finished = {}
+
+    def finish(key):
+        if key not in finished:
+            compiler, platform_name, project = key
+            ready = max((finish((compiler, platform_name, d)) for d in depends.get(project, [])
+                         if (compiler, platform_name, d) in builds), default=0.0)
+            finished[key] = ready + builds[key]
+        return finished[key]
+
+    longest = max((finish(key) for key in builds), default=0.0)
+    for e in events:
+        if e["kind"] == "test":
+            key = (e["compiler"], e["platform"], e["project"])
+            longest = max(longest, finish(key) + e["end"] - e["start"] if key in builds else 0.0)
+    return longest
+
+def trace_step_time(output_root):
+    """Summed duration and count of the build and test spans in the run trace."""
+    for name in os.listdir(output_root):
+        path = os.path.join(output_root, name, "trace.json")
+        if not name.startswith("_") and os.path.exists(path):
+            with open(path, "r") as f:
+                spans = [e for e in json.load(f)["traceEvents"] if e.get("ph") == "X" and e.get("cat") in ("build", "test")]
+            return sum(e["dur"] for e in spans) / 1e6, len(spans)
+    return None, 0
+
+def check_matrix_legs(events, cfg):
+    """
+    Raises when a matrix project was built for a Windows target but not tested
+    with every OpenSSL version, e.g. because the preflight skipped its legs.
+    """
+    versions = cfg["dependencies"]["openssl_versions"]
+    matrix = {p["name"] for p in cfg["projects"] if p.get("type") == "test" and p.get("matrix")}
+    built = {(e["compiler"], e["platform"], e["project"]) for e in events
+             if e["kind"] == "build" and e["project"] in matrix and "Win" in e["platform"]}
+    ran = {(e["compiler"], e["platform"], e["project"], e["version"]) for e in events if e["kind"] == "test"}
+    missing = [key + (version,) for key in sorted(built) for version in versions if key + (version,) not in ran]
+    if missing:
+        raise RuntimeError(f"{len(missing)} matrix leg(s) did not run, e.g. "
+                           f"{' '.join(missing[0][2:])} on {missing[0][0]} {missing[0][1]}")
+
+def folder_size(path, suffix):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, n)) for n in filenames if n.endswith(suffix))
+    return total
+
+def run_once(work_dir, config_path, settings, cfg, extra_args, startup):
+    """Runs build_dcc.py once on the synthetic repository and measures it."""
+    output_root = os.path.join(work_dir, "_build")
+    shutil.rmtree(output_root, ignore_errors=True)
+    if os.path.exists(settings["events"]):
+        os.remove(settings["events"])
+
+    cmd = [sys.executable, BUILD_SCRIPT, "--config", config_path] + list(extra_args)
+    log_path = os.path.join(work_dir, "orchestrator.log")
+    with open(log_path, "w") as out:
+        started = time.time()
+        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT, cwd=work_dir)
+        # wait4() also reports the CPU time and peak RSS of the reaped stand-ins
+        _, status, usage = os.wait4(proc.pid, 0)
+        ended = time.time()
+        proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+    if proc.returncode != 0:
+        with open(log_path, "r", errors="replace") as f:
+            tail = f.readlines()[-20:]
+        raise RuntimeError(f"build_dcc.py exited with {proc.returncode}, see {log_path}:\n" + "".join(tail))
+
+    events = load_events(settings["events"])
+    check_matrix_legs(events, cfg)
+    wall = ended - started
+    work = sum(e["end"] - e["start"] for e in events)
+    busy = busy_time(events)
+    path = critical_path(events, cfg)
+    span_time, spans = trace_step_time(output_root)
+    step_overhead = None
+    if span_time is not None and spans:
+        # Per spawned step: span time not spent inside the stand-in, minus the stand-in's own startup
+        step_overhead = max(0.0, (span_time - work) / len(events) - startup) if events else None
+    rss_scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    log_bytes = folder_size(output_root, ".log")
+    return {
+        "wall_s": wall,
+        "work_s": work,
+        "critical_path_s": path,
+        "efficiency": path / wall if wall else 0.0,
+        "parallelism": work / wall if wall else 0.0,
+        "overhead_s": wall - busy,
+        "startup_s": (min(e["start"] for e in events) - started) if events else wall,
+        "teardown_s": (ended - max(e["end"] for e in events)) if events else 0.0,
+        "step_overhead_ms": step_overhead * 1000 if step_overhead is not None else None,
+        "orchestrator_cpu_s": usage.ru_utime + usage.ru_stime - sum(e["cpu"] for e in events),
+        "peak_rss_mb": usage.ru_maxrss / rss_scale,
+        "log_mb": log_bytes / 2**20,
+        "log_mb_per_s": log_bytes / 2**20 / wall if wall else 0.0,
+        "steps": len(events),
+    }
+
+def run_scenario(name, params, work_root, extra_args, repeat):
+    work_dir = os.path.join(work_root, name)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    config_path, settings, cfg = generate_repo(work_dir, params)
+    startup = calibrate_startup(settings)
+    log(f"Scenario '{name}': {params['projects']} projects x {params['compilers']} compilers x "
+        f"{params['platforms']} platforms, {params['openssl_versions']} OpenSSL versions "
+        f"(stand-in startup {startup * 1000:.0f} ms)")
+    runs = []
+    for i in range(repeat):
+        metrics = run_once(work_dir, config_path, settings, cfg, extra_args, startup)
+        log(f"  run {i + 1}/{repeat}: {metrics['wall_s']:.2f}s wall, {metrics['steps']} steps")
+        runs.append(metrics)
+    # Median of every metric over the repetitions
+    return {key: statistics.median(r[key] for r in runs) if all(r[key] is not None for r in runs) else None
+            for key in runs[0]}
+
+# ==============================================================================
+# BASELINE
+# ==============================================================================
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {"scenarios": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_baseline(path, baseline, results):
+    baseline["machine"] = {"node": platform.node(), "python": platform.python_version(), "os": platform.platform()}
+    baseline["saved"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    baseline.setdefault("scenarios", {}).update(results)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+def compare(metrics, base, tolerance):
+    """Returns [(metric key, change percent)] of the metrics worse than 'base' by more than 'tolerance'."""
+    regressions = []
+    for key, _, _, lower_better, min_delta in METRICS:
+        value, ref = metrics.get(key), base.get(key)
+        if value is None or ref is None or ref == 0:
+            continue
+        delta = value - ref if lower_better else ref - value
+        change = delta / abs(ref) * 100
+        if change > tolerance and delta >= min_delta:
+            regressions.append((key, change))
+    return regressions
+
+def print_report(name, metrics, base):
+    print(f"\n{name}:")
+    print(f"  {'METRIC':<24} {'VALUE':>14} {'BASELINE':>10} {'CHANGE':>8}")
+    for key, label, unit, _, _ in METRICS:
+        value = metrics.get(key)
+        if value is None:
+            continue
+        ref = (base or {}).get(key)
+        ref_text = f"{ref:.2f}" if ref is not None else "-"
+        change = f"{(value - ref) / abs(ref) * 100:+.0f}%" if ref else ""
+        print(f"  {label:<24} {value:>9.2f} {unit:<4} {ref_text:>10} {change:>8}")
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks build_dcc.py on synthetic projects with stand-in compilers and test executables. "
+                    "Unknown arguments are passed on to build_dcc.py (e.g. --batch, --pipeline).")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run, repeatable (Default: all)")
+    for key, value in SCENARIOS["wide"].items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), help=f"Override the scenario's '{key}'")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the median of each metric is reported")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"Baseline JSON file (Default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline of the scenarios")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, metavar="PERCENT",
+                        help=f"Change against the baseline reported as a regression (Default: {DEFAULT_TOLERANCE:.0f})")
+    parser.add_argument("--work-dir", help="Folder of the synthetic repositories (Default: a temp folder)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic repositories and their build output")
+    args, extra_args = parser.parse_known_args()
+
+    if os.name == "nt":
+        # The stand-in test executables are scripts, which Windows cannot start as '<project>.exe'
+        log("The benchmark needs a POSIX system (Linux, macOS or WSL)", "ERROR")
+        sys.exit(1)
+
+    work_root = os.path.abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix="bench_dcc_")
+    baseline = load_baseline(args.baseline)
+    results = {}
+    failed = []
+    try:
+        for name in args.scenario or sorted(SCENARIOS):
+            params = dict(SCENARIOS[name])
+            for key in params:
+                if getattr(args, key) is not None:
+                    params[key] = getattr(args, key)
+            metrics = run_scenario(name, params, work_root, extra_args, max(1, args.repeat))
+            results[name] = {"params": params, "build_args": extra_args, "metrics": metrics}
+
+            base = baseline.get("scenarios", {}).get(name)
+            if base and (base["params"] != params or base.get("build_args", []) != extra_args):
+                log(f"Baseline of '{name}' was recorded with other parameters, not compared", "WARN")
+                base = None
+            print_report(name, metrics, base and base["metrics"])
+            for key, change in compare(metrics, base["metrics"], args.tolerance) if base else []:
+                failed.append(f"{name}: {key} {change:+.0f}%")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+        else:
+            log(f"Synthetic repositories kept in {work_root}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, baseline, results)
+        log(f"Baseline saved to {args.baseline}")
+    if failed:
+        print(f"\nRegressions beyond {args.tolerance:.0f}% against the baseline:")
+        for line in failed:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
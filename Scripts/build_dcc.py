@@ -7,18 +7,86 @@ import datetime
 import shutil
 import random
 import string
+import threading
+import tempfile
+import contextlib
+import hashlib
+import time
+import re
+import heapq
+import itertools
+import socket
+import glob
+import io
+import zipfile
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# The dcc_*.py modules import this one by name. Run as a script, it is
+# "__main__": register it under its name too, so they share its state
+# instead of loading a second copy.
+if __name__ == "__main__":
+    sys.modules.setdefault("build_dcc", sys.modules[__name__])
 
 # ==============================================================================
 # DEFAULTS
 # ==============================================================================
 DEFAULT_CONFIG_FILE = "build_config_dcc.json"
 DEFAULT_BUILD_CONFIG = "Debug"
+DEFAULT_JOBS = 1
+DEFAULT_PROJECT_JOBS = 1
+DEFAULT_MATRIX_JOBS = 1
 
 # ==============================================================================
 # UTILITIES
 # ==============================================================================
+_log_lock = threading.Lock()
+
 def log(msg, level="INFO"):
-    print(f"[{level}] {msg}")
+    # Targets may run on worker threads; keep console lines whole.
+    with _log_lock:
+        print(f"[{level}] {msg}", flush=True)
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def file_lock(path):
+    """Returns a process-wide lock dedicated to the given file path."""
+    key = os.path.normcase(os.path.abspath(path))
+    with _file_locks_guard:
+        return _file_locks.setdefault(key, threading.Lock())
+
+@contextlib.contextmanager
+def log_section(log_file, step_log=None):
+    """
+    Yields a private log file for one step. On exit its content is appended to
+    'log_file' as a single block, so concurrent steps never interleave lines.
+    With 'step_log' (see step_log_path()) the block is also kept as that file.
+    """
+    log_dir = os.path.dirname(log_file)
+    os.makedirs(log_dir, exist_ok=True)
+    fd, part_path = tempfile.mkstemp(prefix=os.path.basename(log_file) + ".", suffix=".part", dir=log_dir)
+    try:
+        with os.fdopen(fd, "w") as lf:
+            yield lf
+        with file_lock(log_file):
+            with open(part_path, "rb") as src, open(log_file, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+    finally:
+        if step_log:
+            os.makedirs(os.path.dirname(step_log), exist_ok=True)
+            os.replace(part_path, step_log)
+        else:
+            os.remove(part_path)
+
+def step_log_path(log_file, kind, step):
+    """Per-step log next to 'log_file': '<dir>/logs/<kind>_<step>.log'."""
+    name = re.sub(r"[^\w.-]+", "_", step).strip("_")
+    return os.path.join(os.path.dirname(log_file), "logs", f"{kind}_{name}.log")
 
 def get_git_branch(git_exe):
     try:
@@ -36,6 +104,13 @@ def generate_build_id(git_exe):
     rand_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
     return f"{timestamp}_{branch}_{rand_suffix}"
 
+_re_build_id = re.compile(r"^\d{8}_\d{6}_(.+)_[A-Z0-9]{4}$")
+
+def build_id_branch(build_id):
+    """Branch part of a generate_build_id() name, or None for other folder names."""
+    m = _re_build_id.match(build_id)
+    return m.group(1) if m else None
+
 def load_config(args):
     """Merges Defaults < Config File < Env Vars < CLI Args."""
     cfg = {
@@ -43,12 +118,26 @@ def load_config(args):
         "git_path": "git",
         "clean_on_success": False,
         "default_config": "Debug",
+        "jobs": DEFAULT_JOBS,
+        "project_jobs": DEFAULT_PROJECT_JOBS,
+        "matrix_jobs": DEFAULT_MATRIX_JOBS,
+        "pipeline": False,
+        "msbuild_batch": False,
+        "fail_fast": False,
+        "timeouts": {"build": 0, "test": 0, "run": 0},
         "dcc": {},
         "default_compilers": [],
         "platforms": ["Win64"],
         "projects": [],
         "dependencies": {},
-        "build_options": {"common": {"search_paths": [], "defines": []}}
+        "build_options": {"common": {"search_paths": [], "defines": []}},
+        "build_cache": {"enabled": False, "dir": "", "inputs": ["Source"]},
+        "dcu_store": {"enabled": False, "dir": ""},
+        "artifact_store": {"enabled": False, "dir": "", "extensions": DEFAULT_ARTIFACT_EXTS},
+        "retention": dict(DEFAULT_RETENTION),
+        "matrix": {"strategy": "full"},
+        "missing_openssl": "prune",
+        "distributed": dict(DEFAULT_DISTRIBUTED)
     }
     
     # Load File
@@ -71,6 +160,34 @@ def load_config(args):
         cfg["default_config"] = args.build_config
     if args.clean is not None:
         cfg["clean_on_success"] = args.clean
+    if args.jobs is not None:
+        cfg["jobs"] = args.jobs
+    if args.project_jobs is not None:
+        cfg["project_jobs"] = args.project_jobs
+    if args.matrix_jobs is not None:
+        cfg["matrix_jobs"] = args.matrix_jobs
+    if args.pipeline is not None:
+        cfg["pipeline"] = args.pipeline
+    if args.fail_fast is not None:
+        cfg["fail_fast"] = args.fail_fast
+    if args.batch is not None:
+        cfg["msbuild_batch"] = args.batch
+    if args.cache is not None:
+        cfg["build_cache"] = dict(cfg["build_cache"], enabled=args.cache)
+    if args.dcu_store is not None:
+        cfg["dcu_store"] = dict(cfg["dcu_store"], enabled=args.dcu_store)
+    if args.reset_dcu_store:
+        cfg["dcu_store"] = dict(cfg["dcu_store"], reset=True)
+    if args.artifact_store is not None:
+        cfg["artifact_store"] = dict(cfg["artifact_store"], enabled=args.artifact_store)
+    cfg["retention"] = dict(DEFAULT_RETENTION, **cfg["retention"])
+    for key in ("keep_runs", "keep_failed_days", "max_size_gb"):
+        if getattr(args, key) is not None:
+            cfg["retention"][key] = getattr(args, key)
+    if args.shards is not None:
+        for proj in cfg["projects"]:
+            if proj.get("type") == "test":
+                proj["shards"] = args.shards
         
     # NEW: Override OpenSSL Versions from CLI
     if args.openssl_versions:
@@ -78,135 +195,1116 @@ def load_config(args):
         if "dependencies" not in cfg: cfg["dependencies"] = {}
         cfg["dependencies"]["openssl_versions"] = [v.strip() for v in args.openssl_versions.split(',')]
 
+    # Test Matrix: CLI lists replace the matching matrix dimensions
+    matrix = dict(cfg["matrix"])
+    dimensions = dict(matrix.get("dimensions", {}))
+    for dim, value in (("compiler", args.compilers), ("platform", args.platforms),
+                       ("config", args.build_config), ("openssl", args.openssl_versions)):
+        if value:
+            dimensions.pop(dim, None)
+    matrix["dimensions"] = dimensions
+    if args.matrix_strategy:
+        matrix["strategy"] = args.matrix_strategy
+    if args.matrix_sample is not None:
+        matrix["sample"] = args.matrix_sample
+    if args.matrix_seed is not None:
+        matrix["seed"] = args.matrix_seed
+    if matrix.get("strategy", "full") not in MATRIX_STRATEGIES:
+        log(f"Unknown matrix strategy '{matrix['strategy']}' (use {', '.join(MATRIX_STRATEGIES)})", "ERROR")
+        sys.exit(1)
+    cfg["matrix"] = matrix
+    cfg["distributed"] = dict(DEFAULT_DISTRIBUTED, **cfg["distributed"])
+    if args.missing_openssl:
+        cfg["missing_openssl"] = args.missing_openssl
+    if cfg["missing_openssl"] not in MISSING_OPENSSL_MODES:
+        log(f"Unknown missing_openssl mode '{cfg['missing_openssl']}' (use {', '.join(MISSING_OPENSSL_MODES)})", "ERROR")
+        sys.exit(1)
+
     return cfg
 
+# ==============================================================================
+# RUN TRACE
+# ==============================================================================
+class RunTrace:
+    """
+    Records timed spans of a run as Chrome trace events (chrome://tracing, Perfetto).
+    Thread-safe: every worker thread gets its own track, so concurrent targets,
+    projects and test legs show up side by side.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.tracks = {}  # (thread ident, name) -> tid
+
+    def _track(self):
+        # Idents are reused by later pools, so the thread name is part of the key
+        thread = threading.current_thread()
+        key = (thread.ident, thread.name)
+        tid = self.tracks.get(key)
+        if tid is None:
+            tid = len(self.tracks) + 1
+            self.tracks[key] = tid
+            self.events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                                "args": {"name": thread.name}})
+        return tid
+
+    @contextlib.contextmanager
+    def span(self, name, cat, **args):
+        """Times the enclosed block. Yields the 'args' dict, so callers can add results (exit code, usage)."""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.events.append({
+                    "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": self._track(),
+                    "ts": round((start - self.origin) * 1e6), "dur": round((end - start) * 1e6),
+                    "args": args,
+                })
+
+    def add_span(self, name, cat, start, end, track, **args):
+        """Records a span timed elsewhere (perf_counter values) on the virtual track 'track'."""
+        with self.lock:
+            tid = self.tracks.get(track)
+            if tid is None:
+                tid = len(self.tracks) + 1
+                self.tracks[track] = tid
+                self.events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                                    "args": {"name": track}})
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+                "ts": round((start - self.origin) * 1e6), "dur": round((end - start) * 1e6),
+                "args": args,
+            })
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            data = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def print_summary(self, top=10):
+        """Prints the time per category and the longest build/test steps."""
+        with self.lock:
+            spans = [e for e in self.events if e["ph"] == "X"]
+            names = {e["tid"]: e["args"]["name"] for e in self.events if e["ph"] == "M"}
+        if not spans:
+            return
+
+        by_cat = {}
+        for e in spans:
+            by_cat[e["cat"]] = by_cat.get(e["cat"], 0) + e["dur"]
+        print("\nTime by category (summed over workers):")
+        for cat, dur in sorted(by_cat.items(), key=lambda x: -x[1]):
+            print(f"  {cat:<10} {dur / 1e6:9.2f}s")
+
+        steps = sorted((e for e in spans if e["cat"] not in ("run", "target", "leg")), key=lambda e: -e["dur"])[:top]
+        if steps:
+            print(f"\nTop {len(steps)} time consumers:")
+            print(f"  {'WALL':>9} {'CPU':>9} {'PEAK RSS':>10}  {'TRACK':<24} STEP")
+            for e in steps:
+                cpu = f"{e['args']['cpu_s']:.2f}s" if "cpu_s" in e["args"] else "-"
+                rss = f"{e['args']['peak_rss_mb']:.0f} MB" if "peak_rss_mb" in e["args"] else "-"
+                print(f"  {e['dur'] / 1e6:8.2f}s {cpu:>9} {rss:>10}  {names.get(e['tid'], ''):<24} {e['name']}")
+
+_run_trace = RunTrace()
+
+def trace_span(name, cat, **args):
+    return _run_trace.span(name, cat, **args)
+
+# ==============================================================================
+# CHILD PROCESSES
+# ==============================================================================
+OUTCOME_OK = "ok"
+OUTCOME_FAILED = "failed"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_CANCELLED = "cancelled"
+
+class RunControl:
+    """
+    Cancellation shared by all workers of a run. Set by --fail-fast on the
+    first failed step, or by the global timeout. Running children are killed
+    and queued jobs are not started.
+    """
+    def __init__(self):
+        self.fail_fast = False
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.reason = None
+        self.outcome = OUTCOME_CANCELLED
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self, reason, outcome=OUTCOME_CANCELLED):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.outcome = outcome
+            self.event.set()
+        log(f"Cancelling the remaining jobs: {reason}", "WARN")
+
+    def step_failed(self, step):
+        if self.fail_fast:
+            self.cancel(f"{step} failed (--fail-fast)")
+
+_run_control = RunControl()
+
+def stop_note(stopped, timeout):
+    """Log line for a child killed by run_child()."""
+    if stopped == OUTCOME_TIMEOUT:
+        return f"[TIMEOUT] Killed after {timeout}s"
+    return f"[CANCELLED] {_run_control.reason}"
+
+def outcome_of(returncode, stopped):
+    if stopped:
+        return stopped
+    return OUTCOME_OK if returncode == 0 else OUTCOME_FAILED
+
+# dcc/MSBuild: "Unit1.pas(28): error E2003: Undeclared identifier: 'x' [Project1.dproj]"
+_re_build_diag = re.compile(r"^\s*(?P<file>\S.*?)(?:\((?P<line>\d+)(?:,\d+)?\))?\s*:\s*(?P<kind>error|fatal|warning)"
+                            r"\s+(?P<code>[A-Z]+\d{4})\s*:\s*(?P<message>.*?)(?:\s+\[[^\]]+\])?\s*$", re.IGNORECASE)
+# IDE style: "[dcc32 Error] Unit1.pas(28): E2003 Undeclared identifier: 'x'"
+_re_dcc_diag = re.compile(r"^\s*\[dcc\w*\s+(?P<kind>Fatal Error|Error|Fatal|Warning)\]\s*"
+                          r"(?:(?P<file>[^(]+)\((?P<line>\d+)\)\s*:\s*)?(?P<code>[EFW]\d{4})\s+(?P<message>.*?)\s*$", re.IGNORECASE)
+# DUnitX console summary: a section header, then "<Test.Full.Name>" / "Message: ..." pairs
+_re_dunitx_section = re.compile(r"^\s*(Failing Tests|Tests With Errors|Leaking Tests)\s*$", re.IGNORECASE)
+_re_dunitx_test = re.compile(r"^\s*(?:TestName:\s*)?(?P<test>[\w]+(?:\.[\w]+)+)\s*$")
+_re_dunitx_message = re.compile(r"^\s*Message:\s*(?P<message>.*?)\s*$")
+
+class OutputScanner:
+    """
+    Picks compiler diagnostics and DUnitX failures out of child output, one
+    line at a time, so reports never have to re-read the step logs.
+    Keeps the first MAX_ITEMS of each kind and counts the rest.
+    """
+    MAX_ITEMS = 20
+
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+        self.test_failures = []
+        self.counts = {"errors": 0, "warnings": 0, "test_failures": 0}
+        self._seen = set()
+        self._section = None
+        self._test = None
+
+    def _add(self, kind, item):
+        self.counts[kind] += 1
+        items = getattr(self, kind)
+        if len(items) < self.MAX_ITEMS:
+            items.append(item)
+
+    def feed(self, text):
+        match = _re_build_diag.match(text) or _re_dcc_diag.match(text)
+        if match:
+            diag = match.groupdict()
+            # MSBuild repeats every diagnostic in its closing summary
+            key = (diag["file"], diag["line"], diag["code"], diag["message"])
+            if key not in self._seen:
+                self._seen.add(key)
+                self._add("warnings" if diag["kind"].lower() == "warning" else "errors", diag)
+            return
+
+        match = _re_dunitx_section.match(text)
+        if match:
+            self._section = None if match.group(1).lower() == "leaking tests" else match.group(1)
+            self._test = None
+            return
+        if not self._section:
+            return
+        match = _re_dunitx_message.match(text)
+        if match and self._test:
+            self._add("test_failures", {"test": self._test, "message": match.group("message")})
+            self._test = None
+            return
+        match = _re_dunitx_test.match(text)
+        if match:
+            self._test = match.group("test")
+
+    def first_errors(self):
+        """Errors first, then test failures, as display lines."""
+        lines = []
+        for diag in self.errors:
+            where = diag["file"] or ""
+            if diag["line"]:
+                where += f"({diag['line']})"
+            lines.append(f"{where + ': ' if where else ''}{diag['code']} {diag['message']}")
+        for failure in self.test_failures:
+            lines.append(f"{failure['test']}: {failure['message']}")
+        return lines
+
+class StepDiagnostics:
+    """Scanner results of all steps of a run, listed in the final report."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = []
+
+    def add(self, step, outcome, scanner):
+        with self.lock:
+            self.steps.append((step, outcome, scanner))
+
+    def export(self):
+        """JSON form of the collected steps, see merge()."""
+        with self.lock:
+            return [{"step": step, "outcome": outcome, "errors": scanner.errors, "warnings": scanner.warnings,
+                     "test_failures": scanner.test_failures, "counts": scanner.counts}
+                    for step, outcome, scanner in self.steps]
+
+    def merge(self, exported):
+        """Adds the steps of another run's export() (a --worker's unit)."""
+        for item in exported:
+            scanner = OutputScanner()
+            scanner.errors = item["errors"]
+            scanner.warnings = item["warnings"]
+            scanner.test_failures = item["test_failures"]
+            scanner.counts = item["counts"]
+            self.add(item["step"], item["outcome"], scanner)
+
+    def print_report(self, per_step=3):
+        with self.lock:
+            steps = list(self.steps)
+        warnings = sum(scanner.counts["warnings"] for _, _, scanner in steps)
+        failed = [(step, scanner) for step, outcome, scanner in steps
+                  if outcome != OUTCOME_OK and scanner.first_errors()]
+        if failed:
+            print("\nFirst errors:")
+            for step, scanner in failed:
+                print(f"  {step}:")
+                lines = scanner.first_errors()
+                for line in lines[:per_step]:
+                    print(f"      {line[:150]}")
+                more = scanner.counts["errors"] + scanner.counts["test_failures"] - per_step
+                if more > 0:
+                    print(f"      ... {more} more")
+        if warnings:
+            print(f"\nCompiler warnings: {warnings}")
+
+_run_diagnostics = StepDiagnostics()
+
+_process_runner = None
+_process_runner_lock = threading.Lock()
+
+def process_runner():
+    """ProcessRunner of this process; dcc_runner.py is imported on first use."""
+    global _process_runner
+    with _process_runner_lock:
+        if _process_runner is None:
+            from dcc_runner import ProcessRunner
+            _process_runner = ProcessRunner()
+        return _process_runner
+
+def run_child(cmd, log_file, shell=False, env=None, timeout=None, control=None, label=None):
+    """
+    Runs a child process to completion, like subprocess.run(), streaming its
+    output into the text file 'log_file' (see ProcessRunner in dcc_runner.py).
+    Returns (returncode, usage, stopped, scanner). 'usage' holds "cpu_s" (user + system)
+    and "peak_rss_mb": Windows tracks the process tree in a job object; elsewhere
+    wait4() reports the CPU time of the reaped tree and, on Linux only, the peak
+    memory of the child itself is sampled from /proc while it runs.
+    'stopped' is None, OUTCOME_TIMEOUT after 'timeout' seconds, or the outcome
+    of a cancelled 'control'; the whole process tree is killed in both cases.
+    'scanner' is the OutputScanner of the output; 'label' prefixes --verbose lines.
+    """
+    return process_runner().run(cmd, log_file, shell=shell, env=env, timeout=timeout, control=control, label=label)
+
 # ==============================================================================
 # BUILD ENGINE
 # ==============================================================================
-def run_msbuild(rsvars, project, platform, config_name, output_dir, log_file, config_data):
+def resolve_build_options(project, config_name, config_data):
     """
-    Executes MSBuild with injected Environment Variables and Search Paths.
+    Resolves the injected Environment Variables, Defines and Search Paths of a project.
+    Returns {"env_vars": {...}, "defines": [...], "search_paths": [...]}.
     """
-    os.makedirs(output_dir, exist_ok=True)
-    dcu_dir = os.path.join(output_dir, "DCU")
-    
-    # 1. Resolve Options
     build_opts = config_data.get("build_options", {})
     common_opts = build_opts.get("common", {})
     config_opts = build_opts.get(config_name, {})
 
-    # 2. Prepare Environment Variables
-    build_env = os.environ.copy()
-    
+    env_vars = {}
+
     def merge_env(source_dict):
         for k, v in source_dict.items():
             val_str = str(v)
             # Resolve relative paths to absolute based on CWD (Repo Root)
             if not os.path.isabs(val_str) and "$(" not in val_str and "%" not in val_str:
                 if os.path.exists(val_str):
-                    build_env[k] = os.path.abspath(val_str)
+                    env_vars[k] = os.path.abspath(val_str)
                 else:
-                    build_env[k] = val_str
+                    env_vars[k] = val_str
             else:
-                build_env[k] = val_str
+                env_vars[k] = val_str
 
     merge_env(common_opts.get("env_vars", {}))
     merge_env(config_opts.get("env_vars", {}))
     merge_env(project.get("env_vars", {}))
 
+    search_paths = common_opts.get("search_paths", []) + config_opts.get("search_paths", [])
+
+    return {
+        "env_vars": env_vars,
+        "defines": common_opts.get("defines", []) + config_opts.get("defines", []),
+        # Convert all to Absolute
+        "search_paths": [os.path.abspath(p) for p in search_paths],
+    }
+
+# Environments of the compiler env scripts (rsvars.bat), by (path, mtime)
+_compiler_envs = {}
+
+def capture_script_env(script):
+    """
+    Runs a compiler env script once and returns the environment it leaves
+    behind as a dict, or None if the script failed. Windows calls the batch
+    file and 'set' in one cmd.exe; elsewhere the script is sourced by 'sh'.
+    """
+    if os.name == "nt":
+        cmd = f'"{script}" >nul && set'
+        shell = True
+    else:
+        dump = "import json, os, sys; sys.stdout.write(json.dumps(dict(os.environ)))"
+        cmd = ["sh", "-c", '. "$1" >/dev/null && exec "$2" -c "$3"', "sh", script, sys.executable, dump]
+        shell = False
+    result = subprocess.run(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, errors="replace")
+    if result.returncode != 0:
+        log(f"Compiler env script failed ({result.returncode}): {script}: {result.stderr.strip()[-300:]}", "ERROR")
+        return None
+    if os.name != "nt":
+        return json.loads(result.stdout)
+    env = {}
+    for line in result.stdout.splitlines():
+        key, sep, value = line.partition("=")
+        # Skips cmd.exe's hidden per-drive "=C:=C:\..." entries
+        if sep and key:
+            env[key] = value
+    return env
+
+def compiler_env(script):
+    """
+    Environment of a compiler env script, captured once per script path and
+    mtime and shared by all MSBuild calls of the run. Returns None if the
+    script failed.
+    """
+    key = (os.path.normcase(os.path.abspath(script)), os.path.getmtime(script))
+    # Concurrent targets of one compiler wait for a single capture
+    with file_lock(script):
+        if key not in _compiler_envs:
+            with trace_span(f"compiler env {script}", "build"):
+                _compiler_envs[key] = capture_script_env(script)
+        return _compiler_envs[key]
+
+def find_program(name, env):
+    """Full path of 'name' on the PATH of 'env' (not of this process), or 'name' itself."""
+    path = next((v for k, v in env.items() if k.upper() == "PATH"), None)
+    return shutil.which(name, path=path) or name
+
+def run_msbuild(rsvars, project, platform, config_name, output_dir, log_file, config_data, dcu_dir=None, timeout=None, step=None):
+    """
+    Executes MSBuild with injected Environment Variables and Search Paths.
+    'dcu_dir' defaults to '<output_dir>/DCU'.
+    'step' (e.g. "13.0 | Win64 | Test_API") names the step log and its console lines.
+    Returns an OUTCOME_* value; after 'timeout' seconds the build is killed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if not dcu_dir:
+        dcu_dir = os.path.join(output_dir, "DCU")
+    
+    # 1. Resolve Options
+    options = resolve_build_options(project, config_name, config_data)
+
+    # 2. Prepare Environment Variables (compiler environment + injected variables)
+    compiler_vars = compiler_env(rsvars)
+    if compiler_vars is None:
+        with log_section(log_file) as lf:
+            lf.write(f"\n{'='*80}\nBUILDING: {project['name']} ({platform})\n{'='*80}\n")
+            lf.write(f"  [ERROR] Compiler env script failed: {rsvars}\n")
+        return OUTCOME_FAILED
+    build_env = dict(compiler_vars)
+    build_env.update(options["env_vars"])
+
     # 3. Resolve Defines
-    defines = common_opts.get("defines", []) + config_opts.get("defines", [])
-    define_arg = ""
+    # Without a shell there are no quotes to keep a ';' list in one property: MSBuild's %3B escape does
+    defines = options["defines"]
+    define_args = []
     if defines:
-        defines_joined = ";".join(defines)
-        define_arg = f'/p:DCC_Define="{defines_joined};$(DCC_Define)"'
+        defines_joined = "%3B".join(defines)
+        define_args.append(f"/p:DCC_Define={defines_joined}%3B$(DCC_Define)")
 
     # 4. Resolve Search Paths (Restored Logic)
-    search_paths = common_opts.get("search_paths", []) + config_opts.get("search_paths", [])
+    search_paths = options["search_paths"]
     search_path_args = []
     
     if search_paths:
-        # Convert all to Absolute
-        abs_paths = [os.path.abspath(p) for p in search_paths]
-        paths_joined = ";".join(abs_paths)
+        paths_joined = "%3B".join(search_paths)
         
         # Override SysLibPath to force precedence over standard libs
-        search_path_args.append(f'/p:DCC_SysLibPath="{paths_joined};$(DCC_SysLibPath)"')
+        search_path_args.append(f"/p:DCC_SysLibPath={paths_joined}%3B$(DCC_SysLibPath)")
         # Override UnitSearchPath for standard visibility
-        search_path_args.append(f'/p:DCC_UnitSearchPath="{paths_joined};$(DCC_UnitSearchPath)"')
+        search_path_args.append(f"/p:DCC_UnitSearchPath={paths_joined}%3B$(DCC_UnitSearchPath)")
 
-    # 5. Construct Command
+    # 5. Construct Command (no shell: arguments are quoted by subprocess)
     cmd = [
-        f'"{rsvars}"',
-        "&&",
-        "msbuild",
-        f'"{project["path"]}"',
+        find_program("msbuild", build_env),
+        project["path"],
         "/t:Build",
         "/v:minimal",
         "/p:DCC_Hints=false", 
         f"/p:Config={config_name}",
         f"/p:Platform={platform}",
-        f'/p:DCC_ExeOutput="{output_dir}"',
-        f'/p:DCC_DcuOutput="{dcu_dir}"', 
-        f'/p:DCC_BplOutput="{output_dir}"',
-        f'/p:DCC_DcpOutput="{output_dir}"',
-        define_arg
-    ] + search_path_args # Add search paths
+        f"/p:DCC_ExeOutput={output_dir}",
+        f"/p:DCC_DcuOutput={dcu_dir}", 
+        f"/p:DCC_BplOutput={output_dir}",
+        f"/p:DCC_DcpOutput={output_dir}",
+    ] + define_args + search_path_args # Add search paths
         
-    full_cmd = " ".join(filter(None, cmd))
+    full_cmd = subprocess.list2cmdline(cmd)
 
-    with open(log_file, "a") as lf:
+    step = step or f"{project['name']} ({platform})"
+    with trace_span(f"msbuild {project['name']} ({platform})", "build", platform=platform, config=config_name) as span, \
+         log_section(log_file, step_log_path(log_file, "build", step)) as lf:
         lf.write(f"\n{'='*80}\nBUILDING: {project['name']} ({platform})\n{'='*80}\n")
         
         # Log relevant vars
-        all_custom_keys = set(common_opts.get("env_vars", {}).keys()) | \
-                          set(config_opts.get("env_vars", {}).keys()) | \
-                          set(project.get("env_vars", {}).keys())
-                          
-        for k in all_custom_keys:
-            if k in build_env:
-                lf.write(f"  [ENV] {k}={build_env[k]}\n")
+        for k, v in options["env_vars"].items():
+            lf.write(f"  [ENV] {k}={v}\n")
 
         lf.write(f"\n  [CMD] {full_cmd}\n")
             
         lf.flush()
         
-        result = subprocess.run(
-            full_cmd, 
-            shell=True, 
-            stdout=lf, 
-            stderr=subprocess.STDOUT,
-            env=build_env 
-        )
+        returncode, usage, stopped, scanner = run_child(cmd, lf, env=build_env,
+                                                        timeout=timeout, control=_run_control, label=step)
+        outcome = outcome_of(returncode, stopped)
+        _run_diagnostics.add(f"build {step}", outcome, scanner)
+        if stopped:
+            lf.write(f"\n  {stop_note(stopped, timeout)}\n")
+        span.update(usage, exit_code=returncode, outcome=outcome, errors=scanner.counts["errors"],
+                    warnings=scanner.counts["warnings"])
     
-    return result.returncode == 0
+    return outcome
+
+# ==============================================================================
+# BUILD CACHE
+# ==============================================================================
+CACHE_SOURCE_EXTS = (".pas", ".inc", ".dpr", ".dpk", ".dproj", ".res", ".rc", ".dfm", ".fmx")
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def hash_file(path):
+    """SHA-256 of a file, memoized by (mtime, size) for the lifetime of the run."""
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _file_hashes_lock:
+        cached = _file_hashes.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _file_hashes_lock:
+        _file_hashes[path] = (stamp, digest)
+    return digest
+
+def list_source_files(path):
+    """Returns the source files below 'path' (or 'path' itself), sorted."""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        # Skip compiler output folders that live next to the sources
+        dirnames[:] = [d for d in dirnames if d not in ("__history", "__recovery", "Win32", "Win64")]
+        for name in filenames:
+            if name.lower().endswith(CACHE_SOURCE_EXTS):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+def snapshot_dir(path):
+    """Maps file name -> (mtime, size) for the files directly inside 'path'."""
+    result = {}
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            if entry.is_file():
+                st = entry.stat()
+                result[entry.name] = (st.st_mtime_ns, st.st_size)
+    return result
+
+def changed_files(before, after):
+    return sorted(name for name, stamp in after.items() if before.get(name) != stamp)
+
+def compiler_stamp(rsvars):
+    """Identifies a compiler installation by its env script and that script's modification time."""
+    try:
+        return {"rsvars": rsvars, "mtime": os.path.getmtime(rsvars)}
+    except OSError:
+        return {"rsvars": rsvars, "mtime": None}
+
+class BuildCache:
+    """
+    Stores the outputs of successful MSBuild runs, keyed by a hash of the build inputs:
+    the sources (configured 'inputs', the project folder and the library folders
+    named by search paths and env vars), the project file, defines, search paths,
+    injected env vars, compiler (ID and rsvars stamp), platform and config.
+
+    Layout: <dir>/<key[:2]>/<key>/{manifest.json, out/, DCU/}
+    """
+    def __init__(self, cache_dir, inputs):
+        self.cache_dir = cache_dir
+        self.inputs = inputs
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "restored_files": 0}
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def compute_key(self, project, comp_id, platform, config_name, config_data, rsvars):
+        options = resolve_build_options(project, config_name, config_data)
+        h = hashlib.sha256()
+
+        def feed(label, value):
+            h.update(f"{label}={value}\n".encode("utf-8"))
+
+        feed("compiler", comp_id)
+        # An updated or reinstalled compiler changes rsvars.bat
+        feed("rsvars", json.dumps(compiler_stamp(rsvars), sort_keys=True))
+        feed("platform", platform)
+        feed("config", config_name)
+        feed("project", os.path.normcase(project["path"]))
+        feed("defines", ";".join(options["defines"]))
+        feed("search_paths", ";".join(options["search_paths"]))
+        for k in sorted(options["env_vars"]):
+            feed(f"env:{k}", options["env_vars"][k])
+
+        entries = self.inputs + list(project.get("cache_inputs", [])) + [os.path.dirname(project["path"]) or "."]
+        # Libraries the compiler reads through the search paths or env vars
+        # (e.g. DUnitX=..\DUnitX\Source); values that are no folder are only hashed as text above
+        libraries = options["search_paths"] + [p for v in options["env_vars"].values() for p in v.split(";")]
+        entries += [p for p in libraries if p and os.path.isdir(p)]
+
+        sources = set()
+        for entry in entries:
+            if os.path.exists(entry):
+                sources.update(os.path.abspath(path) for path in list_source_files(entry))
+        for path in sorted(sources):
+            try:
+                name = os.path.relpath(path)
+            except ValueError:
+                name = path  # another drive
+            feed(f"file:{os.path.normcase(name)}", hash_file(path))
+
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, key, output_dir, dcu_dir):
+        """Copies cached outputs into the build folders. Returns False on a miss."""
+        entry_dir = self._entry_dir(key)
+        manifest_path = os.path.join(entry_dir, "manifest.json")
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return False
+
+        try:
+            for folder, dest, names in (("out", output_dir, manifest["out"]), ("DCU", dcu_dir, manifest["dcu"])):
+                os.makedirs(dest, exist_ok=True)
+                for name in names:
+                    shutil.copy2(os.path.join(entry_dir, folder, name), os.path.join(dest, name))
+        except (OSError, KeyError) as e:
+            log(f"    Build cache entry {key[:12]} is damaged ({e}), rebuilding", "WARN")
+            self._count("misses")
+            return False
+
+        self._count("hits")
+        self._count("restored_files", len(manifest["out"]) + len(manifest["dcu"]))
+        return True
+
+    def store(self, key, project, output_dir, out_files, dcu_dir, dcu_files):
+        """Saves the given outputs under 'key'. Published atomically by a rename."""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key[:12]}.", dir=os.path.dirname(entry_dir))
+        try:
+            for folder, src, names in (("out", output_dir, out_files), ("DCU", dcu_dir, dcu_files)):
+                os.makedirs(os.path.join(staging, folder))
+                for name in names:
+                    shutil.copy2(os.path.join(src, name), os.path.join(staging, folder, name))
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump({
+                    "project": project["name"],
+                    "path": project["path"],
+                    "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "out": out_files,
+                    "dcu": dcu_files,
+                }, f, indent=2)
+            os.rename(staging, entry_dir)
+            self._count("stored")
+        except OSError as e:
+            # Another run may have published the same key first
+            log(f"    Could not store build cache entry {key[:12]}: {e}", "WARN")
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+def project_lib_suffix(project):
+    """
+    LIBSUFFIX of a package project: <DllSuffix> of the .dproj, else {$LIBSUFFIX} of
+    the .dpk next to it. "$(Auto)"/AUTO (the package version) comes back as "auto".
+    """
+    stem = os.path.splitext(project["path"])[0]
+    for path, pattern in ((stem + ".dproj", r"<DllSuffix>([^<]*)</DllSuffix>"),
+                          (stem + ".dpk", r"\{\$LIBSUFFIX\s+(?:'([^']*)'|(AUTO))\s*\}")):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                match = re.search(pattern, f.read(), re.IGNORECASE)
+        except OSError:
+            continue
+        if match:
+            suffix = next(g for g in match.groups() if g is not None)
+            return "auto" if suffix.lower() in ("$(auto)", "auto") else suffix
+    return ""
+
+def project_outputs(project, changed):
+    """
+    Picks the outputs of 'project' among changed files of a shared output folder:
+    '<project>.<ext>' (EXE, DLL, BPL, DCP, MAP, ...) and, for packages with a
+    LIBSUFFIX, '<project><suffix>.<ext>'. Files of other projects whose name
+    starts with this project's name are left out.
+    """
+    stem = os.path.splitext(os.path.basename(project["path"]))[0].lower()
+    suffix = project_lib_suffix(project).lower()
+    names = {stem, stem + suffix} if suffix != "auto" else {stem}
+
+    def owned(name):
+        root = os.path.splitext(name)[0].lower()
+        if root in names:
+            return True
+        # AUTO suffixes are the package version, e.g. Ossl4Pas_rt290.bpl
+        return suffix == "auto" and root.startswith(stem) and root[len(stem):].isdigit()
+
+    return [name for name in changed if owned(name)]
+
+def run_cached_msbuild(cache, rsvars, project, comp_id, platform, config_name, output_dir, log_file, config_data, dcu_dir=None, timeout=None, step=None):
+    """
+    run_msbuild() behind the build cache: restores the outputs on a hit,
+    otherwise builds and stores the new outputs on success.
+    Returns (outcome, restored_from_cache).
+    """
+    if not dcu_dir:
+        dcu_dir = os.path.join(output_dir, "DCU")
+    step = step or f"{comp_id} | {platform} | {project['name']}"
+    if cache is None:
+        return run_msbuild(rsvars, project, platform, config_name, output_dir, log_file, config_data,
+                           dcu_dir=dcu_dir, timeout=timeout, step=step), False
+
+    with trace_span(f"cache lookup {project['name']}", "cache", platform=platform) as span:
+        key = cache.compute_key(project, comp_id, platform, config_name, config_data, rsvars)
+        span["hit"] = cache.restore(key, output_dir, dcu_dir)
+    if span["hit"]:
+        log(f"    Restored '{project['name']}' from build cache")
+        with log_section(log_file) as lf:
+            lf.write(f"\n{'='*80}\nCACHED: {project['name']} ({platform}) key={key}\n{'='*80}\n")
+        return OUTCOME_OK, True
+
+    before_out = snapshot_dir(output_dir)
+    before_dcu = snapshot_dir(dcu_dir)
+    outcome = run_msbuild(rsvars, project, platform, config_name, output_dir, log_file, config_data,
+                          dcu_dir=dcu_dir, timeout=timeout, step=step)
+    if outcome == OUTCOME_OK:
+        out_files = project_outputs(project, changed_files(before_out, snapshot_dir(output_dir)))
+        dcu_files = changed_files(before_dcu, snapshot_dir(dcu_dir))
+        if out_files:
+            with trace_span(f"cache store {project['name']}", "cache", platform=platform, files=len(out_files) + len(dcu_files)):
+                cache.store(key, project, output_dir, out_files, dcu_dir, dcu_files)
+    return outcome, False
+
+# ==============================================================================
+# DCU STORE
+# ==============================================================================
+@contextlib.contextmanager
+def interprocess_lock(lock_path, description="lock"):
+    """
+    Exclusive lock shared by threads of this run and by other processes
+    (msvcrt on Windows, fcntl elsewhere).
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with file_lock(lock_path):
+        with open(lock_path, "a+") as fh:
+            if os.name == "nt":
+                import msvcrt
+                fh.seek(0)
+
+                def acquire(blocking):
+                    try:
+                        msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                        return True
+                    except OSError:
+                        if not blocking:
+                            return False
+                        raise
+
+                def release():
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                def acquire(blocking):
+                    try:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                        return True
+                    except BlockingIOError:
+                        return False
+
+                def release():
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+            if not acquire(False):
+                log(f"    Waiting for {description} held by another run...")
+                # msvcrt has no blocking wait without a retry limit, so poll
+                while not acquire(False):
+                    time.sleep(0.5)
+            try:
+                yield
+            finally:
+                release()
+
+def dcu_store_dir(store_root, comp_id, platform, config_name, project, config_data):
+    """
+    Persistent DCU folder of a project: <store>/<compiler>/<platform>/<config>/<define set>/<project>.
+    The define set hash covers defines, search paths and injected env vars.
+    """
+    options = resolve_build_options(project, config_name, config_data)
+    define_set = json.dumps([options["defines"], options["search_paths"], sorted(options["env_vars"].items())])
+    define_hash = hashlib.sha256(define_set.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(store_root, comp_id, platform, config_name, define_hash, project["name"])
+
+def prepare_dcu_store(dcu_dir, rsvars, reset=False):
+    """
+    Empties the store folder on request or when the compiler changed since it was filled.
+    Caller must hold the store lock.
+    """
+    stamp_path = os.path.join(dcu_dir, "store.json")
+    stamp = compiler_stamp(rsvars)
+
+    stored_stamp = None
+    if os.path.exists(stamp_path):
+        try:
+            with open(stamp_path, "r") as f:
+                stored_stamp = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    if os.path.isdir(dcu_dir) and (reset or stored_stamp != stamp):
+        reason = "reset requested" if reset else "compiler changed"
+        log(f"    Invalidating DCU store {dcu_dir} ({reason})")
+        shutil.rmtree(dcu_dir)
+
+    os.makedirs(dcu_dir, exist_ok=True)
+    with open(stamp_path, "w") as f:
+        json.dump(stamp, f)
+
+# ==============================================================================
+# BATCH BUILD
+# ==============================================================================
+# File logger lines of MSBuild (normal verbosity, any node prefix)
+_re_batch_start = re.compile(r'is building "(?P<path>[^"]+)" \(\d+(?::\d+)?\)')
+_re_batch_done = re.compile(r'Done Building Project "(?P<path>[^"]+)"(?: \(.*\))?(?P<failed> -- FAILED)?\.\s*$')
+_re_batch_time = re.compile(r"^\s*(\d{1,2}):(\d{2}):(\d{2})[.,](\d+)")
+
+def msbuild_escape(value):
+    """Escapes a literal value for an MSBuild property list (%XX, like /p: values)."""
+    for char in "%;$@'":
+        value = value.replace(char, f"%{ord(char):02X}")
+    return value
+
+def project_waves(projects):
+    """Groups projects into dependency levels: every project comes after all its prerequisites in the list."""
+    by_name = {p["name"]: p for p in projects}
+    depth = {}
+
+    def walk(name):
+        # validate_project_graph() guarantees an acyclic graph
+        if name not in depth:
+            deps = [d for d in by_name[name].get("depends_on", []) if d in by_name]
+            depth[name] = 1 + max((walk(d) for d in deps), default=-1)
+        return depth[name]
+
+    waves = []
+    for proj in projects:
+        level = walk(proj["name"])
+        while len(waves) <= level:
+            waves.append([])
+        waves[level].append(proj)
+    return waves
+
+def traversal_project(projects, platform, config_name, config_data, output_dir, root_dir, dcu_dirs):
+    """
+    Text of the MSBuild traversal project that builds 'projects' (resolved)
+    into 'output_dir', one <MSBuild BuildInParallel> task per dependency level.
+    Paths below 'output_dir' and 'root_dir' are written relative to
+    $(MSBuildThisFileDirectory) and the $(BatchRoot) property, so the file only
+    changes with the projects and build options, never with the build ID.
+    """
+    def rel(path):
+        path = os.path.abspath(path)
+        for base, ref in ((output_dir, "$(BatchOutput)"), (root_dir, "$(BatchRoot)" + os.sep)):
+            base = os.path.abspath(base)
+            if path == base:
+                return ref
+            if path.startswith(base + os.sep):
+                return ref + msbuild_escape(os.path.relpath(path, base))
+        return msbuild_escape(path)
+
+    def prop_list(props):
+        return ";".join(f"{k}={v}" for k, v in props)
+
+    options = resolve_build_options({}, config_name, config_data)
+    common = [("Config", config_name), ("Platform", platform), ("DCC_Hints", "false"),
+              ("DCC_ExeOutput", "$(BatchOutput)"), ("DCC_BplOutput", "$(BatchOutput)"),
+              ("DCC_DcpOutput", "$(BatchOutput)")]
+    if options["defines"]:
+        common.append(("DCC_Define", "%3B".join(msbuild_escape(d) for d in options["defines"]) + "%3B%24(DCC_Define)"))
+    if options["search_paths"]:
+        paths = "%3B".join(rel(p) for p in options["search_paths"])
+        common.append(("DCC_SysLibPath", paths + "%3B%24(DCC_SysLibPath)"))
+        common.append(("DCC_UnitSearchPath", paths + "%3B%24(DCC_UnitSearchPath)"))
+
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        f"<!-- Generated by build_dcc.py: {escape(platform)} | {escape(config_name)} -->",
+        '<Project xmlns="http://schemas.microsoft.com/developer/msbuild/2003" ToolsVersion="4.0" DefaultTargets="Build">',
+        "  <PropertyGroup>",
+        "    <BatchOutput>$(MSBuildThisFileDirectory)</BatchOutput>",
+        f"    <BatchProperties>{escape(prop_list(common))}</BatchProperties>",
+        "  </PropertyGroup>",
+    ]
+    waves = project_waves(projects)
+    for number, wave in enumerate(waves, 1):
+        lines.append("  <ItemGroup>")
+        for proj in wave:
+            # Project specific env vars become global properties of that project only
+            env_vars = resolve_build_options(proj, config_name, config_data)["env_vars"]
+            own = [(k, rel(v) if os.path.isabs(v) else msbuild_escape(v)) for k, v in sorted(env_vars.items())
+                   if options["env_vars"].get(k) != v]
+            props = [("DCC_DcuOutput", rel(dcu_dirs[proj["name"]]))] + own
+            lines.append(f"    <Wave{number} Include={quoteattr(rel(proj['path']))}>")
+            lines.append(f"      <BuildName>{escape(proj['name'])}</BuildName>")
+            lines.append(f"      <AdditionalProperties>{escape(prop_list(props))}</AdditionalProperties>")
+            lines.append(f"    </Wave{number}>")
+        lines.append("  </ItemGroup>")
+    lines.append('  <Target Name="Build">')
+    for number in range(1, len(waves) + 1):
+        # A failed level stops the build; later levels fall back to single builds
+        lines.append(f'    <MSBuild Projects="@(Wave{number})" Targets="Build" Properties="$(BatchProperties)" BuildInParallel="true" />')
+    lines.append("  </Target>")
+    lines.append("</Project>")
+    return "\n".join(lines) + "\n"
+
+def parse_batch_log(log_path):
+    """
+    Reads the file logger output of a batch build.
+    Returns {normcased project path: {"done": bool, "failed": bool, "duration": seconds or None}}.
+    """
+    projects = {}
+
+    def timestamp(line):
+        match = _re_batch_time.match(line)
+        if not match:
+            return None
+        h, m, s, frac = match.groups()
+        return int(h) * 3600 + int(m) * 60 + int(s) + float("0." + frac)
+
+    try:
+        with open(log_path, "r", encoding="utf-8-sig", errors="replace") as f:
+            for line in f:
+                match = _re_batch_start.search(line) or _re_batch_done.search(line)
+                if not match:
+                    continue
+                key = os.path.normcase(os.path.normpath(match.group("path")))
+                # The Delphi targets call MSBuild on the project again: keep the outer span
+                entry = projects.setdefault(key, {"done": False, "failed": False, "start": None, "end": None})
+                if match.re is _re_batch_start:
+                    if entry["start"] is None:
+                        entry["start"] = timestamp(line)
+                else:
+                    entry["done"] = True
+                    entry["failed"] = entry["failed"] or bool(match.group("failed"))
+                    entry["end"] = timestamp(line)
+    except OSError:
+        return {}
+
+    for entry in projects.values():
+        start, end = entry.pop("start"), entry.pop("end")
+        entry["duration"] = None
+        if start is not None and end is not None:
+            # Builds running past midnight
+            entry["duration"] = (end - start) % 86400
+    return projects
+
+def run_batch_msbuild(target, projects, cfg, cache=None, dcu_dirs=None, jobs=1, timeout=None):
+    """
+    Builds the resolved 'projects' of a target with a single MSBuild call on a
+    generated traversal project ('<out_dir>/batch.proj') with '/m:jobs' nodes.
+    Cache hits are restored first and left out of the traversal.
+    Returns {name: (outcome, restored_from_cache, duration)} for the projects
+    whose result is known; projects of levels that never started are missing,
+    so the caller can still build them one by one.
+    """
+    comp_id = target["comp_id"]
+    platform = target["platform"]
+    config_name = cfg["default_config"]
+    out_dir = target["out_dir"]
+    log_file = target["log_file"]
+    results = {}
+
+    keys = {}
+    pending = []
+    for proj in projects:
+        if cache is not None:
+            with trace_span(f"cache lookup {proj['name']}", "cache", platform=platform) as span:
+                keys[proj["name"]] = cache.compute_key(proj, comp_id, platform, config_name, cfg, target["rsvars"])
+                span["hit"] = cache.restore(keys[proj["name"]], out_dir, dcu_dirs[proj["name"]])
+            if span["hit"]:
+                log(f"    Restored '{proj['name']}' from build cache")
+                results[proj["name"]] = (OUTCOME_OK, True, None)
+                continue
+        pending.append(proj)
+    if not pending:
+        return results
+
+    os.makedirs(out_dir, exist_ok=True)
+    compiler_vars = compiler_env(target["rsvars"])
+    if compiler_vars is None:
+        return results
+    build_env = dict(compiler_vars)
+    build_env.update(resolve_build_options({}, config_name, cfg)["env_vars"])
+
+    proj_path = os.path.join(out_dir, "batch.proj")
+    batch_log = os.path.join(out_dir, "batch_msbuild.log")
+    with open(proj_path, "w", encoding="utf-8") as f:
+        f.write(traversal_project(pending, platform, config_name, cfg, out_dir, os.getcwd(), dcu_dirs))
+    cmd = [
+        find_program("msbuild", build_env),
+        proj_path,
+        "/nologo",
+        f"/m:{max(1, int(jobs))}",
+        # Reused nodes would outlive the run and hold the output pipe
+        "/nodeReuse:false",
+        "/v:minimal",
+        f"/flp:LogFile={batch_log};Verbosity=normal;ShowTimestamp",
+        f"/p:BatchRoot={os.getcwd()}",
+    ]
+
+    label = target["label"]
+    step = f"{label} | batch"
+    before_out = snapshot_dir(out_dir)
+    before_dcu = {name: snapshot_dir(path) for name, path in dcu_dirs.items()}
+    with trace_span(f"msbuild batch ({platform})", "build", platform=platform, config=config_name,
+                    projects=len(pending)) as span, \
+         log_section(log_file, step_log_path(log_file, "build", step)) as lf:
+        lf.write(f"\n{'='*80}\nBATCH BUILD: {', '.join(p['name'] for p in pending)} ({platform})\n{'='*80}\n")
+        lf.write(f"\n  [CMD] {subprocess.list2cmdline(cmd)}\n")
+        returncode, usage, stopped, scanner = run_child(cmd, lf, env=build_env, timeout=timeout,
+                                                        control=_run_control, label=step)
+        outcome = outcome_of(returncode, stopped)
+        _run_diagnostics.add(f"build {step}", outcome, scanner)
+        if stopped:
+            lf.write(f"\n  {stop_note(stopped, timeout)}\n")
+        span.update(usage, exit_code=returncode, outcome=outcome, errors=scanner.counts["errors"],
+                    warnings=scanner.counts["warnings"])
+
+    built = parse_batch_log(batch_log)
+    if not built:
+        log(f"    Batch build of {label} reported no projects, building them one by one", "WARN")
+        return results
+    changed_out = changed_files(before_out, snapshot_dir(out_dir))
+    for proj in [p for wave in project_waves(pending) for p in wave]:
+        entry = built.get(os.path.normcase(os.path.normpath(os.path.abspath(proj["path"]))))
+        if entry is None or not entry["done"]:
+            if entry is None and any(results.get(d, (OUTCOME_OK,))[0] != OUTCOME_OK for d in proj.get("depends_on", [])):
+                # Left to the caller, which skips it
+                continue
+            if stopped:
+                # Killed by a timeout or a cancelled run: never finished
+                results[proj["name"]] = (OUTCOME_CANCELLED if entry is None else stopped, False, None)
+            elif entry is not None:
+                results[proj["name"]] = (OUTCOME_FAILED, False, None)
+            continue
+        if entry["failed"]:
+            results[proj["name"]] = (OUTCOME_FAILED, False, entry["duration"])
+            continue
+        results[proj["name"]] = (OUTCOME_OK, False, entry["duration"])
+        if cache is not None:
+            out_files = project_outputs(proj, changed_out)
+            dcu_dir = dcu_dirs[proj["name"]]
+            dcu_files = changed_files(before_dcu[proj["name"]], snapshot_dir(dcu_dir))
+            if out_files:
+                with trace_span(f"cache store {proj['name']}", "cache", platform=platform,
+                                files=len(out_files) + len(dcu_files)):
+                    cache.store(keys[proj["name"]], proj, out_dir, out_files, dcu_dir, dcu_files)
+    return results
 
 # ==============================================================================
 # TEST ENGINE
 # ==============================================================================
-def execute_test_process(cmd_args, log_file):
-    with open(log_file, "a") as lf:
+def execute_test_process(cmd_args, log_file, title=None, trace_name=None, timeout=None):
+    """Runs one test process. Returns an OUTCOME_* value; after 'timeout' seconds the process tree is killed."""
+    if _run_control.cancelled:
+        return _run_control.outcome
+    step = trace_name or title or os.path.basename(cmd_args[0])
+    with trace_span(f"test {step}", "test") as span, log_section(log_file, step_log_path(log_file, "test", step)) as lf:
         cmd_str = " ".join(cmd_args)
-        lf.write(f"\n{'='*80}\nCMD: {cmd_str}\n{'='*80}\n")
+        header = f"TEST: {title}\n" if title else ""
+        lf.write(f"\n{'='*80}\n{header}CMD: {cmd_str}\n{'='*80}\n")
         lf.flush()
         try:
-            result = subprocess.run(cmd_args, stdout=lf, stderr=subprocess.STDOUT)
-            return result.returncode == 0
+            returncode, usage, stopped, scanner = run_child(cmd_args, lf, timeout=timeout,
+                                                            control=_run_control, label=step)
+            outcome = outcome_of(returncode, stopped)
+            _run_diagnostics.add(f"test {step}", outcome, scanner)
+            if stopped:
+                lf.write(f"\n{stop_note(stopped, timeout)}\n")
+            span.update(usage, exit_code=returncode, outcome=outcome, failures=scanner.counts["test_failures"])
+            return outcome
         except Exception as e:
             lf.write(f"EXECUTION ERROR: {e}\n")
-            return False
+            span["error"] = str(e)
+            return OUTCOME_FAILED
 
-def run_test_project(project, output_dir, common_params, dependencies, build_id, platform, config_name, log_file):
+def run_test_project(project, output_dir, common_params, dependencies, build_id, platform, config_name, log_file, matrix_jobs=1, shard_plan=None, trace_label=None, leg_estimates=None, timeout=None):
     """
     Runs the test executable. 
     Supports 'Matrix' execution with variable substitution for OpenSSL paths.
+    Matrix legs run on up to 'matrix_jobs' workers, each with its own temp folder.
+    With a 'shard_plan' (lists of fixture names, see plan_shards()), every leg
+    runs one process per shard in parallel, each with its own '-xml' file and temp folder.
+    'trace_label' (e.g. "13.0 | Win64 | Test_API") names the legs in the run trace.
+    Parallel legs start longest first by 'leg_estimates' ({version: seconds}).
+    Each test process is killed after 'timeout' seconds.
+    Returns a list of {"version", "success", "outcome", "xml", "duration"} entries, one per
+    leg in config order; "xml" lists the '-xml' results files of the leg (one per shard).
     """
     exe_name = os.path.splitext(os.path.basename(project["path"]))[0] + ".exe"
     exe_path = os.path.join(output_dir, exe_name)
     
     if not os.path.exists(exe_path):
         log(f"Test executable missing: {exe_path}", "FAIL")
-        return False
+        return [{"version": None, "success": False, "outcome": OUTCOME_FAILED, "xml": [], "duration": None}]
 
     # 1. Determine Versions
     versions = []
@@ -221,11 +1319,9 @@ def run_test_project(project, output_dir, common_params, dependencies, build_id,
     # Get the raw path template
     # Fallback to "openssl_root" for backward compat if "openssl_path" is missing
     raw_ossl_path = dependencies.get("openssl_path", dependencies.get("openssl_root", ""))
-    
-    overall_success = True
 
-    # 2. Iterate Versions
-    for ver in versions:
+    # 2. Run a single Version (Leg)
+    def run_leg(ver):
         version_suffix = f"_{ver}" if ver else ""
         
         # --- A. Build Substitution Context ---
@@ -264,12 +1360,48 @@ def run_test_project(project, output_dir, common_params, dependencies, build_id,
         else:
             log(f"    > Running {project['name']}...")
 
+        leg_title = f"{project['name']} [OpenSSL {ver}]" if ver else project["name"]
+        if not shard_plan or len(shard_plan) < 2:
+            leg_outcome, xml_path = run_process(context, current_ossl_path, leg_title)
+            xml_files = [xml_path] if xml_path else []
+        else:
+            def run_shard(index):
+                shard_context = dict(context, project_name=f"{context['project_name']}_shard{index + 1}")
+                return run_process(shard_context, current_ossl_path,
+                                   f"{leg_title} shard {index + 1}/{len(shard_plan)}",
+                                   [f"{DUNITX_RUN_SWITCH}:{','.join(shard_plan[index])}"])
+
+            with ThreadPoolExecutor(max_workers=len(shard_plan), thread_name_prefix="shard") as pool:
+                shard_results = list(pool.map(run_shard, range(len(shard_plan))))
+            outcomes = {outcome for outcome, _ in shard_results}
+            # A timeout is the most telling outcome of a leg, a cancelled shard the least
+            leg_outcome = next((o for o in (OUTCOME_TIMEOUT, OUTCOME_FAILED, OUTCOME_CANCELLED) if o in outcomes), OUTCOME_OK)
+            xml_files = [xml_path for _, xml_path in shard_results if xml_path]
+            if leg_outcome == OUTCOME_OK:
+                missing = shard_coverage_gaps(shard_plan, [xml_path for _, xml_path in shard_results])
+                if missing:
+                    log(f"    [FAIL] {len(missing)} fixtures of {leg_title} ran in no shard: {', '.join(missing)}", "ERROR")
+                    leg_outcome = OUTCOME_FAILED
+
+        if leg_outcome == OUTCOME_TIMEOUT:
+            log(f"    [TIMEOUT] Timed out: {project['name']} {version_suffix}", "ERROR")
+        elif leg_outcome == OUTCOME_FAILED:
+            log(f"    [FAIL] Failed: {project['name']} {version_suffix}", "ERROR")
+        return {"version": ver, "success": leg_outcome == OUTCOME_OK, "outcome": leg_outcome, "xml": xml_files}
+
+    def run_process(context, current_ossl_path, title, extra_args=()):
+        """Runs one test process; returns (OUTCOME_* value, resolved '-xml' path or None)."""
+        # Private working folder, so parallel legs and shards never share temp files
+        context["temp_dir"] = os.path.join(output_dir, "Temp", context["project_name"])
+        os.makedirs(context["temp_dir"], exist_ok=True)
+
         # --- C. Merge Parameters ---
         final_params = common_params.copy()
         final_params.update(project.get("params", {}))
 
         # --- D. Construct Command ---
         cmd = [exe_path]
+        xml_path = None
 
         # FIX: Remove manual quotes around the path. 
         # subprocess.run handles spaces automatically.
@@ -282,6 +1414,8 @@ def run_test_project(project, output_dir, common_params, dependencies, build_id,
                     # Apply substitution
                     formatted_value = value.format(**context)
                     formatted_value = os.path.normpath(formatted_value)
+                    if switch == "-xml":
+                        xml_path = formatted_value
                     
                     # FIX: Remove manual quotes here too
                     cmd.append(f"{switch}:{formatted_value}") # <--- Changed
@@ -290,206 +1424,2074 @@ def run_test_project(project, output_dir, common_params, dependencies, build_id,
                     cmd.append(f"{switch}:{value}")
             else:
                 cmd.append(switch)
+        cmd.extend(extra_args)
 
         # --- E. Execute ---
-        if not execute_test_process(cmd, log_file):
-            log(f"    [FAIL] Failed: {project['name']} {version_suffix}", "ERROR")
-            overall_success = False
+        trace_name = title.replace(project["name"], trace_label, 1) if trace_label else title
+        outcome = execute_test_process(cmd, log_file, title=title, trace_name=trace_name, timeout=timeout)
+        if outcome in (OUTCOME_FAILED, OUTCOME_TIMEOUT):
+            _run_control.step_failed(trace_name)
+        return outcome, xml_path
+
+    def traced_leg(ver):
+        label = trace_label or project["name"]
+        with trace_span(f"{label} [{ver}]" if ver else label, "leg",
+                        platform=platform, shards=len(shard_plan) if shard_plan else 1) as span:
+            start = time.perf_counter()
+            leg = run_leg(ver)
+            leg["duration"] = time.perf_counter() - start
+            span["success"] = leg["success"]
+            return leg
+
+    # 3. Iterate Versions
+    matrix_jobs = max(1, int(matrix_jobs))
+    if matrix_jobs == 1 or len(versions) <= 1:
+        return [traced_leg(ver) for ver in versions]
 
-    return overall_success
+    leg_estimates = leg_estimates or {}
+    start_order = sorted(versions, key=lambda v: -(leg_estimates.get(v) or 0))
+    with ThreadPoolExecutor(max_workers=matrix_jobs, thread_name_prefix="matrix") as pool:
+        futures = {ver: pool.submit(traced_leg, ver) for ver in start_order}
+        # The report keeps the version order of the config
+        return [futures[ver].result() for ver in versions]
 
 # ==============================================================================
-# MAIN
+# TEST RESULTS
 # ==============================================================================
-def main():
-    parser = argparse.ArgumentParser(description="Ossl4Pas Delphi Build Orchestrator")
-    parser.add_argument("--config", help="Path to JSON config file")
-    parser.add_argument("--platforms", help="Comma separated list (Win32,Win64)")
-    parser.add_argument("--compilers", help="Comma separated list of compiler IDs (e.g. 11.0,12.0)")
-    parser.add_argument("--openssl-versions", help="Comma separated list of OpenSSL versions (e.g. 3.0,3.3)")
-    parser.add_argument("--build-config", help="Debug or Release")
-    parser.add_argument("--tags", help="Comma separated list of tags to filter projects")
-    parser.add_argument("--clean", action="store_true", help="Clean output on success")
-    parser.add_argument("--no-clean", action="store_false", dest="clean")
-    
-    args = parser.parse_args()    
+DEFAULT_SLOWEST = 10
+FIXTURE_SUITE_TYPES = ("TestFixture", "Fixture", "ParameterizedFixture")
 
-    # 1. Determine Config File Location
-    # We need absolute path to resolve the "root" setting correctly later
-    config_file_path = args.config if args.config else DEFAULT_CONFIG_FILE
-    if not os.path.isabs(config_file_path):
-        config_file_path = os.path.abspath(config_file_path)
+def parse_time(value):
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return 0.0
 
-    # Load Config
-    cfg = load_config(args) # Note: ensure load_config uses config_file_path if you modified it
+def iter_nunit_results(xml_path):
+    """
+    Streams the test cases of a DUnitX NUnit XML file as dicts
+    {"fixture", "class", "name", "status", "time", "message"}; "class" is the
+    full 'Unit.Class' name of the fixture. Finished elements are removed from
+    the tree, so memory stays flat for any file size.
+    """
+    open_elems = []
+    suites = []  # (name, type) of the enclosing test-suites
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            open_elems.append(elem)
+            if elem.tag == "test-suite":
+                suites.append((elem.get("name", ""), elem.get("type", "")))
+            continue
 
-    # 2. Handle Root Directory Switching
-    original_cwd = os.getcwd()
-    
-    # Default to current dir if not set
-    relative_root = cfg.get("root", ".") 
-    
-    # Resolve root relative to the CONFIG FILE, not the current execution dir
-    config_dir = os.path.dirname(config_file_path)
-    target_root = os.path.abspath(os.path.join(config_dir, relative_root))
+        open_elems.pop()
+        if elem.tag == "test-case":
+            name = elem.get("name", "")
+            fixture = next((n for n, t in reversed(suites) if t in FIXTURE_SUITE_TYPES), None)
+            if fixture is None:
+                fixture = suites[-1][0] if suites else name.rpartition(".")[0]
+            if name.startswith(fixture + "."):
+                fixture_class = fixture
+            else:
+                unit, found, _ = name.partition(f".{fixture}.")
+                fixture_class = f"{unit}.{fixture}" if found else fixture
 
-    if not os.path.exists(target_root):
-        log(f"Configured root directory does not exist: {target_root}", "ERROR")
-        sys.exit(1)
+            if elem.get("executed", "True").lower() == "false" or elem.get("result") in ("Ignored", "Skipped", "NotRunnable"):
+                status = "skipped"
+            elif elem.get("success", "True").lower() == "true":
+                status = "passed"
+            elif elem.get("result") == "Error":
+                status = "error"
+            else:
+                status = "failed"
 
-    log(f"Switching Working Directory to: {target_root}")
-    os.chdir(target_root)
+            message = elem.findtext("failure/message") or elem.findtext("reason/message") or ""
+            yield {
+                "fixture": fixture,
+                "class": fixture_class,
+                "name": name,
+                "status": status,
+                "time": parse_time(elem.get("time")),
+                "message": message.strip(),
+            }
+        elif elem.tag == "test-suite":
+            suites.pop()
+        else:
+            continue
 
-    try:    
+        elem.clear()
+        if open_elems:
+            open_elems[-1].remove(elem)
 
-        cli_tags = set(args.tags.split(',')) if args.tags else set()
-        build_id = generate_build_id(cfg["git_path"])
-        root_dir = os.path.abspath(cfg["output_root"])
-        build_dir = os.path.join(root_dir, build_id)
-        
-        log(f"Starting Build Sequence: {build_id}")
-        if cli_tags:
-            log(f"Filtering projects by tags: {cli_tags}")
+class TestResults:
+    """
+    Merges the NUnit XML files of all test runs (compiler x platform x project x
+    OpenSSL version). Keeps only aggregates in memory: per-run totals, failing
+    tests, the slowest tests and per-fixture durations. The JUnit testcases of
+    every run are written to a fragment file while parsing.
+    """
+    def __init__(self, work_dir, slowest=DEFAULT_SLOWEST):
+        self.work_dir = work_dir
+        self.slowest_count = slowest
+        self.lock = threading.Lock()
+        self.runs = {}            # label -> summary
+        self.slowest = []         # min-heap of (time, label, test name)
+        self.failures = {}        # (label, fixture) -> {"count", "message", "test"}
+        self.durations = {}       # (series, fixture) -> {version: seconds}
+        self.fixture_times = {}   # project -> {'Unit.Class': slowest seconds}
 
-        report = []
-        overall_success = True
-        common_params = cfg.get("common_params", {})
+    def add_run(self, label, series, version, xml_files, project=None):
+        """
+        Parses the results files of one run (one per shard) as a single test run.
+        'series' groups the runs whose durations are compared across 'version'
+        (e.g. one project on one compiler/platform). Fixture durations are also
+        recorded per 'project' for shard balancing.
+        Returns the run summary, or None if no file could be read.
+        """
+        xml_files = [p for p in xml_files if os.path.exists(p)]
+        if not xml_files:
+            log(f"    No results file for {label}", "WARN")
+            return None
 
-        dcc_config = cfg.get("dcc", {})
-        
-        # Determine Compilers to Run
-        dcc_config = cfg.get("dcc", {})
-        active_compilers = cfg.get("default_compilers", [])
-        
-        # If no specific list provided, use all active ones from config
-        if not active_compilers:
-            active_compilers = [k for k, v in dcc_config.items() if v.get("active", False)]
-            
-        # 1. Iterate Compilers
-        for comp_id in active_compilers:
-            comp_data = dcc_config.get(comp_id)
-            
-            if not comp_data:
-                log(f"Compiler ID '{comp_id}' not found in config", "WARN")
-                continue
-                
-            if not comp_data.get("active", False) and not args.compilers:
-                 # Skip inactive unless explicitly requested via CLI
-                 continue
-            
-            rsvars = comp_data["path"]
+        os.makedirs(self.work_dir, exist_ok=True)
+        fragment_path = os.path.join(self.work_dir, re.sub(r"[^\w.-]+", "_", label) + ".junit.part")
+        summary = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0, "time": 0.0, "fragment": fragment_path}
+        fixture_times = {}
+        class_times = {}
+        slowest = []
+        failures = {}
+
+        def cases():
+            for xml_path in xml_files:
+                try:
+                    yield from iter_nunit_results(xml_path)
+                except ET.ParseError as e:
+                    log(f"    Unreadable results file {xml_path}: {e}", "WARN")
+
+        with open(fragment_path, "w", encoding="utf-8") as frag:
+            for case in cases():
+                summary["tests"] += 1
+                summary["time"] += case["time"]
+                fixture_times[case["fixture"]] = fixture_times.get(case["fixture"], 0.0) + case["time"]
+                class_times[case["class"]] = class_times.get(case["class"], 0.0) + case["time"]
+
+                item = (case["time"], label, case["name"])
+                if len(slowest) < self.slowest_count:
+                    heapq.heappush(slowest, item)
+                elif self.slowest_count:
+                    heapq.heappushpop(slowest, item)
+
+                frag.write(f'    <testcase classname={quoteattr(case["fixture"])} name={quoteattr(case["name"])} time="{case["time"]:.3f}"')
+                if case["status"] == "passed":
+                    frag.write("/>\n")
+                    continue
+
+                if case["status"] == "skipped":
+                    summary["skipped"] += 1
+                    frag.write(">\n      <skipped/>\n    </testcase>\n")
+                    continue
+
+                tag = "error" if case["status"] == "error" else "failure"
+                summary["errors" if tag == "error" else "failures"] += 1
+                frag.write(f">\n      <{tag} message={quoteattr(case['message'][:500])}>{escape(case['message'])}</{tag}>\n    </testcase>\n")
+                entry = failures.setdefault((label, case["fixture"]), {"count": 0, "message": case["message"], "test": case["name"]})
+                entry["count"] += 1
+
+        with self.lock:
+            self.runs[label] = summary
+            for item in slowest:
+                if len(self.slowest) < self.slowest_count:
+                    heapq.heappush(self.slowest, item)
+                elif self.slowest_count:
+                    heapq.heappushpop(self.slowest, item)
+            self.failures.update(failures)
+            for fixture, seconds in fixture_times.items():
+                self.durations.setdefault((series, fixture), {})[version] = seconds
+            self.durations.setdefault((series, None), {})[version] = summary["time"]
+            if project:
+                history = self.fixture_times.setdefault(project, {})
+                for name, seconds in class_times.items():
+                    history[name] = max(history.get(name, 0.0), seconds)
+
+        return summary
+
+    def write_junit(self, path, labels):
+        """Writes a JUnit summary with one <testsuite> per run, in 'labels' order."""
+        totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0, "time": 0.0}
+        for label in labels:
+            if label in self.runs:
+                for k in totals:
+                    totals[k] += self.runs[label][k]
+
+        with open(path, "w", encoding="utf-8") as out:
+            out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            out.write(f'<testsuites tests="{totals["tests"]}" failures="{totals["failures"]}" '
+                      f'errors="{totals["errors"]}" skipped="{totals["skipped"]}" time="{totals["time"]:.3f}">\n')
+            for label in labels:
+                run = self.runs.get(label)
+                if not run:
+                    continue
+                out.write(f'  <testsuite name={quoteattr(label)} tests="{run["tests"]}" failures="{run["failures"]}" '
+                          f'errors="{run["errors"]}" skipped="{run["skipped"]}" time="{run["time"]:.3f}">\n')
+                with open(run["fragment"], "r", encoding="utf-8") as frag:
+                    shutil.copyfileobj(frag, out)
+                out.write("  </testsuite>\n")
+            out.write("</testsuites>\n")
+
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def print_report(self, version_order):
+        if not self.runs:
+            return
+        total = sum(r["tests"] for r in self.runs.values())
+        failed = sum(r["failures"] + r["errors"] for r in self.runs.values())
+        print(f"\nTests: {total} executed, {failed} failed/errored in {len(self.runs)} runs")
 
-            if not os.path.exists(rsvars):
-                log(f"Compiler {comp_id} rsvars not found", "WARN")
+        if self.failures:
+            print("\nFailing fixtures:")
+            for (label, fixture), info in sorted(self.failures.items()):
+                print(f"  {label} | {fixture}: {info['count']} failed, first: {info['test']}")
+                if info["message"]:
+                    print(f"      {info['message'].splitlines()[0][:150]}")
+
+        if self.slowest:
+            print(f"\nSlowest {len(self.slowest)} tests:")
+            for seconds, label, name in sorted(self.slowest, reverse=True):
+                print(f"  {seconds:9.3f}s  {label} | {name}")
+
+        rank = {v: i for i, v in enumerate(version_order)}
+
+        def version_cells(by_version):
+            versions = sorted(by_version, key=lambda v: rank.get(v, len(rank)))
+            base = by_version[versions[0]]
+            cells = [f"{versions[0]} {base:.2f}s"]
+            for v in versions[1:]:
+                change = f"{(by_version[v] - base) / base * 100:+.1f}%" if base else "n/a"
+                cells.append(f"{v} {by_version[v]:.2f}s ({change})")
+            return ", ".join(cells), max(abs(by_version[v] - base) for v in versions)
+
+        series_list = sorted(series for series, fixture in self.durations
+                             if fixture is None and len(self.durations[(series, None)]) > 1)
+        if series_list:
+            print("\nDuration by OpenSSL version (vs. first version):")
+        for series in series_list:
+            print(f"  {series}: {version_cells(self.durations[(series, None)])[0]}")
+            # The fixtures that moved the most
+            fixtures = []
+            for (s, fixture), by_version in self.durations.items():
+                if s == series and fixture is not None and len(by_version) > 1:
+                    cells, spread = version_cells(by_version)
+                    fixtures.append((spread, fixture, cells))
+            for spread, fixture, cells in sorted(fixtures, reverse=True)[:3]:
+                print(f"      {fixture}: {cells}")
+
+# ==============================================================================
+# TEST IMPACT ANALYSIS
+# ==============================================================================
+IMPACT_SOURCE_EXTS = (".pas", ".dpr", ".dpk", ".inc")
+UNIT_INDEX_VERSION = 2
+
+_re_comment = re.compile(r"\{(?!\$)[^}]*\}|\(\*.*?\*\)|//[^\n]*", re.S)
+_re_directive = re.compile(r"\{\$([^}]*)\}")
+_re_uses = re.compile(r"\b(?:uses|contains)\b(.*?);", re.S | re.I)
+_re_uses_item = re.compile(r"^\s*([A-Za-z_][\w.]*)\s*(?:\bin\s*'([^']*)')?\s*$", re.S | re.I)
+_re_include = re.compile(r"^(?:I|INCLUDE)\s+(?![+-])'?([^'\s]+)'?", re.I)
+
+def parse_pascal_file(path):
+    """
+    Extracts the dependencies of a Pascal source file (package 'contains'
+    clauses count as uses): {"uses": [[unit, in_path or None], ...], "includes": [file, ...]}.
+    Units of every {$IFDEF}/{$IF}/{$ELSE} branch are kept, so a unit that is
+    only used under some defines still counts as a dependency.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    text = _re_comment.sub(" ", text)
+
+    includes = []
+    for directive in _re_directive.findall(text):
+        m = _re_include.match(directive.strip())
+        if m:
+            includes.append(m.group(1))
+
+    # Conditional directives only select branches; dropping them merges all branches
+    text = _re_directive.sub(" ", text)
+
+    uses = []
+    for clause in _re_uses.findall(text):
+        for item in clause.split(","):
+            m = _re_uses_item.match(item)
+            if m:
+                uses.append([m.group(1), m.group(2)])
+
+    return {"uses": uses, "includes": includes}
+
+def load_unit_index(index_path, roots):
+    """
+    Parses every Pascal source under 'roots', reusing entries of the cached index
+    whose mtime/size (or, failing that, content hash) did not change.
+    Returns {abs_path: {"mtime", "size", "sha256", "uses", "includes"}}.
+    """
+    cached = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == UNIT_INDEX_VERSION:
+                cached = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    index = {}
+    parsed = 0
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in ("__history", "__recovery")]
+            for name in filenames:
+                if not name.lower().endswith(IMPACT_SOURCE_EXTS):
+                    continue
+                path = os.path.abspath(os.path.join(dirpath, name))
+                st = os.stat(path)
+                entry = cached.get(path)
+                if entry and (entry["mtime"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+                    index[path] = entry
+                    continue
+                digest = hash_file(path)
+                if not (entry and entry["sha256"] == digest):
+                    entry = dict(parse_pascal_file(path), sha256=digest)
+                    parsed += 1
+                index[path] = dict(entry, mtime=st.st_mtime_ns, size=st.st_size)
+
+    if parsed or len(index) != len(cached):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": UNIT_INDEX_VERSION, "files": index}, f)
+        os.replace(tmp_path, index_path)
+
+    log(f"Unit index: {len(index)} files, {parsed} parsed")
+    return index
+
+def project_main_source(dproj_path):
+    """Returns the .dpr/.dpk of a .dproj (its <MainSource>), or None."""
+    try:
+        with open(dproj_path, "r", encoding="utf-8", errors="replace") as f:
+            m = re.search(r"<MainSource>([^<]+)</MainSource>", f.read())
+    except OSError:
+        return None
+    if not m:
+        return None
+    return os.path.abspath(os.path.join(os.path.dirname(dproj_path), m.group(1).replace("\\", os.sep)))
+
+def project_closure(dproj_path, index):
+    """Set of files (normalized) a project compiles: its .dproj, main source, used units and includes."""
+    by_unit = {}
+    by_name = {}
+    for path in index:
+        name = os.path.basename(path).lower()
+        by_name.setdefault(name, []).append(path)
+        if name.endswith(".pas"):
+            by_unit[name[:-4]] = path
+
+    closure = {os.path.normcase(os.path.abspath(dproj_path))}
+    main_source = project_main_source(dproj_path)
+    pending = [main_source] if main_source in index else []
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        closure.add(os.path.normcase(path))
+        entry = index[path]
+        base_dir = os.path.dirname(path)
+
+        for unit, in_path in entry["uses"]:
+            target = None
+            if in_path:
+                target = os.path.abspath(os.path.join(base_dir, in_path.replace("\\", os.sep)))
+            if target not in index:
+                # Units outside the indexed roots (RTL, DUnitX, ...) are not tracked
+                target = by_unit.get(unit.lower())
+            if target:
+                pending.append(target)
+
+        for inc in entry["includes"]:
+            local = os.path.abspath(os.path.join(base_dir, inc.replace("\\", os.sep)))
+            candidates = [local] if local in index else by_name.get(os.path.basename(inc).lower(), [])
+            pending.extend(candidates)
+
+    return closure
+
+def git_changed_files(git_exe, rev):
+    """
+    Files changed since 'rev', including uncommitted and untracked ones.
+    Returns normalized absolute paths, or None if git fails.
+    """
+    try:
+        top = subprocess.run([git_exe, "rev-parse", "--show-toplevel"],
+                             capture_output=True, text=True, check=True).stdout.strip()
+        diff = subprocess.run([git_exe, "diff", "--name-only", rev, "--"],
+                              capture_output=True, text=True, check=True).stdout.splitlines()
+        untracked = subprocess.run([git_exe, "ls-files", "--others", "--exclude-standard", "--full-name"],
+                                   capture_output=True, text=True, check=True, cwd=top).stdout.splitlines()
+    except (OSError, subprocess.CalledProcessError) as e:
+        log(f"git could not list changes since '{rev}': {e}", "ERROR")
+        return None
+    return {os.path.normcase(os.path.abspath(os.path.join(top, p))) for p in diff + untracked if p}
+
+def impacted_projects(projects, comp_vars, changed, index, always_all=()):
+    """
+    Names of the projects whose compiled files intersect 'changed'.
+    A change to any file in 'always_all' (e.g. the build config) impacts every project.
+    """
+    if any(os.path.normcase(os.path.abspath(p)) in changed for p in always_all):
+        return {p["name"] for p in projects}
+
+    names = set()
+    for proj in projects:
+        try:
+            resolved_path = proj["path"].format(**comp_vars)
+        except KeyError:
+            continue
+        if project_closure(resolved_path, index) & changed:
+            names.add(proj["name"])
+    return names
+
+# ==============================================================================
+# TEST SHARDING
+# ==============================================================================
+DUNITX_RUN_SWITCH = "--run"
+
+_re_fixture_attr = re.compile(r"\[\s*TestFixture\b[^\]]*\]\s*([A-Za-z_]\w*)\s*=\s*class\b", re.I)
+_re_register_fixture = re.compile(r"\bTDUnitX\s*\.\s*RegisterTestFixture\s*\(\s*([A-Za-z_]\w*)", re.I)
+_re_unit_name = re.compile(r"^\s*unit\s+([A-Za-z_][\w.]*)\s*;", re.I | re.M)
+
+def list_test_fixtures(dproj_path, index):
+    """
+    Full names ('Unit.Class') of the DUnitX fixtures a test project compiles:
+    classes marked [TestFixture] (found by the RTTI runner) and classes passed
+    to TDUnitX.RegisterTestFixture in the units of the project.
+    """
+    fixtures = set()
+    for path in project_closure(dproj_path, index):
+        if not path.endswith(".pas"):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = _re_comment.sub(" ", f.read())
+        except OSError:
+            continue
+        m = _re_unit_name.search(text)
+        unit = m.group(1) if m else os.path.splitext(os.path.basename(path))[0]
+        for m in _re_fixture_attr.finditer(text):
+            fixtures.add(f"{unit}.{m.group(1)}")
+        for m in _re_register_fixture.finditer(text):
+            fixtures.add(f"{unit}.{m.group(1)}")
+    return sorted(fixtures)
+
+def load_fixture_times(path):
+    """Historical fixture durations: {project: {fixture class: seconds}}."""
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+def save_fixture_times(path, history, latest):
+    """Merges the durations of this run into 'history' and writes it atomically."""
+    if not latest:
+        return
+    for project, times in latest.items():
+        history.setdefault(project, {}).update(times)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def project_shard_plan(project, comp_vars, count, run_ctx):
+    """Shard plan of a test project for run_test_project(), or None to run it as one process."""
+    index = run_ctx.get("unit_index")
+    try:
+        dproj_path = project["path"].format(**comp_vars)
+    except KeyError:
+        return None
+    fixtures = list_test_fixtures(dproj_path, index) if index is not None else []
+    plan = plan_shards(fixtures, count, run_ctx.get("fixture_times", {}).get(project["name"]))
+    if len(plan) < 2:
+        log(f"    {project['name']}: {len(fixtures)} fixtures found, running unsharded", "WARN")
+        return None
+    log(f"    {project['name']}: {len(fixtures)} fixtures in {len(plan)} shards")
+    return plan
+
+def plan_shards(fixtures, count, times=None):
+    """
+    Splits 'fixtures' into at most 'count' shards. With historical 'times'
+    (keyed by 'Unit.Class', like the fixtures) the longest fixtures are placed first, each on
+    the currently shortest shard; fixtures without history count as the average.
+    Without history the fixtures are dealt out round-robin.
+    """
+    count = min(count, len(fixtures))
+    if count < 2:
+        return [list(fixtures)] if fixtures else []
+
+    times = times or {}
+    known = [times[f] for f in fixtures if f in times]
+    if not known:
+        return [fixtures[i::count] for i in range(count)]
+
+    default = sum(known) / len(known)
+    weighted = sorted(((times.get(f, default), f) for f in fixtures), key=lambda x: (-x[0], x[1]))
+    shards = [(0.0, i, []) for i in range(count)]
+    for seconds, fixture in weighted:
+        total, i, members = heapq.heappop(shards)
+        members.append(fixture)
+        heapq.heappush(shards, (total + seconds, i, members))
+    return [sorted(members) for _, _, members in sorted(shards, key=lambda x: x[1])]
+
+def shard_coverage_gaps(shard_plan, xml_files):
+    """
+    Fixtures of 'shard_plan' missing from the results file of their shard
+    ('xml_files' in shard order, None for a shard without one). A '--run'
+    filter that matches nothing still passes, so without this check a fixture
+    the filter misses would drop out of the run unnoticed.
+    """
+    missing = []
+    for fixtures, xml_path in zip(shard_plan, xml_files):
+        reported = set()
+        if xml_path and os.path.exists(xml_path):
+            try:
+                reported = {case["class"] for case in iter_nunit_results(xml_path)}
+            except ET.ParseError:
+                pass
+        missing.extend(f for f in fixtures if f not in reported)
+    return missing
+
+# ==============================================================================
+# RUN HISTORY
+# ==============================================================================
+DEFAULT_REGRESSION_THRESHOLD = 25.0  # percent
+
+def open_history(root_dir):
+    """RunHistory of '<root_dir>/_cache/history.db'; dcc_history.py is imported on first use."""
+    from dcc_history import RunHistory
+    return RunHistory(os.path.join(root_dir, "_cache", "history.db"))
+
+# ==============================================================================
+# ARTIFACT STORE
+# ==============================================================================
+DEFAULT_ARTIFACT_EXTS = [".exe", ".dll", ".bpl", ".dcp", ".dcu"]
+DEFAULT_RETENTION = {"keep_runs": 10, "keep_failed_days": 7, "max_size_gb": 0}
+
+def open_artifact_store(cfg, root_dir):
+    """ArtifactStore of the config (Default: '<root_dir>/_store'); dcc_store.py is imported on first use."""
+    from dcc_store import ArtifactStore
+    artifact_cfg = cfg.get("artifact_store", {})
+    return ArtifactStore(os.path.abspath(artifact_cfg.get("dir") or os.path.join(root_dir, "_store")),
+                         artifact_cfg.get("extensions"))
+
+# ==============================================================================
+# PROJECT GRAPH
+# ==============================================================================
+def validate_project_graph(projects):
+    """
+    Checks 'depends_on' references of the configured projects.
+    Returns a list of error messages (unknown names and dependency cycles).
+    """
+    errors = []
+    names = [p["name"] for p in projects]
+    deps = {p["name"]: list(p.get("depends_on", [])) for p in projects}
+
+    for name in names:
+        for dep in deps[name]:
+            if dep not in deps:
+                errors.append(f"Project '{name}' depends on unknown project '{dep}'")
+    if errors:
+        return errors
+
+    # Kahn's algorithm: whatever cannot be ordered is part of (or behind) a cycle
+    pending = {name: len(set(deps[name])) for name in names}
+    ready = [name for name in names if pending[name] == 0]
+    ordered = 0
+    while ready:
+        current = ready.pop()
+        ordered += 1
+        for name in names:
+            if current in deps[name]:
+                pending[name] -= 1
+                if pending[name] == 0:
+                    ready.append(name)
+
+    if ordered != len(names):
+        cycle = [name for name in names if pending[name] > 0]
+        errors.append(f"Dependency cycle between projects: {', '.join(cycle)}")
+    return errors
+
+def select_projects(projects, cli_tags, only_names=None):
+    """
+    Applies the tag filter (and the 'only_names' filter of the impact analysis)
+    and pulls in every prerequisite of a selected project.
+    Keeps the config order.
+    """
+    by_name = {p["name"]: p for p in projects}
+    selected = set()
+
+    def add(name):
+        if name in selected:
+            return
+        selected.add(name)
+        for dep in by_name[name].get("depends_on", []):
+            add(dep)
+
+    for proj in projects:
+        if cli_tags and not cli_tags.intersection(set(proj.get("tags", []))):
+            continue
+        if only_names is not None and proj["name"] not in only_names:
+            continue
+        add(proj["name"])
+
+    return [p for p in projects if p["name"] in selected]
+
+# Report status of a build, by build_project_graph() status
+BUILD_STATUS = {"built": "Built", "failed": "Build Failed", "timeout": "Timed Out", "cancelled": "Cancelled"}
+# Report status of a test leg, by OUTCOME_* value
+TEST_STATUS = {OUTCOME_OK: "Passed", OUTCOME_FAILED: "Test Failed", OUTCOME_TIMEOUT: "Timed Out", OUTCOME_CANCELLED: "Cancelled"}
+
+def step_timeout(cfg, project, kind):
+    """
+    Timeout in seconds of the 'build' or 'test' steps of a project, or None.
+    A project's own "timeouts" override the global "timeouts" of the config.
+    """
+    value = project.get("timeouts", {}).get(kind, cfg.get("timeouts", {}).get(kind))
+    return value or None
+
+def batch_timeout(cfg, projects, jobs=1):
+    """
+    Timeout in seconds of one batch build of 'projects', or None. The "batch"
+    value of the config's "timeouts" wins; without it, the levels of the
+    traversal project run one after another and the projects of a level on
+    'jobs' nodes, so each level gets its longest 'build' timeout once per
+    round of 'jobs' projects.
+    """
+    if "batch" in cfg.get("timeouts", {}):
+        return cfg["timeouts"]["batch"] or None
+    total = 0
+    for wave in project_waves(projects):
+        timeouts = [step_timeout(cfg, p, "build") for p in wave]
+        if not all(timeouts):
+            return None
+        total += max(timeouts) * -(-len(wave) // max(1, jobs))
+    return total or None
+
+def build_project_graph(target, projects, cfg, run_ctx):
+    """
+    Builds the projects of one target as a DAG. Projects whose prerequisites
+    are done run concurrently on 'project_jobs' workers; if a prerequisite
+    fails, only its downstream projects are skipped. With a run history, ready
+    projects on the longest (historical) path to the end of the graph start first.
+    With "msbuild_batch", all projects are first built by one MSBuild call (see
+    run_batch_msbuild()); only projects it did not reach are built one by one.
+    Returns (report_items, built_projects, build_failed), both lists in config order.
+    """
+    comp_id = target["comp_id"]
+    platform = target["platform"]
+    label = target["label"]
+    comp_vars = target["comp_vars"]
+    target_out_dir = target["out_dir"]
+    project_jobs = max(1, int(cfg.get("project_jobs", DEFAULT_PROJECT_JOBS)))
+    cache = run_ctx.get("cache")
+    history = run_ctx.get("history")
+
+    status = {}    # name -> "built" | "failed" | "timeout" | "cancelled" | "skipped" | "missing"
+    resolved = {}  # name -> resolved project copy
+
+    # --- PRE-CHECKS ---
+    for proj in projects:
+        try:
+            resolved_path = proj["path"].format(**comp_vars)
+        except KeyError as e:
+            log(f"    Skipping '{proj['name']}': missing variable {e}", "WARN")
+            status[proj["name"]] = "missing"
+            continue
+
+        if not os.path.exists(resolved_path):
+            log(f"    Skipping '{proj['name']}': file not found", "WARN")
+            status[proj["name"]] = "missing"
+            continue
+
+        # Create a resolved copy of the project config
+        resolved_proj = proj.copy()
+        resolved_proj["path"] = resolved_path
+        resolved[proj["name"]] = resolved_proj
+
+    def build_one(proj):
+        start = time.perf_counter()
+        outcome, cached = build_project(proj)
+        return outcome, cached, time.perf_counter() - start
+
+    def build_project(proj):
+        store = cfg.get("dcu_store", {})
+        if store.get("enabled", False):
+            # Persistent DCUs: the compiler only recompiles units that changed
+            dcu_dir = dcu_store_dir(store["dir"], comp_id, platform, cfg["default_config"], proj, cfg)
+            with interprocess_lock(dcu_dir + ".lock", f"DCU store lock of '{proj['name']}'"):
+                prepare_dcu_store(dcu_dir, target["rsvars"], reset=store.get("reset", False))
+                return run_cached_msbuild(
+                    cache, target["rsvars"], proj, comp_id, platform,
+                    cfg["default_config"], target_out_dir, target["log_file"], cfg,
+                    dcu_dir=dcu_dir, timeout=step_timeout(cfg, proj, "build"), step=f"{label} | {proj['name']}"
+                )
+
+        # Concurrent builds must not share one DCU folder
+        dcu_dir = os.path.join(target_out_dir, "DCU", proj["name"]) if project_jobs > 1 else None
+        return run_cached_msbuild(
+            cache, target["rsvars"], proj, comp_id, platform,
+            cfg["default_config"], target_out_dir, target["log_file"], cfg,
+            dcu_dir=dcu_dir, timeout=step_timeout(cfg, proj, "build"), step=f"{label} | {proj['name']}"
+        )
+
+    def next_ready():
+        """Marks projects behind a broken prerequisite as skipped, returns the buildable ones."""
+        blocked = ("failed", "timeout", "cancelled", "skipped", "missing")
+        changed = True
+        while changed:
+            changed = False
+            for proj in projects:
+                name = proj["name"]
+                if name in status or name in running:
+                    continue
+                if any(status.get(d) in blocked for d in proj.get("depends_on", [])):
+                    status[name] = "skipped"
+                    changed = True
+
+        ready = [resolved[p["name"]] for p in projects
+                 if p["name"] not in status and p["name"] not in running
+                 and all(status.get(d) == "built" for d in p.get("depends_on", []))]
+        # Stable sort: without history the config order is kept
+        return sorted(ready, key=lambda p: -priority.get(p["name"], 0))
+
+    # Priority = historical duration of the longest chain starting at the project
+    priority = {}
+    if history is not None:
+        estimates = {p["name"]: history.estimate("build", f"{label} | {p['name']}") for p in projects}
+        known = [e for e in estimates.values() if e is not None]
+        default = sum(known) / len(known) if known else 0
+        dependents = {p["name"]: [q["name"] for q in projects if p["name"] in q.get("depends_on", [])] for p in projects}
+
+        def chain(name):
+            if name not in priority:
+                own = estimates[name] if estimates[name] is not None else default
+                priority[name] = own + max((chain(d) for d in dependents[name]), default=0)
+            return priority[name]
+
+        for p in projects:
+            chain(p["name"])
+
+    def record(name, outcome, cached, duration):
+        status[name] = "built" if outcome == OUTCOME_OK else outcome
+        step_name = f"{label} | {name}"
+        if outcome in (OUTCOME_FAILED, OUTCOME_TIMEOUT):
+            _run_control.step_failed(step_name)
+        if history is not None and duration is not None:
+            history.record("build", step_name,
+                           "Cached" if cached else BUILD_STATUS.get(status[name], "Built"), duration,
+                           comp_id, platform, cfg["default_config"], name)
+
+    # Batch mode: one MSBuild call for every project whose prerequisites all resolved
+    if cfg.get("msbuild_batch", False) and not _run_control.cancelled:
+        batch_names = set(resolved)
+        changed = True
+        while changed:
+            changed = False
+            for proj in projects:
+                if proj["name"] in batch_names and any(d not in batch_names for d in proj.get("depends_on", [])):
+                    batch_names.discard(proj["name"])
+                    changed = True
+        batch = [resolved[p["name"]] for p in projects if p["name"] in batch_names]
+        store = cfg.get("dcu_store", {})
+        if store.get("enabled", False):
+            dcu_dirs = {p["name"]: dcu_store_dir(store["dir"], comp_id, platform, cfg["default_config"], p, cfg) for p in batch}
+        else:
+            dcu_dirs = {p["name"]: os.path.join(target_out_dir, "DCU", p["name"]) for p in batch}
+        with contextlib.ExitStack() as locks:
+            if store.get("enabled", False):
+                # Sorted, so concurrent runs take the store locks in the same order
+                for name in sorted(dcu_dirs):
+                    locks.enter_context(interprocess_lock(dcu_dirs[name] + ".lock", f"DCU store lock of '{name}'"))
+                    prepare_dcu_store(dcu_dirs[name], target["rsvars"], reset=store.get("reset", False))
+            if batch:
+                batch_results = run_batch_msbuild(target, batch, cfg, cache, dcu_dirs, project_jobs,
+                                                  batch_timeout(cfg, batch, project_jobs))
+                for name, (outcome, cached, duration) in batch_results.items():
+                    record(name, outcome, cached, duration)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=project_jobs, thread_name_prefix="project") as pool:
+        while True:
+            for proj in next_ready():
+                if len(running) >= project_jobs or _run_control.cancelled:
+                    break
+                future = pool.submit(build_one, proj)
+                running[proj["name"]] = future
+            if not running:
+                break
+            done, _ = wait(list(running.values()), return_when=FIRST_COMPLETED)
+            for name in [n for n, f in running.items() if f in done]:
+                future = running.pop(name)
+                try:
+                    outcome, cached, duration = future.result()
+                except Exception as e:
+                    log(f"    Build error in '{name}': {e}", "ERROR")
+                    outcome, cached, duration = OUTCOME_FAILED, False, None
+                record(name, outcome, cached, duration)
+
+    # Cancelled before they could start
+    for proj in projects:
+        status.setdefault(proj["name"], "cancelled")
+
+    report = []
+    built = []
+    build_failed = False
+    for proj in projects:
+        name = proj["name"]
+        step_name = f"{label} | {name}"
+        if status[name] == "built":
+            # Store for Phase 2
+            built.append(resolved[name])
+        elif status[name] in ("failed", "timeout", "cancelled"):
+            log(f"    {BUILD_STATUS[status[name]]}: {step_name}", "FAIL")
+            report.append({"step": step_name, "status": BUILD_STATUS[status[name]]})
+            build_failed = True
+        elif status[name] == "skipped":
+            log(f"    Skipped {step_name}: a prerequisite did not build", "WARN")
+            report.append({"step": step_name, "status": "Skipped (Dependency)"})
+            build_failed = True
+
+    return report, built, build_failed
+
+# ==============================================================================
+# TEST MATRIX
+# ==============================================================================
+# Dimensions in report order; "defines" values are define set names
+MATRIX_DIMENSIONS = ("compiler", "platform", "config", "defines", "openssl")
+MATRIX_STRATEGIES = ("full", "pairwise", "sample")
+DEFAULT_MATRIX_SAMPLE = 10
+
+def matrix_dimensions(cfg, compilers):
+    """
+    Values of every matrix dimension: 'matrix.dimensions' of the config, or else
+    the compilers, platforms, build config and OpenSSL versions of the run.
+    Returns ([(dimension, [values])], define sets {name: [defines]}); dimensions
+    without values (no OpenSSL versions) are left out.
+    """
+    spec = cfg.get("matrix", {}).get("dimensions", {})
+    define_sets = spec.get("defines") or {"": []}
+    values = {
+        "compiler": [c for c in spec.get("compiler", compilers) if c in compilers],
+        "platform": spec.get("platform", cfg["platforms"]),
+        "config": spec.get("config", [cfg["default_config"]]),
+        "defines": list(define_sets),
+        "openssl": spec.get("openssl", cfg.get("dependencies", {}).get("openssl_versions", [])),
+    }
+    for name in spec.get("compiler", []):
+        if name not in compilers:
+            log(f"Matrix compiler '{name}' is not an available compiler", "WARN")
+    return [(d, list(values[d])) for d in MATRIX_DIMENSIONS if values[d]], define_sets
+
+def matches(row, pin):
+    return all(row.get(k) == v for k, v in pin.items())
+
+def pairwise_rows(dims, pins=()):
+    """
+    All-pairs covering array over 'dims': every value of a dimension meets every
+    value of each other dimension in at least one row. Greedy: each new row starts
+    at the first uncovered pair and picks, per remaining dimension, the value
+    covering the most new pairs. 'pins' (partial rows) are completed the same way
+    and come first. Returns [(row, pinned)].
+    """
+    names = [d for d, _ in dims]
+    values = dict(dims)
+    pairs = [(a, va, b, vb) for i, a in enumerate(names) for b in names[i + 1:]
+             for va in values[a] for vb in values[b]]
+    uncovered = set(pairs)
+
+    def gain(row, name, value):
+        return sum(1 for other, ov in row.items()
+                   if (other, ov, name, value) in uncovered or (name, value, other, ov) in uncovered)
+
+    def complete(row):
+        for name in names:
+            if name not in row:
+                # max() keeps the first of equal values, so the array is deterministic
+                row[name] = max(values[name], key=lambda v: gain(row, name, v))
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                uncovered.discard((a, row[a], b, row[b]))
+        return row
+
+    rows = [(complete(dict(pin)), True) for pin in pins]
+    for a, va, b, vb in pairs:
+        if (a, va, b, vb) in uncovered:
+            rows.append((complete({a: va, b: vb}), False))
+    return rows
+
+def expand_matrix(cfg, compilers):
+    """
+    Combinations of the matrix dimensions to run, by the 'matrix.strategy' of the config:
+      full      the whole cross-product (the default)
+      pairwise  an all-pairs covering array (see pairwise_rows())
+      sample    'matrix.sample' random combinations, seeded by 'matrix.seed'
+    The (partial) combinations of 'matrix.pinned' always run.
+    Returns ([combination], dims, define sets); every combination has a value per
+    dimension and its "strategy" (the strategy, or "pinned").
+    """
+    spec = cfg.get("matrix", {})
+    strategy = spec.get("strategy", "full")
+    dims, define_sets = matrix_dimensions(cfg, compilers)
+    values = dict(dims)
+    if "compiler" not in values or "platform" not in values:
+        return [], dims, define_sets
+
+    pins = []
+    for pin in spec.get("pinned", []):
+        bad = [f"{k}={v}" for k, v in pin.items() if k not in values or v not in values[k]]
+        if bad:
+            log(f"Ignoring pinned combination {pin}: {', '.join(bad)} not in the matrix", "WARN")
+        else:
+            pins.append(pin)
+
+    full = [dict(zip(values, combo)) for combo in itertools.product(*values.values())]
+    if strategy == "full":
+        rows = [(row, False) for row in full]
+    elif strategy == "pairwise":
+        rows = pairwise_rows(dims, pins)
+    else:
+        rng = random.Random(spec.get("seed", 0))
+        rows = []
+        for pin in pins:
+            row = rng.choice([r for r in full if matches(r, pin)])
+            if not any(row == r for r, _ in rows):
+                rows.append((row, True))
+        rest = [r for r in full if not any(r == row for row, _ in rows)]
+        count = max(0, int(spec.get("sample", DEFAULT_MATRIX_SAMPLE)) - len(rows))
+        rows += [(row, False) for row in rng.sample(rest, min(count, len(rest)))]
+
+    combos = []
+    seen = []
+    for row, pinned in rows:
+        # Two pins can complete to the same row
+        if row not in seen:
+            seen.append(row)
+            combos.append(dict(row, strategy="pinned" if pinned else strategy))
+    # Report order follows the dimension values, whatever order the strategy produced
+    combos.sort(key=lambda c: [values[d].index(c[d]) for d in values])
+    pinned_count = sum(1 for c in combos if c["strategy"] == "pinned")
+    if strategy != "full" or len(full) > 1:
+        log(f"Matrix ({strategy}): {len(combos)} of {len(full)} combinations"
+            + (f", {pinned_count} pinned" if pinned_count else ""))
+    return combos, dims, define_sets
+
+def target_config(cfg, config_name, defines, openssl_versions):
+    """View of 'cfg' for one target: its build config, extra defines and OpenSSL versions."""
+    view = dict(cfg, default_config=config_name)
+    if defines:
+        build_options = dict(cfg.get("build_options", {}))
+        common = dict(build_options.get("common", {}))
+        common["defines"] = common.get("defines", []) + defines
+        build_options["common"] = common
+        view["build_options"] = build_options
+    if openssl_versions is not None:
+        view["dependencies"] = dict(cfg.get("dependencies", {}), openssl_versions=openssl_versions)
+    return view
+
+# ==============================================================================
+# OPENSSL PREFLIGHT
+# ==============================================================================
+# Written by setup_libs.py next to its manifest (lib\openssl\index.json)
+OPENSSL_INDEX_NAME = "index.json"
+# What happens to matrix legs whose OpenSSL libraries are not installed
+MISSING_OPENSSL_MODES = ("prune", "fail")
+MISSING_OPENSSL_STATUS = "Not Installed"
+
+def openssl_template(dependencies):
+    return dependencies.get("openssl_path", dependencies.get("openssl_root", ""))
+
+def openssl_index_path(dependencies):
+    """'openssl_index' of the config, or INDEX_NAME in the folder above {version} of the path template."""
+    if dependencies.get("openssl_index"):
+        return os.path.abspath(dependencies["openssl_index"])
+    template = openssl_template(dependencies)
+    if "{version}" not in template:
+        return None
+    parts = os.path.normpath(template).split(os.sep)
+    base = list(itertools.takewhile(lambda part: "{" not in part, parts))
+    return os.path.abspath(os.path.join(*base, OPENSSL_INDEX_NAME)) if base else None
+
+def load_openssl_index(path):
+    """The index of setup_libs.py ({"installed": {version: {platform: ...}}}), or None."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable OpenSSL index {path}: {e}", "WARN")
+        return None
+
+def openssl_leg_dir(template, version, platform):
+    """OpenSSL folder of one matrix leg, or None when the template uses other variables."""
+    if set(re.findall(r"\{(\w+)\}", template)) - {"version", "platform"}:
+        return None
+    return os.path.abspath(os.path.normpath(template.format(version=version, platform=platform)))
+
+def check_openssl_leg(dependencies, index, index_path, version, platform):
+    """
+    Checks that the OpenSSL libraries of one matrix leg are installed.
+    Returns (problem, note): 'problem' makes the leg unsatisfiable, 'note'
+    (a version.txt mismatch) is only worth a warning. Both None when fine.
+    """
+    leg_dir = openssl_leg_dir(openssl_template(dependencies), version, platform)
+    if leg_dir is None:
+        return None, None
+    platform_dir = os.path.join(os.path.dirname(index_path), version, platform) if index_path else None
+    try:
+        sub_dir = os.path.relpath(leg_dir, platform_dir) if platform_dir else os.pardir
+    except ValueError:
+        sub_dir = os.pardir  # another drive
+    if index is None or sub_dir.startswith(os.pardir):
+        # No index, or the path template does not follow its <version>\<platform> layout
+        if not os.path.isdir(leg_dir) or not os.listdir(leg_dir):
+            return f"{leg_dir} is missing or empty", None
+        return None, None
+
+    entry = index.get("installed", {}).get(version, {}).get(platform)
+    if entry is None:
+        return "not installed", None
+    prefix = "" if sub_dir == os.curdir else sub_dir.replace(os.sep, "/") + "/"
+    libraries = [lib for lib in entry.get("libraries", []) if lib.startswith(prefix)]
+    if not libraries:
+        return f"no shared libraries in {leg_dir}", None
+    missing = [lib for lib in libraries if not os.path.isfile(os.path.join(platform_dir, *lib.split("/")))]
+    if missing:
+        return f"{len(missing)} of {len(libraries)} libraries missing (e.g. {missing[0]})", None
+    if entry.get("version_txt") and entry["version_txt"] != version:
+        return None, f"version.txt says {entry['version_txt']}"
+    return None, None
+
+def available_openssl(dependencies, index, index_path):
+    """{platform: [versions]} of the index whose libraries are complete on disk."""
+    available = {}
+    for version, platforms in index.get("installed", {}).items():
+        for platform in platforms:
+            if check_openssl_leg(dependencies, index, index_path, version, platform)[0] is None:
+                available.setdefault(platform, []).append(version)
+    return available
+
+def preflight_openssl(targets, cfg, mode="prune"):
+    """
+    Checks every planned matrix leg against the OpenSSL index of setup_libs.py
+    (or the folders, without index) before anything is built. Legs without
+    libraries are taken out of their target ("missing_openssl": {version:
+    reason}) and reported as MISSING_OPENSSL_STATUS; with mode "fail" they
+    also fail the run. Returns the number of such legs.
+    """
+    if not any(p.get("type") == "test" and p.get("matrix") for p in cfg["projects"]):
+        return 0
+    index_path = openssl_index_path(cfg.get("dependencies", {}))
+    index = load_openssl_index(index_path)
+    if index is None:
+        log("No OpenSSL index (run setup_libs.py), checking the OpenSSL folders only", "WARN")
+
+    checked = {}
+    missing_legs = 0
+    for target in targets:
+        # Tests only run on Windows targets
+        if "Win" not in target["platform"]:
+            continue
+        dependencies = target["cfg"].get("dependencies", {})
+        versions = dependencies.get("openssl_versions", [])
+        missing = {}
+        for version in versions:
+            key = (version, target["platform"])
+            if key not in checked:
+                problem, note = check_openssl_leg(dependencies, index, index_path, version, target["platform"])
+                if problem:
+                    log(f"OpenSSL {version} {target['platform']}: {problem}", "WARN")
+                elif note:
+                    log(f"OpenSSL {version} {target['platform']}: {note}", "WARN")
+                checked[key] = problem
+            if checked[key]:
+                missing[version] = checked[key]
+        if missing:
+            target["openssl_versions"] = versions
+            target["missing_openssl"] = missing
+            target["missing_openssl_fails"] = mode == "fail"
+            target["cfg"] = dict(target["cfg"], dependencies=dict(
+                dependencies, openssl_versions=[v for v in versions if v not in missing]))
+            missing_legs += len(missing)
+    if missing_legs:
+        action = "fail the run" if mode == "fail" else "are skipped"
+        log(f"OpenSSL preflight: {missing_legs} matrix leg(s) without libraries {action}", "WARN")
+    return missing_legs
+
+def print_plan(targets, cfg, cli_tags, run_ctx):
+    """--plan: prints the builds and test runs of every target in run order, without running them."""
+    history = run_ctx.get("history")
+    builds = tests = skipped = 0
+    lines = []
+    for target in longest_first(targets, run_ctx):
+        target_cfg = target["cfg"]
+        projects = select_projects(target_cfg["projects"], cli_tags, target.get("impacted"))
+        estimate = history.estimate_target(target["label"]) if history is not None else 0
+        lines.append(f"  {target['label']}" + (f"  (~{estimate:.0f}s)" if estimate else "")
+                     + (f"  [{target['strategy']}]" if target["strategy"] != "full" else ""))
+        lines.append(f"      out   {os.path.relpath(target['out_dir'])}")
+        if not projects:
+            lines.append("      (nothing to build)")
+            continue
+        lines.append(f"      build {', '.join(p['name'] for p in projects)}")
+        builds += len(projects)
+        for proj in projects:
+            if proj.get("type") != "test":
+                continue
+            if "Win" not in target["platform"]:
+                lines.append(f"      test  {proj['name']} (not run on {target['platform']})")
                 continue
+            shards = f" ({proj['shards']} shards)" if proj.get("shards", 1) > 1 else ""
+            if not proj.get("matrix"):
+                lines.append(f"      test  {proj['name']}{shards}")
+                tests += 1
+                continue
+            missing = target.get("missing_openssl", {})
+            for version in target_cfg.get("dependencies", {}).get("openssl_versions", []):
+                lines.append(f"      test  {proj['name']} [{version}]{shards}")
+                tests += 1
+            for version, reason in missing.items():
+                lines.append(f"      skip  {proj['name']} [{version}]: {reason}")
+                skipped += 1
+    print(f"\nPlan: {len(targets)} targets, {builds} builds, {tests} test runs"
+          + (f", {skipped} test runs without OpenSSL" if skipped else ""))
+    print("\n".join(lines))
+
+# ==============================================================================
+# SCHEDULER
+# ==============================================================================
+def resolve_targets(cfg, args, build_dir):
+    """
+    Expands the active compilers, platforms, build configs, define sets and
+    OpenSSL versions into an ordered list of targets (see expand_matrix()).
+    A target builds one compiler | platform | config | define set and runs the
+    OpenSSL versions of its combinations. The list order defines the order of the final report.
+    """
+    dcc_config = cfg.get("dcc", {})
+    active_compilers = cfg.get("default_compilers", [])
 
-            log(f"--- Processing Delphi {comp_id} ---")
-            comp_vars = comp_data.get("variables", {})
+    # If no specific list provided, use all active ones from config
+    if not active_compilers:
+        active_compilers = [k for k, v in dcc_config.items() if v.get("active", False)]
 
-            # 2. Iterate Targets
-            for platform in cfg["platforms"]:
-                
-                target_out_dir = os.path.join(build_dir, "DCC", platform, cfg["default_config"])
-                log_file = os.path.join(build_dir, f"build_{comp_id}_{platform}.log")
-                
-                # We store successfully resolved/built projects here to iterate them for testing later
-                projects_for_execution = []
-                platform_build_failed = False
-
-                # ==================================================================
-                # PHASE 1: BUILD EVERYTHING
-                # ==================================================================
-                log(f"  [Phase 1] Building projects for {platform}...")
-                
-                for proj in cfg["projects"]:
-                    # --- PRE-CHECKS ---
-                    if cli_tags:
-                        proj_tags = set(proj.get("tags", []))
-                        if not cli_tags.intersection(proj_tags):
+    compilers = []
+    for comp_id in active_compilers:
+        comp_data = dcc_config.get(comp_id)
+
+        if not comp_data:
+            log(f"Compiler ID '{comp_id}' not found in config", "WARN")
+            continue
+
+        if not comp_data.get("active", False) and not args.compilers:
+            # Skip inactive unless explicitly requested via CLI
+            continue
+
+        if not os.path.exists(comp_data["path"]):
+            log(f"Compiler {comp_id} rsvars not found", "WARN")
+            continue
+        compilers.append(comp_id)
+
+    combos, dims, define_sets = expand_matrix(cfg, compilers)
+    values = dict(dims)
+    groups = {}
+    for combo in combos:
+        key = (combo["compiler"], combo["platform"], combo["config"], combo["defines"])
+        groups.setdefault(key, []).append(combo)
+
+    targets = []
+    for (comp_id, platform, config_name, define_set), group in groups.items():
+        comp_data = dcc_config[comp_id]
+        # Config and define set only show up in names when the matrix varies them
+        extra = [v or "default" for d, v in (("config", config_name), ("defines", define_set)) if len(values[d]) > 1]
+        versions = [c["openssl"] for c in group] if "openssl" in values else None
+        strategies = {c["strategy"] for c in group}
+        targets.append({
+            "comp_id": comp_id,
+            "rsvars": comp_data["path"],
+            "comp_vars": comp_data.get("variables", {}),
+            "platform": platform,
+            "config": config_name,
+            "label": " | ".join([comp_id, platform] + extra),
+            "defines": define_sets[define_set],
+            "openssl_versions": versions,
+            "cfg": target_config(cfg, config_name, define_sets[define_set], versions),
+            # Which strategy picked the target (its builds) and each of its OpenSSL legs
+            "strategy": strategies.pop() if len(strategies) == 1 else cfg.get("matrix", {}).get("strategy", "full"),
+            "leg_strategy": {c.get("openssl"): c["strategy"] for c in group},
+            # Each compiler gets its own tree so concurrent targets never share outputs
+            "out_dir": os.path.join(build_dir, "DCC", comp_id, platform, config_name,
+                                    *([define_set or "default"] if len(values["defines"]) > 1 else [])),
+            "log_file": os.path.join(build_dir, f"build_{'_'.join([comp_id, platform] + extra)}.log"),
+        })
+
+    return targets
+
+def build_target(target, cfg, cli_tags, run_ctx):
+    """
+    Phase 1 of a target: builds its projects.
+    Returns a state dict consumed by test_target().
+    """
+    cfg = target["cfg"]  # the run config narrowed to this target, see target_config()
+    label = target["label"]
+    tag = f"[{label}]"
+
+    os.makedirs(os.path.dirname(target["log_file"]), exist_ok=True)
+
+    # ==================================================================
+    # PHASE 1: BUILD EVERYTHING
+    # ==================================================================
+    log(f"  {tag} [Phase 1] Building projects...")
+
+    projects = select_projects(cfg["projects"], cli_tags, target.get("impacted"))
+    if not projects:
+        log(f"  {tag} Nothing to build.")
+    with trace_span(f"build {label}", "target", projects=len(projects)):
+        build_report, projects_for_execution, platform_build_failed = build_project_graph(target, projects, cfg, run_ctx)
+    for item in build_report:
+        item["strategy"] = target["strategy"]
+
+    return {
+        "report": build_report,
+        "projects": projects_for_execution,
+        "build_failed": platform_build_failed,
+    }
+
+def test_target(target, build_state, cfg, run_ctx):
+    """
+    Phase 2 of a target: runs the test projects built by build_target().
+    Returns (report_items, success), including the Phase 1 report items.
+    """
+    cfg = target["cfg"]  # the run config narrowed to this target, see target_config()
+    comp_id = target["comp_id"]
+    platform = target["platform"]
+    label = target["label"]
+    target_out_dir = target["out_dir"]
+    log_file = target["log_file"]
+    tag = f"[{label}]"
+    strategy = target["strategy"]
+
+    report = list(build_state["report"])
+    platform_build_failed = build_state["build_failed"]
+    projects_for_execution = build_state["projects"]
+    success = not platform_build_failed
+    common_params = cfg.get("common_params", {})
+    build_id = run_ctx["build_id"]
+    results = run_ctx.get("results")
+    history = run_ctx.get("history")
+
+    # ==================================================================
+    # PHASE 2: RUN TESTS
+    # Only run tests if the build phase for this platform was clean.
+    # Running tests on partial builds often leads to misleading errors.
+    # ==================================================================
+    if not platform_build_failed and projects_for_execution:
+        log(f"  {tag} [Phase 2] Running tests...")
+
+        for proj in projects_for_execution:
+            if proj.get("type") == "test":
+                step_name = f"{label} | {proj['name']}"
+
+                if _run_control.cancelled:
+                    report.append({"step": step_name, "status": "Cancelled", "strategy": strategy})
+                    success = False
+                elif "Win" in platform:
+                    # Legs the OpenSSL preflight took out, see preflight_openssl()
+                    missing = target.get("missing_openssl", {}) if proj.get("matrix") else {}
+                    legs = []
+                    if not missing or cfg.get("dependencies", {}).get("openssl_versions"):
+                        shard_plan = None
+                        if proj.get("shards", 1) > 1:
+                            shard_plan = project_shard_plan(proj, target["comp_vars"], proj["shards"], run_ctx)
+                        leg_estimates = {}
+                        if history is not None:
+                            for ver in cfg.get("dependencies", {}).get("openssl_versions", []):
+                                leg_estimates[ver] = history.estimate("test", f"{step_name} [{ver}]")
+                        with trace_span(f"tests {step_name}", "target"):
+                            legs = run_test_project(
+                                proj,
+                                target_out_dir,
+                                common_params,
+                                cfg.get("dependencies", {}),
+                                build_id,
+                                platform,
+                                cfg["default_config"],
+                                log_file,
+                                matrix_jobs=cfg.get("matrix_jobs", DEFAULT_MATRIX_JOBS),
+                                shard_plan=shard_plan,
+                                trace_label=step_name,
+                                leg_estimates=leg_estimates,
+                                timeout=step_timeout(cfg, proj, "test")
+                            )
+                    if missing:
+                        # Reported in config order with the legs that ran
+                        order = target["openssl_versions"]
+                        legs += [{"version": ver, "missing": reason} for ver, reason in missing.items()]
+                        legs.sort(key=lambda leg: order.index(leg["version"]) if leg["version"] in order else -1)
+                    for leg in legs:
+                        leg_step = f"{step_name} [{leg['version']}]" if leg["version"] else step_name
+                        if "missing" in leg:
+                            report.append({"step": leg_step, "status": MISSING_OPENSSL_STATUS,
+                                           "strategy": target["leg_strategy"].get(leg["version"], strategy)})
+                            if target["missing_openssl_fails"]:
+                                log(f"    {MISSING_OPENSSL_STATUS}: {leg_step} ({leg['missing']})", "FAIL")
+                                success = False
                             continue
+                        if results is not None:
+                            results.add_run(leg_step, step_name, leg["version"], leg["xml"], proj["name"])
+                        report.append({"step": leg_step, "status": TEST_STATUS[leg["outcome"]],
+                                       "strategy": target["leg_strategy"].get(leg["version"], strategy)})
+                        if not leg["success"]:
+                            log(f"    {TEST_STATUS[leg['outcome']]}: {leg_step}", "FAIL")
+                            success = False
+                        if history is not None and leg["duration"] is not None:
+                            history.record("test", leg_step, report[-1]["status"], leg["duration"],
+                                           comp_id, platform, cfg["default_config"], proj["name"], leg["version"])
+                else:
+                    log(f"    Skipping execution for {platform} (Not supported locally)", "INFO")
+    elif platform_build_failed:
+        log(f"  {tag} [Phase 2] Skipping tests due to build failures.", "WARN")
 
-                    try:
-                        resolved_path = proj["path"].format(**comp_vars)
-                    except KeyError as e:
-                        log(f"    Skipping '{proj['name']}': missing variable {e}", "WARN")
-                        continue
+    return report, success
 
-                    if not os.path.exists(resolved_path):
-                        log(f"    Skipping '{proj['name']}': file not found", "WARN")
-                        continue
+def run_target(target, cfg, cli_tags, run_ctx):
+    """
+    Builds and tests a single compiler/platform pair.
+    Returns (report_items, success). Safe to run concurrently with other targets.
+    """
+    build_state = build_target(target, cfg, cli_tags, run_ctx)
+    return test_target(target, build_state, cfg, run_ctx)
 
-                    step_name = f"{comp_id} | {platform} | {proj['name']}"
-                    
-                    # Create a resolved copy of the project config
-                    resolved_proj = proj.copy()
-                    resolved_proj["path"] = resolved_path
-
-                    # --- EXECUTE BUILD ---
-                    success = run_msbuild(
-                        rsvars, resolved_proj, platform, 
-                        cfg["default_config"], target_out_dir, log_file, cfg
-                    )
-                    
-                    if not success:
-                        log(f"    Build Failed: {step_name}", "FAIL")
-                        report.append({"step": step_name, "status": "Build Failed"})
-                        overall_success = False
-                        platform_build_failed = True
-                        # We continue building other projects to see all errors, 
-                        # but we flag the platform as 'dirty'.
-                    else:
-                        # Store for Phase 2
-                        projects_for_execution.append(resolved_proj)
-
-
-                # ==================================================================
-                # PHASE 2: RUN TESTS
-                # Only run tests if the build phase for this platform was clean.
-                # Running tests on partial builds often leads to misleading errors.
-                # ==================================================================
-                if not platform_build_failed and projects_for_execution:
-                    log(f"  [Phase 2] Running tests for {platform}...")
-
-                    for proj in projects_for_execution:
-                        if proj.get("type") == "test":
-                            step_name = f"{comp_id} | {platform} | {proj['name']}"
-
-                            if "Win" in platform:
-                                test_success = run_test_project(
-                                    proj, 
-                                    target_out_dir, 
-                                    common_params, 
-                                    cfg.get("dependencies", {}), # <--- NEW ARGUMENT
-                                    build_id, 
-                                    platform, 
-                                    cfg["default_config"], 
-                                    log_file
-                                )                                
-                                if test_success:
-                                    report.append({"step": step_name, "status": "Passed"})
-                                else:
-                                    log(f"    Test Failed: {step_name}", "FAIL")
-                                    report.append({"step": step_name, "status": "Test Failed"})
-                                    overall_success = False
-                            else:
-                                log(f"    Skipping execution for {platform} (Not supported locally)", "INFO")
-                elif platform_build_failed:
-                    log(f"  [Phase 2] Skipping tests for {platform} due to build failures.", "WARN")
+def target_error(target, e):
+    step_name = target["label"]
+    log(f"Target {step_name} aborted: {e}", "ERROR")
+    return [{"step": step_name, "status": "Error", "strategy": target["strategy"]}], False
 
-        # 3. Final Report
-        print("\n" + "="*80)
-        print(f"{'STEP':<60} | STATUS")
-        print("-" * 80)
-        for item in report:
+def longest_first(targets, run_ctx):
+    """Start order of the targets: longest historical duration first (stable without history)."""
+    history = run_ctx.get("history")
+    if history is None:
+        return list(targets)
+    return sorted(targets, key=lambda t: -history.estimate_target(t["label"]))
+
+def run_targets(targets, cfg, cli_tags, run_ctx):
+    """
+    Runs targets on a pool of 'jobs' workers, longest first.
+    Results are collected in target order, so the report matches a serial run.
+    """
+    jobs = max(1, int(cfg.get("jobs", DEFAULT_JOBS)))
+
+    if cfg.get("pipeline", False):
+        return run_targets_pipelined(targets, cfg, cli_tags, run_ctx, jobs)
+
+    def run_one(target):
+        try:
+            return run_target(target, cfg, cli_tags, run_ctx)
+        except Exception as e:
+            return target_error(target, e)
+
+    if jobs == 1 or len(targets) <= 1:
+        return [run_one(t) for t in targets]
+
+    log(f"Running {len(targets)} targets on {jobs} workers")
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="target") as pool:
+        futures = {id(t): pool.submit(run_one, t) for t in longest_first(targets, run_ctx)}
+        return [futures[id(t)].result() for t in targets]
+
+def run_targets_pipelined(targets, cfg, cli_tags, run_ctx, jobs):
+    """
+    Runs Phase 1 and Phase 2 on separate pools of 'jobs' workers each, so the
+    tests of one target run while the next target compiles.
+    A target whose build failed still skips its tests (see test_target).
+    """
+    log(f"Pipelining {len(targets)} targets: {jobs} build lane(s), {jobs} test lane(s)")
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="build") as build_pool, \
+         ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="test") as test_pool:
+
+        def run_tests(target, build_state):
+            try:
+                return test_target(target, build_state, cfg, run_ctx)
+            except Exception as e:
+                return target_error(target, e)
+
+        def run_build(target):
+            try:
+                build_state = build_target(target, cfg, cli_tags, run_ctx)
+            except Exception as e:
+                return None, target_error(target, e)
+            # Hand over to the test lane, the build lane moves on to the next target
+            return test_pool.submit(run_tests, target, build_state), None
+
+        build_futures = {id(t): build_pool.submit(run_build, t) for t in longest_first(targets, run_ctx)}
+
+        results = []
+        for target in targets:
+            test_future, error_result = build_futures[id(target)].result()
+            results.append(test_future.result() if test_future else error_result)
+        return results
+
+def execute_run(targets, cfg, cli_tags, run_ctx, runner=run_targets):
+    """
+    Builds and tests all targets, cancelled by the "run" timeout of the config.
+    'runner' runs the targets (run_targets, or Coordinator.run for --coordinator).
+    Returns (report_items, success).
+    """
+    report = []
+    success = True
+    _run_control.fail_fast = cfg.get("fail_fast", False)
+    run_timeout = cfg.get("timeouts", {}).get("run")
+    run_timer = None
+    if run_timeout:
+        run_timer = threading.Timer(run_timeout, _run_control.cancel,
+                                    args=(f"global timeout of {run_timeout}s reached", OUTCOME_TIMEOUT))
+        run_timer.daemon = True
+        run_timer.start()
+    try:
+        with trace_span("run targets", "run", targets=len(targets)):
+            for target_report, target_success in runner(targets, cfg, cli_tags, run_ctx):
+                report.extend(target_report)
+                success = success and target_success
+    finally:
+        if run_timer:
+            run_timer.cancel()
+    if _run_control.cancelled:
+        log(f"Run cancelled: {_run_control.reason}", "ERROR")
+        success = False
+    return report, success
+
+def report_run(report, cfg, run_ctx, fixture_times_path):
+    """Prints the step table, test results and first errors of a run, then writes its results files."""
+    # Reduced matrices show which strategy (or pin) picked each row
+    strategies = any(item.get("strategy", "full") != "full" for item in report)
+    print("\n" + "="*80)
+    print(f"{'STEP':<60} | {'STATUS':<20} | STRATEGY" if strategies else f"{'STEP':<60} | STATUS")
+    print("-" * 80)
+    for item in report:
+        if strategies:
+            print(f"{item['step']:<60} | {item['status']:<20} | {item.get('strategy', 'full')}")
+        else:
             print(f"{item['step']:<60} | {item['status']}")
-        print("="*80)
+    print("="*80)
+    results = run_ctx["results"]
+    results.print_report(cfg.get("dependencies", {}).get("openssl_versions", []))
+    _run_diagnostics.print_report()
+    with trace_span("write results", "run"):
+        save_fixture_times(fixture_times_path, run_ctx["fixture_times"], results.fixture_times)
+        if results.runs:
+            junit_path = os.path.join(run_ctx["build_dir"], "junit_summary.xml")
+            results.write_junit(junit_path, [item["step"] for item in report])
+            log(f"JUnit summary: {junit_path}")
+
+# ==============================================================================
+# DISTRIBUTED EXECUTION
+# ==============================================================================
+DEFAULT_DISTRIBUTED = {"lease_timeout": 60, "max_attempts": 3, "unmatched_timeout": 300, "token": ""}
+DIST_POLL = 2.0               # seconds between lease requests of an idle worker
+DIST_CONNECT_TIMEOUT = 60.0   # a worker gives up after this long without reaching the coordinator
+DIST_HTTP_TIMEOUT = 60.0
+# Files of a unit folder sent back to the coordinator (binaries stay on the worker)
+DIST_RESULT_EXTS = (".log", ".xml", ".json")
+
+def unit_path(base_dir, rel_path):
+    """
+    'rel_path' of a unit (sent by the coordinator) resolved below 'base_dir'.
+    Raises ValueError for absolute paths and paths leaving 'base_dir'.
+    """
+    base = os.path.abspath(base_dir)
+    path = os.path.abspath(os.path.join(base, rel_path))
+    if os.path.isabs(rel_path) or path == base or os.path.commonpath([base, path]) != base:
+        raise ValueError(f"'{rel_path}' is outside of {base}")
+    return path
+
+class RecordedResults:
+    """TestResults stand-in of a --worker: keeps the runs, the coordinator parses their files."""
+    def __init__(self):
+        self.runs = []
+
+    def add_run(self, label, series, version, xml_files, project=None):
+        self.runs.append({"label": label, "series": series, "version": version,
+                          "xml": list(xml_files), "project": project})
+
+def installed_openssl(dependencies):
+    """
+    {platform: [versions]} of the complete installs in the OpenSSL index of
+    setup_libs.py or, without index, of the folders matching the 'openssl_path'
+    ('openssl_root') template, e.g. lib\\openssl\\{version}\\{platform}\\shared.
+    None when the template does not use exactly {version} and {platform}.
+    """
+    template = openssl_template(dependencies)
+    index_path = openssl_index_path(dependencies)
+    index = load_openssl_index(index_path)
+    if index is not None:
+        return available_openssl(dependencies, index, index_path)
+    if not template or set(re.findall(r"\{(\w+)\}", template)) != {"version", "platform"}:
+        return None
+    parts = re.split(r"(\{version\}|\{platform\})", os.path.normpath(template))
+    pattern = "".join("*" if p in ("{version}", "{platform}") else glob.escape(p) for p in parts)
+    seen = set()
+    regex = ""
+    for part in parts:
+        if part in ("{version}", "{platform}"):
+            name = part[1:-1]
+            regex += f"(?P={name})" if name in seen else f"(?P<{name}>[^{re.escape(os.sep)}]+)"
+            seen.add(name)
+        else:
+            regex += re.escape(part)
+    found = {}
+    for path in sorted(glob.glob(pattern)):
+        match = re.fullmatch(regex, os.path.normpath(path))
+        if match and os.path.isdir(path):
+            found.setdefault(match.group("platform"), []).append(match.group("version"))
+    return found
+
+def dist_post(url, path, data=None, body=None, token=""):
+    """
+    POSTs JSON 'data' (or the zip 'body') to the coordinator. Returns the JSON
+    reply; HTTP errors come back as {"status": code, "error": ...}. Raises
+    OSError when the coordinator cannot be reached.
+    """
+    headers = {"Content-Type": "application/zip" if body is not None else "application/json"}
+    if token:
+        headers["X-Build-Token"] = token
+    payload = body if body is not None else json.dumps(data or {}).encode("utf-8")
+    request = urllib.request.Request(url.rstrip("/") + path, data=payload, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=DIST_HTTP_TIMEOUT) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        try:
+            reply = json.loads(e.read() or b"{}")
+        except ValueError:
+            reply = {}
+        reply.setdefault("error", f"HTTP {e.code}")
+        reply["status"] = e.code
+        return reply
+
+def run_unit(unit, cfg, run_ctx, unit_dir):
+    """Builds and tests one unit on a worker. Returns the zip with its report and result files."""
+    reset_run_state()
+    _run_control.fail_fast = unit["fail_fast"]
+    comp_data = cfg["dcc"][unit["comp_id"]]
+    target = {
+        "comp_id": unit["comp_id"],
+        "rsvars": comp_data["path"],
+        "comp_vars": comp_data.get("variables", {}),
+        "platform": unit["platform"],
+        "config": unit["config"],
+        "label": unit["label"],
+        "defines": unit["defines"],
+        "openssl_versions": unit["openssl_versions"],
+        "cfg": target_config(cfg, unit["config"], unit["defines"], unit["openssl_versions"]),
+        "strategy": unit["strategy"],
+        "leg_strategy": {version: strategy for version, strategy in unit["leg_strategy"]},
+        "out_dir": unit_path(unit_dir, unit["out_dir"]),
+        "log_file": unit_path(unit_dir, unit["log_file"]),
+    }
+    if unit["impacted"] is not None:
+        target["impacted"] = set(unit["impacted"])
+    run_ctx = dict(run_ctx, build_id=unit["build_id"], build_dir=unit_dir, results=RecordedResults())
+    history = run_ctx.get("history")
+    try:
+        report, success = run_target(target, cfg, set(unit["tags"]), run_ctx)
+    except Exception as e:
+        report, success = target_error(target, e)
+    _run_trace.write(os.path.join(unit_dir, "traces", re.sub(r"[^\w.-]+", "_", unit["label"]) + ".json"))
+
+    meta = {
+        "report": report,
+        "success": success,
+        "runs": [dict(run, xml=[os.path.relpath(p, unit_dir) for p in run["xml"]]) for run in run_ctx["results"].runs],
+        "diagnostics": _run_diagnostics.export(),
+        "history": history.take_steps() if history is not None else [],
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("report.json", json.dumps(meta))
+        for dirpath, _, filenames in os.walk(unit_dir):
+            for name in sorted(filenames):
+                if name.lower().endswith(DIST_RESULT_EXTS):
+                    path = os.path.join(dirpath, name)
+                    archive.write(path, os.path.relpath(path, unit_dir).replace(os.sep, "/"))
+    return buffer.getvalue(), success
+
+def run_worker(url, cfg, args, root_dir, history):
+    """
+    --worker: registers at the coordinator with the compilers and OpenSSL
+    versions of this host, then builds and tests the units it leases until the
+    run is done. Heartbeats keep the lease; a cancel reply stops the unit.
+    """
+    token = dict(DEFAULT_DISTRIBUTED, **cfg.get("distributed", {}))["token"]
+    name = args.worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    compilers = sorted(c for c, d in cfg.get("dcc", {}).items() if os.path.exists(d.get("path", "")))
+    openssl = installed_openssl(cfg.get("dependencies", {}))
+    work_root = os.path.join(root_dir, "_workers", re.sub(r"[^\w.-]+", "_", name))
+
+    cache = None
+    cache_cfg = cfg.get("build_cache", {})
+    if cache_cfg.get("enabled", False):
+        cache = BuildCache(os.path.abspath(cache_cfg.get("dir") or os.path.join(root_dir, "_cache")),
+                           cache_cfg.get("inputs", ["Source"]))
+    store_cfg = cfg.get("dcu_store", {})
+    if store_cfg.get("enabled", False):
+        store_cfg["dir"] = os.path.abspath(store_cfg.get("dir") or os.path.join(root_dir, "_dcu"))
+    index = None
+    if any(p.get("shards", 1) > 1 for p in cfg["projects"]):
+        index_roots = [r for r in cfg.get("impact_roots", ["Source", "Tests", "Packages"]) if os.path.isdir(r)]
+        index = load_unit_index(os.path.join(root_dir, "_cache", "unit_index.json"), index_roots)
+    run_ctx = {"cache": cache, "unit_index": index, "history": history,
+               "fixture_times": load_fixture_times(os.path.join(root_dir, "_cache", "fixture_times.json"))}
+
+    def post(path, data=None, body=None):
+        return dist_post(url, path, data, body, token)
+
+    worker_id = None
+    last_contact = time.monotonic()
+    log(f"Worker {name}: compilers {', '.join(compilers) or 'none'}, coordinator {url}")
+    while True:
+        try:
+            if worker_id is None:
+                reply = post("/register", {"name": name, "compilers": compilers, "openssl": openssl})
+            else:
+                reply = post("/lease", {"worker": worker_id})
+        except OSError as e:
+            if time.monotonic() - last_contact > DIST_CONNECT_TIMEOUT:
+                log(f"Coordinator unreachable for {DIST_CONNECT_TIMEOUT:.0f}s ({e}), worker stops", "WARN")
+                return
+            time.sleep(DIST_POLL)
+            continue
+        last_contact = time.monotonic()
+
+        if reply.get("status") == 404:
+            worker_id = None  # the coordinator dropped us as lost: register again
+            continue
+        if reply.get("status"):
+            log(f"Coordinator refused the worker: {reply['error']}", "ERROR")
+            return
+        if worker_id is None:
+            worker_id = reply["worker"]
+            continue
+        if reply.get("done"):
+            log("Run complete, worker stops")
+            return
+        if "unit" not in reply:
+            time.sleep(reply.get("wait", DIST_POLL))
+            continue
+
+        unit, lease_id = reply["unit"], reply["lease"]
+        log(f"Running unit {unit['label']}")
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(reply["lease_timeout"] / 4.0):
+                try:
+                    answer = post("/heartbeat", {"worker": worker_id, "lease": lease_id})
+                except OSError:
+                    continue
+                if answer.get("lost"):
+                    _run_control.cancel("the coordinator gave the unit to another worker")
+                elif answer.get("cancel"):
+                    _run_control.cancel(answer.get("reason") or "cancelled by the coordinator")
+
+        try:
+            # Never write (or clean) outside of the unit folder, whatever the coordinator sends
+            unit_dir = unit_path(work_root, f"{unit['build_id']}_{unit['id']}")
+            for rel_path in (unit["out_dir"], unit["log_file"]):
+                unit_path(unit_dir, rel_path)
+        except ValueError as e:
+            log(f"Refusing unit {unit['label']}: {e}", "ERROR")
+            continue
+        shutil.rmtree(unit_dir, ignore_errors=True)
+        heartbeat = threading.Thread(target=beat, name="heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            body, success = run_unit(unit, cfg, run_ctx, unit_dir)
+        finally:
+            stop.set()
+            heartbeat.join()
+        log(f"Unit {unit['label']} {'succeeded' if success else 'failed'}, sending results ({len(body) / 2**20:.1f} MB)")
+        for attempt in range(3):
+            try:
+                answer = post("/result?" + urllib.parse.urlencode({"lease": lease_id, "worker": worker_id}), body=body)
+                if answer.get("status"):
+                    log(f"Result of {unit['label']} rejected: {answer['error']}", "WARN")
+                break
+            except OSError as e:
+                log(f"Sending the result failed: {e}", "WARN")
+                time.sleep(DIST_POLL * (attempt + 1))
+        shutil.rmtree(unit_dir, ignore_errors=True)
+
+# ==============================================================================
+# WATCH MODE
+# ==============================================================================
+# Stable build folder of --watch; the "_" prefix keeps it apart from build IDs
+WATCH_BUILD_ID = "_watch"
+WATCH_INTERVAL = 0.5
+WATCH_DEBOUNCE = 1.0
+WATCH_EXTS = IMPACT_SOURCE_EXTS + (".dproj",)
+
+class SourceWatcher:
+    """
+    Detects changed source files by polling their mtime and size; the standard
+    library has no portable change notification. 'roots' are scanned
+    recursively, 'files' one by one. Changes are reported once the files were
+    quiet for WATCH_DEBOUNCE seconds, so saving many files at once (or a git
+    checkout) triggers a single rebuild.
+    """
+    def __init__(self, roots, files=()):
+        self.roots = roots
+        self.files = files
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+
+        def add(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+            state[os.path.normcase(os.path.abspath(path))] = (st.st_mtime_ns, st.st_size)
+
+        for root in self.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in ("__history", "__recovery")]
+                for name in filenames:
+                    if name.lower().endswith(WATCH_EXTS):
+                        add(os.path.join(dirpath, name))
+        for path in self.files:
+            add(path)
+        return state
+
+    def wait(self):
+        """Blocks until files changed; returns their normalized paths (deleted files included)."""
+        changed = set()
+        quiet_since = None
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            state = self._scan()
+            delta = {p for p in set(self.state) | set(state) if self.state.get(p) != state.get(p)}
+            self.state = state
+            if delta:
+                changed |= delta
+                quiet_since = time.monotonic()
+            elif changed and time.monotonic() - quiet_since >= WATCH_DEBOUNCE:
+                return changed
+
+def reset_run_state():
+    """Fresh cancellation, trace and diagnostics for the next run of a --watch session."""
+    global _run_control, _run_trace, _run_diagnostics
+    _run_control = RunControl()
+    _run_trace = RunTrace()
+    _run_diagnostics = StepDiagnostics()
+
+def watch(targets, cfg, cli_tags, run_ctx, index_path, index_roots, fixture_times_path):
+    """
+    --watch: builds and tests everything once into the stable WATCH_BUILD_ID
+    folder, then waits for changes under 'index_roots' and to the project files
+    and rebuilds and re-tests only the affected projects (plus prerequisites).
+    Config, targets, compiler environments and the unit index stay loaded.
+    """
+    dproj_files = set()
+    for target in targets:
+        for proj in cfg["projects"]:
+            try:
+                dproj_files.add(proj["path"].format(**target["comp_vars"]))
+            except KeyError:
+                pass
+    watcher = SourceWatcher(index_roots, sorted(dproj_files))
+    slowest = run_ctx["results"].slowest_count
+    changed = None  # None: first run, all projects
+    try:
+        while True:
+            if changed is not None:
+                shown = ", ".join(os.path.relpath(p) for p in sorted(changed)[:5])
+                log(f"Changed: {shown}{' ...' if len(changed) > 5 else ''}")
+                run_ctx["unit_index"] = load_unit_index(index_path, index_roots)
+                affected = set()
+                for target in targets:
+                    target["impacted"] = impacted_projects(cfg["projects"], target["comp_vars"], changed,
+                                                           run_ctx["unit_index"])
+                    affected |= target["impacted"]
+                if not affected:
+                    log("No project affected")
+                    changed = watcher.wait()
+                    continue
+                log(f"Affected projects: {', '.join(sorted(affected))}")
+
+            started = time.perf_counter()
+            reset_run_state()
+            run_ctx["results"] = TestResults(os.path.join(run_ctx["build_dir"], "results"), slowest)
+            report, success = execute_run(targets, cfg, cli_tags, run_ctx)
+            report_run(report, cfg, run_ctx, fixture_times_path)
+            log(f"{'Succeeded' if success else 'Failed'} in {time.perf_counter() - started:.1f}s",
+                "INFO" if success else "ERROR")
+            log("Watching for changes (Ctrl+C to stop)...")
+            changed = watcher.wait()
+    except KeyboardInterrupt:
+        log("Watch stopped")
+
+# ==============================================================================
+# MAIN
+# ==============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Ossl4Pas Delphi Build Orchestrator")
+    parser.add_argument("--config", help="Path to JSON config file")
+    parser.add_argument("--platforms", help="Comma separated list (Win32,Win64)")
+    parser.add_argument("--compilers", help="Comma separated list of compiler IDs (e.g. 11.0,12.0)")
+    parser.add_argument("--openssl-versions", help="Comma separated list of OpenSSL versions (e.g. 3.0,3.3)")
+    parser.add_argument("--build-config", help="Debug or Release")
+    parser.add_argument("--tags", help="Comma separated list of tags to filter projects")
+    parser.add_argument("--jobs", "-j", type=int, help="Number of compiler/platform targets to run in parallel")
+    parser.add_argument("--project-jobs", type=int, help="Number of independent projects built in parallel inside a target")
+    parser.add_argument("--matrix-jobs", type=int, help="Number of OpenSSL matrix legs run in parallel per test project")
+    parser.add_argument("--pipeline", action="store_true", default=None, help="Run tests of a target while the next target builds")
+    parser.add_argument("--no-pipeline", action="store_false", dest="pipeline")
+    parser.add_argument("--batch", action="store_true", default=None, help="Build the projects of a target with one MSBuild call of a generated traversal project (/m)")
+    parser.add_argument("--no-batch", action="store_false", dest="batch")
+    parser.add_argument("--matrix-strategy", choices=MATRIX_STRATEGIES, help="Expansion of the test matrix: full cross-product, pairwise (all-pairs) or a seeded random sample")
+    parser.add_argument("--matrix-sample", type=int, metavar="N", help=f"Number of combinations of the 'sample' strategy (Default: {DEFAULT_MATRIX_SAMPLE})")
+    parser.add_argument("--matrix-seed", type=int, help="Seed of the 'sample' strategy (Default: 0)")
+    parser.add_argument("--missing-openssl", choices=MISSING_OPENSSL_MODES, help="Matrix legs whose OpenSSL libraries are not installed: skip them (prune) or also fail the run (fail)")
+    parser.add_argument("--plan", action="store_true", help="Print the resolved builds and test runs of every target, then exit without building")
+    parser.add_argument("--fail-fast", action="store_true", default=None, help="Cancel running and queued jobs after the first failed build or test")
+    parser.add_argument("--no-fail-fast", action="store_false", dest="fail_fast")
+    parser.add_argument("--changed-since", metavar="GIT_REV", help="Only build and run the projects affected by changes since this git revision")
+    parser.add_argument("--shards", type=int, help="Number of shards of every test project, overriding their 'shards' (1 disables sharding)")
+    parser.add_argument("--slowest", type=int, default=DEFAULT_SLOWEST, help=f"Number of slowest tests in the final report (Default: {DEFAULT_SLOWEST})")
+    parser.add_argument("--history", nargs="?", const="", metavar="BUILD_ID", help="Print the duration regressions of a recorded run (Default: the latest) and exit")
+    parser.add_argument("--regression-threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, metavar="PERCENT", help=f"Slowdown against the historical median that counts as a regression (Default: {DEFAULT_REGRESSION_THRESHOLD:.0f})")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Echo the output of every build and test process, prefixed with its step")
+    parser.add_argument("--watch", action="store_true", help="Build and test once, then rebuild and re-test the projects affected by every source change")
+    parser.add_argument("--cache", action="store_true", default=None, help="Restore unchanged projects from the build cache instead of running MSBuild")
+    parser.add_argument("--no-cache", action="store_false", dest="cache", help="Always run MSBuild, bypassing the build cache")
+    parser.add_argument("--dcu-store", action="store_true", default=None, help="Compile into the persistent DCU store (incremental builds)")
+    parser.add_argument("--no-dcu-store", action="store_false", dest="dcu_store")
+    parser.add_argument("--reset-dcu-store", action="store_true", help="Empty the DCU store folders of this run before building")
+    parser.add_argument("--artifact-store", action="store_true", default=None, help="Deduplicate the outputs of the run into the artifact store (hardlinks)")
+    parser.add_argument("--no-artifact-store", action="store_false", dest="artifact_store")
+    parser.add_argument("--gc", action="store_true", help="Remove old build folders by the retention policy and unreferenced store objects, then exit")
+    parser.add_argument("--keep-runs", type=int, metavar="N", help="GC: newest runs kept per branch (0 = all)")
+    parser.add_argument("--keep-failed-days", type=float, metavar="DAYS", help="GC: keep failed runs younger than this (0 = off)")
+    parser.add_argument("--max-size-gb", type=float, metavar="GB", help="GC: remove the oldest runs until build folders and store fit (0 = no cap)")
+    parser.add_argument("--dry-run", action="store_true", help="GC: only list what would be removed")
+    parser.add_argument("--coordinator", metavar="[HOST:]PORT", help="Hand the targets of the run to --worker processes on other hosts (port 0 = any free port)")
+    parser.add_argument("--worker", metavar="URL", help="Build and test the targets of the coordinator at URL (e.g. http://buildhost:8765) until its run is done")
+    parser.add_argument("--worker-name", help="Name of this worker in the coordinator's log and trace (Default: host-pid)")
+    parser.add_argument("--clean", action="store_true", help="Clean output on success")
+    parser.add_argument("--no-clean", action="store_false", dest="clean")
+    
+    args = parser.parse_args()    
+    if args.watch and (args.coordinator or args.worker):
+        parser.error("--watch cannot be combined with --coordinator or --worker")
+    if args.coordinator and args.worker:
+        parser.error("--coordinator and --worker are exclusive")
+
+    # 1. Determine Config File Location
+    # We need absolute path to resolve the "root" setting correctly later
+    config_file_path = args.config if args.config else DEFAULT_CONFIG_FILE
+    if not os.path.isabs(config_file_path):
+        config_file_path = os.path.abspath(config_file_path)
+
+    # Load Config
+    with trace_span("load config", "run"):
+        cfg = load_config(args) # Note: ensure load_config uses config_file_path if you modified it
+    # Checked before anything is built
+    address = None
+    if args.coordinator:
+        from dcc_coordinator import coordinator_address
+        address = coordinator_address(args.coordinator, cfg["distributed"]["token"])
+
+    # 2. Handle Root Directory Switching
+    original_cwd = os.getcwd()
+    
+    # Default to current dir if not set
+    relative_root = cfg.get("root", ".") 
+    
+    # Resolve root relative to the CONFIG FILE, not the current execution dir
+    config_dir = os.path.dirname(config_file_path)
+    target_root = os.path.abspath(os.path.join(config_dir, relative_root))
+
+    if not os.path.exists(target_root):
+        log(f"Configured root directory does not exist: {target_root}", "ERROR")
+        sys.exit(1)
+
+    log(f"Switching Working Directory to: {target_root}")
+    os.chdir(target_root)
+
+    try:    
+
+        cli_tags = set(args.tags.split(',')) if args.tags else set()
+        root_dir = os.path.abspath(cfg["output_root"])
+        history = open_history(root_dir)
+
+        if args.history is not None:
+            history_id = args.history or history.latest_run()
+            if not history_id:
+                log("The run history is empty", "WARN")
+                return
+            history.print_regressions(history_id, args.regression_threshold)
+            return
+
+        if args.gc:
+            from dcc_store import collect_garbage
+            collect_garbage(root_dir, history, open_artifact_store(cfg, root_dir), cfg["retention"], args.dry_run)
+            return
+
+        if args.worker:
+            process_runner().verbose = args.verbose
+            run_worker(args.worker, cfg, args, root_dir, history)
+            return
+
+        started = time.time()
+        if args.watch:
+            # One stable folder, so MSBuild and dcc can build incrementally
+            build_id = WATCH_BUILD_ID
+        else:
+            with trace_span("generate build id", "run"):
+                build_id = generate_build_id(cfg["git_path"])
+        build_dir = os.path.join(root_dir, build_id)
         
+        log(f"Starting Build Sequence: {build_id}")
+        if cli_tags:
+            log(f"Filtering projects by tags: {cli_tags}")
+
+        graph_errors = validate_project_graph(cfg["projects"])
+        if graph_errors:
+            for err in graph_errors:
+                log(err, "ERROR")
+            sys.exit(1)
+
+        # 1. Resolve Compiler x Platform Targets
+        with trace_span("resolve targets", "run"):
+            targets = resolve_targets(cfg, args, build_dir)
+
+        # Unit index, used by impact analysis and test sharding
+        index = None
+        index_path = os.path.join(root_dir, "_cache", "unit_index.json")
+        index_roots = [r for r in cfg.get("impact_roots", ["Source", "Tests", "Packages"]) if os.path.isdir(r)]
+        if args.changed_since or args.watch or any(p.get("shards", 1) > 1 for p in cfg["projects"]):
+            with trace_span("unit index", "run"):
+                index = load_unit_index(index_path, index_roots)
+
+        # Test Impact Analysis: restrict every target to the affected projects
+        if args.changed_since:
+            with trace_span("git changed files", "run"):
+                changed = git_changed_files(cfg["git_path"], args.changed_since)
+            if changed is None:
+                log("Impact analysis unavailable, building all projects", "WARN")
+            else:
+                log(f"{len(changed)} files changed since {args.changed_since}")
+                impacted_by_compiler = {}
+                for target in targets:
+                    comp_id = target["comp_id"]
+                    if comp_id not in impacted_by_compiler:
+                        impacted_by_compiler[comp_id] = impacted_projects(
+                            cfg["projects"], target["comp_vars"], changed, index, [config_file_path])
+                        log(f"Affected projects for {comp_id}: {', '.join(sorted(impacted_by_compiler[comp_id])) or 'none'}")
+                    target["impacted"] = impacted_by_compiler[comp_id]
+
+        # OpenSSL preflight: legs without libraries never start a test process
+        # (workers of a --coordinator only lease the legs they have libraries for)
+        if not args.coordinator:
+            with trace_span("openssl preflight", "run"):
+                preflight_openssl(targets, cfg, cfg["missing_openssl"])
+
+        if args.plan:
+            print_plan(targets, cfg, cli_tags, {"history": history})
+            return
+
+        # Build Cache (shared by all targets, lives outside the build ID folder)
+        cache = None
+        cache_cfg = cfg.get("build_cache", {})
+        # A coordinator builds nothing, its workers use their own caches
+        if cache_cfg.get("enabled", False) and not args.coordinator:
+            cache_dir = os.path.abspath(cache_cfg.get("dir") or os.path.join(root_dir, "_cache"))
+            cache = BuildCache(cache_dir, cache_cfg.get("inputs", ["Source"]))
+            log(f"Build cache: {cache_dir}")
+
+        # Persistent DCU Store (opt-in, lives outside the build ID folder)
+        store_cfg = cfg.get("dcu_store", {})
+        if store_cfg.get("enabled", False):
+            store_cfg["dir"] = os.path.abspath(store_cfg.get("dir") or os.path.join(root_dir, "_dcu"))
+            log(f"DCU store: {store_cfg['dir']}")
+
+        # 2. Build & Test Targets
+        fixture_times_path = os.path.join(root_dir, "_cache", "fixture_times.json")
+        run_ctx = {
+            "build_id": build_id,
+            "build_dir": build_dir,
+            "cache": cache,
+            "results": TestResults(os.path.join(build_dir, "results"), args.slowest),
+            "unit_index": index,
+            "fixture_times": load_fixture_times(fixture_times_path),
+            "history": history,
+        }
+        process_runner().verbose = args.verbose
+        if args.watch:
+            # Partial runs would skew the duration baselines
+            run_ctx["history"] = None
+            watch(targets, cfg, cli_tags, run_ctx, index_path, index_roots, fixture_times_path)
+            return
+        if args.coordinator:
+            from dcc_coordinator import Coordinator
+            coordinator = Coordinator(targets, cfg, cli_tags, run_ctx, address)
+            report, overall_success = execute_run(targets, cfg, cli_tags, run_ctx, coordinator.run)
+        else:
+            report, overall_success = execute_run(targets, cfg, cli_tags, run_ctx)
+
+        # 3. Final Report
+        report_run(report, cfg, run_ctx, fixture_times_path)
+        if cache:
+            st = cache.stats
+            print(f"Build cache: {st['hits']} hits, {st['misses']} misses, {st['stored']} stored, "
+                  f"{st['restored_files']} files restored")
+
+        with trace_span("write history", "run"):
+            history.save(build_id, get_git_branch(cfg["git_path"]), started, time.time() - started,
+                         overall_success, cfg["default_config"])
+        history.print_regressions(build_id, args.regression_threshold)
+
+        if cfg.get("artifact_store", {}).get("enabled", False) and os.path.isdir(build_dir) and not (overall_success and cfg["clean_on_success"]):
+            artifact_store = open_artifact_store(cfg, root_dir)
+            with trace_span("artifact store", "run"):
+                artifact_store.ingest(build_dir)
+            st = artifact_store.stats
+            print(f"Artifact store: {st['files']} files, {st['new']} new, {st['linked']} deduplicated "
+                  f"({st['saved_bytes'] / 2**20:.1f} MB saved)")
+
         if overall_success and cfg["clean_on_success"]:
             log("Cleaning up...")
-            try:
-                shutil.rmtree(build_dir)
-            except Exception as e:
-                log(f"Cleanup error: {e}", "WARN")
+            with trace_span("cleanup", "run"):
+                try:
+                    shutil.rmtree(build_dir)
+                except Exception as e:
+                    log(f"Cleanup error: {e}", "WARN")
+
+        _run_trace.print_summary()
+        # A cleaned build folder keeps no files; the trace then goes next to it
+        trace_path = os.path.join(build_dir, "trace.json")
+        if not os.path.isdir(build_dir):
+            trace_path = os.path.join(root_dir, f"{build_id}_trace.json")
+        _run_trace.write(trace_path)
+        log(f"Run trace: {trace_path}")
                 
         if not overall_success:
             sys.exit(1)
@@ -499,4 +3501,4 @@ def main():
         os.chdir(original_cwd)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
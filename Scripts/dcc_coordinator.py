@@ -0,0 +1,307 @@
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import socket
+import threading
+import uuid
+import hmac
+import ipaddress
+import zipfile
+import http.server
+import urllib.parse
+
+# Through the module: reset_run_state() replaces _run_control, _run_trace and _run_diagnostics
+import build_dcc
+from build_dcc import log, longest_first, DEFAULT_DISTRIBUTED, DIST_POLL
+
+# ==============================================================================
+# COORDINATOR
+# ==============================================================================
+# Largest request bodies the coordinator reads: JSON messages and result zips
+DIST_MAX_MESSAGE = 2**20
+DIST_MAX_RESULT = 1024 * 2**20
+
+def coordinator_address(value, token):
+    """
+    (host, port) of --coordinator [HOST:]PORT. Without HOST the coordinator only
+    listens on 127.0.0.1; other hosts need a 'token', or anyone who reaches the
+    port could lease units and post results. Exits on invalid values.
+    """
+    host, _, port = value.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    try:
+        port = int(port)
+        loopback = all(ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback
+                       for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+    except (ValueError, OSError) as e:
+        log(f"Invalid coordinator address '{value}': {e}", "ERROR")
+        sys.exit(1)
+    if not loopback and not token:
+        log(f"The coordinator listens on {host}, reachable from other hosts: set 'distributed.token' first", "ERROR")
+        sys.exit(1)
+    return host, port
+
+class Coordinator:
+    """
+    --coordinator: hands the targets of a run ("units") to --worker processes
+    and collects their reports, logs and test results for the final report.
+    Workers pull work over HTTP/JSON:
+      POST /register   {"name", "compilers", "openssl"}  -> {"worker"}
+      POST /lease      {"worker"}                         -> {"lease", "unit"} | {"wait": s} | {"done": true}
+      POST /heartbeat  {"worker", "lease"}                -> {"cancel", "reason"} | {"lost": true}
+      POST /result?lease=ID&worker=ID  zip of the unit folder with report.json
+    A lease without heartbeat for 'lease_timeout' seconds counts as a lost
+    worker: its unit goes back to the queue, up to 'max_attempts' times.
+    A target is the smallest unit, as its projects share one output folder.
+    Once every unit has a result, the coordinator keeps answering /lease with
+    "done" until each registered worker has heard it (or was dropped as lost).
+    """
+    def __init__(self, targets, cfg, cli_tags, run_ctx, address):
+        dist = dict(DEFAULT_DISTRIBUTED, **cfg.get("distributed", {}))
+        self.lease_timeout = dist["lease_timeout"]
+        self.max_attempts = dist["max_attempts"]
+        self.unmatched_timeout = dist["unmatched_timeout"]
+        self.token = dist["token"]
+        self.address = address  # see coordinator_address()
+        self.run_ctx = run_ctx
+        self.build_dir = run_ctx["build_dir"]
+        self.cond = threading.Condition()
+        self.units = {}
+        self.labels = {}
+        for number, target in enumerate(targets):
+            uid = str(number)
+            self.units[uid] = {
+                "id": uid,
+                "build_id": run_ctx["build_id"],
+                "comp_id": target["comp_id"],
+                "platform": target["platform"],
+                "config": target["config"],
+                "label": target["label"],
+                "defines": target["defines"],
+                "openssl_versions": target["openssl_versions"],
+                "strategy": target["strategy"],
+                "leg_strategy": list(target["leg_strategy"].items()),
+                "impacted": sorted(target["impacted"]) if target.get("impacted") is not None else None,
+                "tags": sorted(cli_tags),
+                "fail_fast": cfg.get("fail_fast", False),
+                "out_dir": os.path.relpath(target["out_dir"], self.build_dir),
+                "log_file": os.path.relpath(target["log_file"], self.build_dir),
+            }
+            self.labels[id(target)] = uid
+        self.pending = [self.labels[id(t)] for t in longest_first(targets, run_ctx)]
+        self.needs_openssl = any(p.get("matrix") for p in cfg["projects"] if p.get("type") == "test")
+        self.leases = {}    # lease id -> {"unit", "worker", "seen", "start"}
+        self.workers = {}   # worker id -> {"name", "compilers", "openssl", "seen"}
+        self.results = {}   # unit id -> (report_items, success)
+        self.attempts = {}
+        self.finished = set()  # workers told that the run is done
+        self.started = time.monotonic()
+
+    def can_take(self, worker, unit):
+        if unit["comp_id"] not in worker["compilers"]:
+            return False
+        if self.needs_openssl and unit["openssl_versions"] and worker["openssl"] is not None:
+            return set(unit["openssl_versions"]) <= set(worker["openssl"].get(unit["platform"], []))
+        return True
+
+    def finish(self, uid, status):
+        unit = self.units[uid]
+        self.results[uid] = ([{"step": unit["label"], "status": status, "strategy": unit["strategy"]}], False)
+
+    # --- Requests (HTTP threads) ---
+    def register(self, data):
+        with self.cond:
+            worker_id = uuid.uuid4().hex[:12]
+            self.workers[worker_id] = {"name": data.get("name", worker_id), "compilers": data.get("compilers", []),
+                                       "openssl": data.get("openssl"), "seen": time.monotonic()}
+        log(f"Worker {data.get('name')} joined (compilers: {', '.join(data.get('compilers', [])) or 'none'})")
+        return 200, {"worker": worker_id}
+
+    def lease(self, data):
+        with self.cond:
+            worker = self.workers.get(data.get("worker"))
+            if len(self.results) == len(self.units):
+                if worker is not None:
+                    self.finished.add(data["worker"])
+                    self.cond.notify_all()
+                return 200, {"done": True}
+            if worker is None:
+                return 404, {"error": "unknown worker"}
+            worker["seen"] = time.monotonic()
+            if build_dcc._run_control.cancelled:
+                return 200, {"wait": DIST_POLL}
+            uid = next((u for u in self.pending if self.can_take(worker, self.units[u])), None)
+            if uid is None:
+                return 200, {"wait": DIST_POLL}
+            self.pending.remove(uid)
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = {"unit": uid, "worker": data["worker"], "seen": time.monotonic(),
+                                     "start": time.perf_counter()}
+        log(f"  [{self.units[uid]['label']}] -> {worker['name']}")
+        return 200, {"lease": lease_id, "unit": self.units[uid], "lease_timeout": self.lease_timeout}
+
+    def heartbeat(self, data):
+        with self.cond:
+            lease = self.leases.get(data.get("lease"))
+            if lease is None:
+                return 200, {"lost": True}
+            lease["seen"] = time.monotonic()
+            if data.get("worker") in self.workers:
+                self.workers[data["worker"]]["seen"] = lease["seen"]
+        return 200, {"cancel": build_dcc._run_control.cancelled, "reason": build_dcc._run_control.reason}
+
+    def result(self, lease_id, worker_id, body):
+        with self.cond:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                return 409, {"error": "lease expired"}
+            if lease["worker"] != worker_id:
+                return 403, {"error": "lease of another worker"}
+            # Taken out first, so an expiring lease cannot requeue the unit meanwhile
+            del self.leases[lease_id]
+        uid = lease["unit"]
+        worker = self.workers.get(lease["worker"], {}).get("name", lease["worker"])
+        try:
+            report, success = self.merge(body)
+        except Exception as e:
+            log(f"Unreadable result of {self.units[uid]['label']} from {worker}: {e}", "ERROR")
+            with self.cond:
+                self.requeue(uid)
+                self.cond.notify_all()
+            return 400, {"error": str(e)}
+        build_dcc._run_trace.add_span(f"unit {self.units[uid]['label']}", "target", lease["start"], time.perf_counter(),
+                            f"worker {worker}", success=success)
+        log(f"  [{self.units[uid]['label']}] {'done' if success else 'failed'} on {worker}",
+            "INFO" if success else "ERROR")
+        if not success:
+            build_dcc._run_control.step_failed(self.units[uid]["label"])
+        with self.cond:
+            self.results[uid] = (report, success)
+            self.cond.notify_all()
+        return 200, {}
+
+    def merge(self, body):
+        """Unpacks a unit result into the build folder, adds its test runs, diagnostics and history steps."""
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            meta = json.loads(archive.read("report.json").decode("utf-8"))
+            root = os.path.abspath(self.build_dir)
+            for info in archive.infolist():
+                target = os.path.abspath(os.path.join(root, info.filename))
+                if info.filename == "report.json" or info.is_dir() or not target.startswith(root + os.sep):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with archive.open(info) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        results = self.run_ctx.get("results")
+        if results is not None:
+            for run in meta["runs"]:
+                results.add_run(run["label"], run["series"], run["version"],
+                                [os.path.join(root, p) for p in run["xml"]], run["project"])
+        build_dcc._run_diagnostics.merge(meta["diagnostics"])
+        history = self.run_ctx.get("history")
+        if history is not None:
+            history.add_steps(meta["history"])
+        return meta["report"], meta["success"]
+
+    def requeue(self, uid):
+        """Puts a unit back in front of the queue, or fails it after 'max_attempts'. Caller holds the lock."""
+        self.attempts[uid] = self.attempts.get(uid, 0) + 1
+        if self.attempts[uid] >= self.max_attempts:
+            log(f"  [{self.units[uid]['label']}] failed on {self.attempts[uid]} workers, giving up", "ERROR")
+            self.finish(uid, "Error")
+        else:
+            self.pending.insert(0, uid)
+
+    # --- Main thread ---
+    def check(self):
+        """Requeues units of lost workers, cancels or fails what cannot run anymore. Caller holds the lock."""
+        now = time.monotonic()
+        for lease_id, lease in list(self.leases.items()):
+            if now - lease["seen"] > self.lease_timeout:
+                del self.leases[lease_id]
+                worker = self.workers.pop(lease["worker"], {"name": lease["worker"]})
+                log(f"Worker {worker['name']} lost, {self.units[lease['unit']]['label']} goes back to the queue", "WARN")
+                self.requeue(lease["unit"])
+        busy = {lease["worker"] for lease in self.leases.values()}
+        for worker_id, worker in list(self.workers.items()):
+            if worker_id not in busy and now - worker["seen"] > self.lease_timeout:
+                del self.workers[worker_id]
+        if build_dcc._run_control.cancelled:
+            for uid in self.pending:
+                self.finish(uid, "Cancelled")
+            self.pending = []
+        elif now - self.started > self.unmatched_timeout:
+            for uid in list(self.pending):
+                unit = self.units[uid]
+                if not any(self.can_take(w, unit) for w in self.workers.values()):
+                    versions = f" and OpenSSL {', '.join(unit['openssl_versions'])}" if self.needs_openssl and unit["openssl_versions"] else ""
+                    log(f"  [{unit['label']}] no worker has compiler {unit['comp_id']}{versions}", "ERROR")
+                    self.pending.remove(uid)
+                    self.finish(uid, "Error")
+
+    def run(self, targets, cfg, cli_tags, run_ctx):
+        """execute_run() runner: serves the workers until every unit has a result, in target order."""
+        server = http.server.ThreadingHTTPServer(self.address, coordinator_handler(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="coordinator", daemon=True).start()
+        log(f"Coordinator listening on http://{self.address[0]}:{server.server_port}: {len(self.units)} units")
+        try:
+            with self.cond:
+                while len(self.results) < len(self.units):
+                    self.check()
+                    self.cond.wait(1.0)
+                # Idle workers poll again within DIST_POLL; check() drops the silent ones
+                while set(self.workers) - self.finished:
+                    self.check()
+                    self.cond.wait(1.0)
+        finally:
+            server.shutdown()
+            server.server_close()
+        return [self.results[self.labels[id(t)]] for t in targets]
+
+def coordinator_handler(coordinator):
+    """Request handler class of the coordinator's HTTP server."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            path, _, query = self.path.partition("?")
+            try:
+                status, reply = self.dispatch(path, query)
+            except Exception as e:
+                status, reply = 500, {"error": str(e)}
+            if status >= 400:
+                # The body may not have been read
+                self.close_connection = True
+            data = json.dumps(reply).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def dispatch(self, path, query):
+            # Checked before anything is read, so strangers cannot make the coordinator buffer data
+            if coordinator.token and not hmac.compare_digest(self.headers.get("X-Build-Token", "").encode("utf-8"),
+                                                             coordinator.token.encode("utf-8")):
+                return 403, {"error": "invalid token"}
+            if path not in ("/result", "/register", "/lease", "/heartbeat"):
+                return 404, {"error": f"unknown request {path}"}
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                return 400, {"error": "invalid Content-Length"}
+            limit = DIST_MAX_RESULT if path == "/result" else DIST_MAX_MESSAGE
+            if not 0 <= length <= limit:
+                return 413, {"error": f"request larger than {limit} bytes"}
+            body = self.rfile.read(length)
+            if path == "/result":
+                params = urllib.parse.parse_qs(query)
+                return coordinator.result(params.get("lease", [""])[0], params.get("worker", [""])[0], body)
+            return getattr(coordinator, path[1:])(json.loads(body or b"{}"))
+
+    return Handler
@@ -0,0 +1,182 @@
+import os
+import threading
+import contextlib
+import sqlite3
+import statistics
+
+from build_dcc import log, DEFAULT_REGRESSION_THRESHOLD
+
+# ==============================================================================
+# RUN HISTORY
+# ==============================================================================
+HISTORY_ESTIMATE_RUNS = 5        # recent runs averaged for scheduling
+HISTORY_BASELINE_RUNS = 10       # earlier runs forming the regression baseline
+HISTORY_MIN_SAMPLES = 3
+REGRESSION_MIN_SECONDS = 1.0     # ignore changes below this, they are noise
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    build_id TEXT PRIMARY KEY, branch TEXT, started REAL, duration REAL, success INTEGER, config TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    build_id TEXT, kind TEXT, step TEXT, compiler TEXT, platform TEXT, config TEXT,
+    project TEXT, openssl TEXT, status TEXT, duration REAL
+);
+CREATE INDEX IF NOT EXISTS steps_by_step ON steps (kind, step);
+"""
+
+# Outcomes that count as a normal run of a step for baselines
+HISTORY_OK_STATUS = {"build": "Built", "test": "Passed"}
+
+class RunHistory:
+    """
+    SQLite database of past runs (<output_root>/_cache/history.db).
+    Steps are collected in memory during the run and written in one
+    transaction by save(), so worker threads never touch the database.
+    The database is opened on first use and only created by save(): reading
+    a missing history (--plan, --gc, --history) finds no runs.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.steps = []
+        self._schema_ready = False
+        self._estimates = None
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                if not self._schema_ready:
+                    db.executescript(HISTORY_SCHEMA)
+                    self._schema_ready = True
+                yield db
+        finally:
+            db.close()
+
+    @property
+    def estimates(self):
+        with self.lock:
+            if self._estimates is None:
+                self._estimates = self._load_estimates()
+            return self._estimates
+
+    def _load_estimates(self):
+        """Average duration of every (kind, step) over its last HISTORY_ESTIMATE_RUNS completed runs."""
+        samples = {}
+        if not self.exists():
+            return samples
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT s.kind, s.step, s.duration FROM steps s JOIN runs r USING (build_id) "
+                "WHERE s.status IN ('Built', 'Cached', 'Passed') ORDER BY r.started DESC").fetchall()
+        for kind, step, duration in rows:
+            values = samples.setdefault((kind, step), [])
+            if len(values) < HISTORY_ESTIMATE_RUNS:
+                values.append(duration)
+        return {key: sum(values) / len(values) for key, values in samples.items()}
+
+    def estimate(self, kind, step, default=None):
+        return self.estimates.get((kind, step), default)
+
+    def estimate_target(self, label):
+        """Historical duration of a whole target (sum of its build and test steps), by its "label"."""
+        prefix = f"{label} | "
+        return sum(v for (kind, step), v in self.estimates.items() if step.startswith(prefix))
+
+    def record(self, kind, step, status, duration, compiler, platform, config, project, openssl=None):
+        with self.lock:
+            self.steps.append((kind, step, compiler, platform, config, project, openssl, status, duration))
+
+    def take_steps(self):
+        """Removes and returns the steps recorded so far (a --worker's unit)."""
+        with self.lock:
+            steps, self.steps = self.steps, []
+        return steps
+
+    def add_steps(self, steps):
+        with self.lock:
+            self.steps.extend(tuple(step) for step in steps)
+
+    def save(self, build_id, branch, started, duration, success, config):
+        with self.lock:
+            steps = list(self.steps)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                       (build_id, branch, started, duration, int(success), config))
+            db.executemany("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(build_id,) + step for step in steps])
+
+    def latest_run(self):
+        if not self.exists():
+            return None
+        with self._connect() as db:
+            row = db.execute("SELECT build_id FROM runs ORDER BY started DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def runs(self):
+        """{build_id: (branch, started, success)} of all recorded runs."""
+        if not self.exists():
+            return {}
+        with self._connect() as db:
+            rows = db.execute("SELECT build_id, branch, started, success FROM runs").fetchall()
+        return {build_id: (branch, started, bool(success)) for build_id, branch, started, success in rows}
+
+    def regressions(self, build_id, threshold=DEFAULT_REGRESSION_THRESHOLD):
+        """
+        Steps of 'build_id' that took more than 'threshold' percent longer than
+        the median of the same step in the HISTORY_BASELINE_RUNS runs before it
+        (runs of the same branch preferred). Returns (run_info, [regression, ...]).
+        """
+        if not self.exists():
+            return None, []
+        with self._connect() as db:
+            run = db.execute("SELECT build_id, branch, started, duration, success, config FROM runs WHERE build_id = ?",
+                             (build_id,)).fetchone()
+            if not run:
+                return None, []
+            steps = db.execute("SELECT kind, step, status, duration FROM steps WHERE build_id = ?", (build_id,)).fetchall()
+            found = []
+            for kind, step, status, duration in steps:
+                if status != HISTORY_OK_STATUS.get(kind):
+                    continue
+                baseline = None
+                for same_branch in (True, False):
+                    rows = db.execute(
+                        "SELECT s.duration FROM steps s JOIN runs r USING (build_id) "
+                        "WHERE s.kind = ? AND s.step = ? AND s.status = ? AND r.started < ? "
+                        + ("AND r.branch = ? " if same_branch else "") +
+                        "ORDER BY r.started DESC LIMIT ?",
+                        (kind, step, status, run[2]) + ((run[1],) if same_branch else ()) + (HISTORY_BASELINE_RUNS,)
+                    ).fetchall()
+                    if len(rows) >= HISTORY_MIN_SAMPLES:
+                        baseline = statistics.median(r[0] for r in rows)
+                        break
+                if not baseline:
+                    continue
+                change = (duration - baseline) / baseline * 100
+                if change > threshold and duration - baseline >= REGRESSION_MIN_SECONDS:
+                    found.append({"kind": kind, "step": step, "duration": duration,
+                                  "baseline": baseline, "change": change})
+        found.sort(key=lambda r: -r["change"])
+        run_info = dict(zip(("build_id", "branch", "started", "duration", "success", "config"), run))
+        return run_info, found
+
+    def print_regressions(self, build_id, threshold=DEFAULT_REGRESSION_THRESHOLD):
+        run, found = self.regressions(build_id, threshold)
+        if not run:
+            log(f"No run '{build_id}' in the history", "WARN")
+            return found
+        if not found:
+            print(f"\nNo duration regressions above {threshold:.0f}% in {run['build_id']}")
+            return found
+        print(f"\nDuration regressions above {threshold:.0f}% in {run['build_id']} (vs. median of up to {HISTORY_BASELINE_RUNS} earlier runs):")
+        for r in found:
+            print(f"  {r['kind']:<5} {r['step']:<50} {r['baseline']:8.2f}s -> {r['duration']:8.2f}s ({r['change']:+.0f}%)")
+        return found
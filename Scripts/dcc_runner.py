@@ -0,0 +1,284 @@
+import os
+import signal
+import asyncio
+import locale
+import subprocess
+import threading
+
+from build_dcc import OUTCOME_TIMEOUT, OutputScanner, _log_lock
+
+# ==============================================================================
+# CHILD PROCESSES
+# ==============================================================================
+if os.name == "nt":
+    import ctypes
+    from ctypes import wintypes
+
+    class _IO_COUNTERS(ctypes.Structure):
+        _fields_ = [(n, ctypes.c_ulonglong) for n in (
+            "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+            "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+    class _JOBOBJECT_BASIC_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [("PerProcessUserTimeLimit", ctypes.c_int64), ("PerJobUserTimeLimit", ctypes.c_int64),
+                    ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+                    ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+                    ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD),
+                    ("SchedulingClass", wintypes.DWORD)]
+
+    class _JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [("BasicLimitInformation", _JOBOBJECT_BASIC_LIMIT_INFORMATION), ("IoInfo", _IO_COUNTERS),
+                    ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+                    ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t)]
+
+    class _JOBOBJECT_BASIC_ACCOUNTING_INFORMATION(ctypes.Structure):
+        _fields_ = [("TotalUserTime", ctypes.c_int64), ("TotalKernelTime", ctypes.c_int64),
+                    ("ThisPeriodTotalUserTime", ctypes.c_int64), ("ThisPeriodTotalKernelTime", ctypes.c_int64),
+                    ("TotalPageFaultCount", wintypes.DWORD), ("TotalProcesses", wintypes.DWORD),
+                    ("ActiveProcesses", wintypes.DWORD), ("TotalTerminatedProcesses", wintypes.DWORD)]
+
+    _JobObjectBasicAccountingInformation = 1
+    _JobObjectExtendedLimitInformation = 9
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    _kernel32.CreateJobObjectW.argtypes = (wintypes.LPVOID, wintypes.LPCWSTR)
+    _kernel32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+    _kernel32.QueryInformationJobObject.argtypes = (wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID,
+                                                    wintypes.DWORD, wintypes.LPDWORD)
+    _kernel32.TerminateJobObject.argtypes = (wintypes.HANDLE, wintypes.UINT)
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    def _job_usage(job):
+        accounting = _JOBOBJECT_BASIC_ACCOUNTING_INFORMATION()
+        limits = _JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
+        usage = {}
+        if _kernel32.QueryInformationJobObject(job, _JobObjectBasicAccountingInformation,
+                                               ctypes.byref(accounting), ctypes.sizeof(accounting), None):
+            # FILETIME units of 100 ns
+            usage["cpu_s"] = round((accounting.TotalUserTime + accounting.TotalKernelTime) / 1e7, 3)
+        if _kernel32.QueryInformationJobObject(job, _JobObjectExtendedLimitInformation,
+                                               ctypes.byref(limits), ctypes.sizeof(limits), None):
+            usage["peak_rss_mb"] = round(limits.PeakProcessMemoryUsed / 2**20, 1)
+        return usage
+
+    _CREATE_SUSPENDED = 0x00000004
+    _PROCESS_SET_QUOTA_TERMINATE_RESUME = 0x0100 | 0x0001 | 0x0800
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    _ntdll = ctypes.WinDLL("ntdll")
+    _ntdll.NtResumeProcess.argtypes = (wintypes.HANDLE,)
+
+    def _resume_in_job(pid):
+        """
+        Assigns the process 'pid', created with CREATE_SUSPENDED, to a new job
+        object and resumes it, so the job holds every descendant it starts.
+        Returns the job, or None when the process could not be assigned (it
+        runs without one). Raises OSError when the process cannot be resumed.
+        """
+        handle = _kernel32.OpenProcess(_PROCESS_SET_QUOTA_TERMINATE_RESUME, False, pid)
+        if not handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+        try:
+            job = _kernel32.CreateJobObjectW(None, None)
+            if job and not _kernel32.AssignProcessToJobObject(job, handle):
+                _kernel32.CloseHandle(job)
+                job = None
+            status = _ntdll.NtResumeProcess(handle)
+            if status < 0:
+                if job:
+                    _kernel32.CloseHandle(job)
+                raise OSError(f"NtResumeProcess failed with status 0x{status & 0xFFFFFFFF:08X}")
+            return job
+        finally:
+            _kernel32.CloseHandle(handle)
+
+def _sample_peak_rss(pid, usage):
+    """
+    Raises usage["peak_rss_mb"] to the VmHWM (peak resident set) of the running
+    process 'pid', from /proc (Linux only). Sampled while the child runs, so a
+    peak in its last moments can be missed.
+    """
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    peak_mb = round(int(line.split()[1]) / 1024, 1)
+                    usage["peak_rss_mb"] = max(usage.get("peak_rss_mb", 0), peak_mb)
+                    return
+    except (OSError, ValueError, IndexError):
+        pass
+
+def kill_process_tree(pid, job=None):
+    """Kills a child and all its descendants (job object on Windows, process group elsewhere)."""
+    try:
+        if os.name == "nt":
+            if job:
+                _kernel32.TerminateJobObject(job, 1)
+            else:
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+class ProcessRunner:
+    """
+    Runs all child processes of a run on one asyncio event loop in a
+    background thread. Output is read line by line as it arrives, written to
+    the step log, scanned and, with --verbose, echoed to the console with the
+    step name as prefix; exits, timeouts and cancellation are awaited on the
+    same loop, so no thread is spent per child.
+    """
+    STREAM_LIMIT = 4 * 2**20
+    # Grace period for output still held by descendants that outlived the child
+    DRAIN_TIMEOUT = 5
+
+    def __init__(self):
+        self.verbose = False
+        self.encoding = locale.getpreferredencoding(False)
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                # The default loop on Windows is the Proactor loop, which supports pipes
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="process-runner", daemon=True).start()
+            return self._loop
+
+    def run(self, cmd, log_file, shell=False, env=None, timeout=None, control=None, label=None):
+        """Blocking entry point for worker threads, see run_child()."""
+        loop = self._event_loop()
+        child = {}
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(cmd, log_file, shell, env, timeout, control, label, child), loop)
+        try:
+            return future.result()
+        except BaseException:
+            # Ctrl+C in the waiting thread: never leave the tree running
+            if "pid" in child:
+                loop.call_soon_threadsafe(kill_process_tree, child["pid"], child.get("job"))
+            future.cancel()
+            raise
+
+    async def _run(self, cmd, log_file, shell, env, timeout, control, label, child):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        usage = {}
+        log_file.flush()
+        if os.name == "nt":
+            # Suspended until it is in its job object: a child that starts
+            # descendants before the assignment would leave them outside
+            if shell:
+                proc = await asyncio.create_subprocess_shell(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                             env=env, limit=self.STREAM_LIMIT,
+                                                             creationflags=_CREATE_SUSPENDED)
+            else:
+                proc = await asyncio.create_subprocess_exec(*cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                                            env=env, limit=self.STREAM_LIMIT,
+                                                            creationflags=_CREATE_SUSPENDED)
+            child["pid"] = proc.pid
+            try:
+                child["job"] = _resume_in_job(proc.pid)
+            except OSError:
+                proc.kill()
+                await proc.wait()
+                raise
+            reader = proc.stdout
+            exited = asyncio.ensure_future(proc.wait())
+        else:
+            # Own process group, so the tree can be killed as a whole. The child
+            # is reaped here with wait4(), which reports the usage of the tree.
+            proc = subprocess.Popen(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    env=env, start_new_session=True)
+            child["pid"] = proc.pid
+            _sample_peak_rss(proc.pid, usage)
+            reader = asyncio.StreamReader(limit=self.STREAM_LIMIT)
+            child["pipe"], _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), proc.stdout)
+            exited = self._posix_exit(proc, usage)
+
+        scanner = OutputScanner()
+        pump = asyncio.ensure_future(self._pump(reader, log_file, scanner, label))
+        stopped = None
+        try:
+            while not exited.done():
+                await asyncio.wait({exited}, timeout=0.25)
+                if exited.done():
+                    break
+                if os.name != "nt":
+                    _sample_peak_rss(child["pid"], usage)
+                if control is not None and control.cancelled:
+                    stopped = control.outcome
+                elif deadline and loop.time() > deadline:
+                    stopped = OUTCOME_TIMEOUT
+                if stopped:
+                    kill_process_tree(child["pid"], child.get("job"))
+                    await exited
+            await asyncio.wait({pump}, timeout=self.DRAIN_TIMEOUT)
+            if child.get("job"):
+                usage.update(_job_usage(child["job"]))
+        except BaseException:
+            kill_process_tree(child["pid"], child.get("job"))
+            raise
+        finally:
+            pump.cancel()
+            if "pipe" in child:
+                child.pop("pipe").close()
+            # An interrupted caller may have closed the log already
+            if not log_file.closed:
+                log_file.buffer.flush()
+            if child.get("job"):
+                _kernel32.CloseHandle(child.pop("job"))
+        return exited.result(), usage, stopped, scanner
+
+    def _posix_exit(self, proc, usage):
+        """Future of the exit code of 'proc', reaped with wait4() once a pidfd (or a poll) reports its exit."""
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+
+        def reap():
+            pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+            if not pid:
+                return False
+            proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            # Not ru_maxrss: exec keeps the high-water mark of the forking
+            # process, so every child would report the orchestrator's RSS
+            usage["cpu_s"] = round(ru.ru_utime + ru.ru_stime, 3)
+            exited.set_result(proc.returncode)
+            return True
+
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+        if pidfd is not None:
+            def on_exit():
+                if reap():
+                    loop.remove_reader(pidfd)
+                    os.close(pidfd)
+            loop.add_reader(pidfd, on_exit)
+        else:
+            def poll(interval=0.01):
+                if not reap():
+                    loop.call_later(interval, poll, min(interval * 2, 0.2))
+            poll()
+        return exited
+
+    async def _pump(self, reader, log_file, scanner, label):
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Longer than STREAM_LIMIT without a line break
+                line = await reader.read(self.STREAM_LIMIT)
+            if not line:
+                break
+            log_file.buffer.write(line)
+            text = line.decode(self.encoding, errors="replace").rstrip("\r\n")
+            scanner.feed(text)
+            if self.verbose:
+                with _log_lock:
+                    print(f"[{label}] {text}" if label else text, flush=True)
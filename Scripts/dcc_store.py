@@ -0,0 +1,167 @@
+import os
+import json
+import shutil
+import time
+
+from build_dcc import log, hash_file, interprocess_lock, build_id_branch, DEFAULT_ARTIFACT_EXTS
+
+# ==============================================================================
+# ARTIFACT STORE
+# ==============================================================================
+class ArtifactStore:
+    """
+    Content-addressed store of build outputs (<output_root>/_store/<sha256[:2]>/<sha256>).
+    The artifacts of a finished build folder are replaced by hardlinks to their
+    store object, so identical EXEs, BPLs and DCUs of many runs take the disk
+    space once. An object with a link count of 1 is used by no build folder
+    anymore and is removed by collect_garbage().
+    Linked files are shared: build folders must not be written in place after ingest().
+    """
+    def __init__(self, store_dir, extensions=None):
+        self.store_dir = store_dir
+        self.extensions = tuple(e.lower() for e in (extensions or DEFAULT_ARTIFACT_EXTS))
+        self.stats = {"files": 0, "new": 0, "linked": 0, "copies": 0, "saved_bytes": 0}
+
+    def lock(self):
+        return interprocess_lock(self.store_dir + ".lock", "artifact store")
+
+    def ingest(self, build_dir):
+        """
+        Moves the artifacts of a completed build folder into the store and lists
+        them in '<build_dir>/artifacts.json' ({relative path: sha256}).
+        """
+        manifest = {}
+        with self.lock():
+            for dirpath, dirnames, filenames in os.walk(build_dir):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if not name.lower().endswith(self.extensions):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    digest = hash_file(path)
+                    manifest[os.path.relpath(path, build_dir).replace(os.sep, "/")] = digest
+                    self._link(path, digest)
+        with open(os.path.join(build_dir, "artifacts.json"), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return manifest
+
+    def _link(self, path, digest):
+        obj = os.path.join(self.store_dir, digest[:2], digest)
+        self.stats["files"] += 1
+        try:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            if not os.path.exists(obj):
+                # The first copy of a content becomes its store object
+                os.link(path, obj)
+                self.stats["new"] += 1
+                return
+            if os.path.samefile(path, obj):
+                return
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            os.link(obj, tmp_path)
+            os.replace(tmp_path, path)
+            self.stats["linked"] += 1
+            self.stats["saved_bytes"] += os.path.getsize(obj)
+        except OSError as e:
+            # No hardlinks here (store on another volume, FAT, ...): the build keeps its copy
+            if not self.stats["copies"]:
+                log(f"Artifact store cannot link {path}: {e}", "WARN")
+            self.stats["copies"] += 1
+
+def disk_usage(paths):
+    """Bytes used by the files below 'paths'; hardlinked files count once."""
+    inodes = {}
+    for path in paths:
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                inodes[(st.st_dev, st.st_ino)] = st.st_size
+    return sum(inodes.values())
+
+def collect_garbage(root_dir, history, store, retention, dry_run=False):
+    """
+    Removes the build folders of 'root_dir' selected by the retention policy,
+    then the store objects no build folder links to anymore.
+    'retention' keys (0 disables a rule):
+      keep_runs         newest runs kept per git branch
+      keep_failed_days  failed runs are kept while younger than this
+      max_size_gb       then the oldest runs go until builds + store fit
+    The newest run of every branch is always kept. Folders starting with "_"
+    (caches, stores, --watch) are never touched. Runs missing from 'history'
+    (interrupted, older versions) have an unknown outcome: they take their
+    branch from the build id and are kept like failed runs; without a branch
+    they are never removed.
+    """
+    recorded = history.runs()
+    runs = []
+    for name in os.listdir(root_dir):
+        path = os.path.join(root_dir, name)
+        if name.startswith("_") or not os.path.isdir(path):
+            continue
+        branch, started, success = recorded.get(name, (build_id_branch(name), os.path.getmtime(path), False))
+        runs.append({"build_id": name, "path": path, "branch": branch, "started": started, "success": success})
+    runs.sort(key=lambda r: r["started"], reverse=True)
+
+    keep_runs = retention.get("keep_runs", 0)
+    keep_failed = retention.get("keep_failed_days", 0) * 86400
+    max_bytes = retention.get("max_size_gb", 0) * 2**30
+    now = time.time()
+    newest = set()
+    per_branch = {}
+    remove = {}
+    for run in runs:
+        if run["branch"] is None:
+            continue
+        count = per_branch[run["branch"]] = per_branch.get(run["branch"], 0) + 1
+        if count == 1:
+            newest.add(run["build_id"])
+        elif keep_runs and count > keep_runs:
+            if run["success"] or not keep_failed or now - run["started"] >= keep_failed:
+                remove[run["build_id"]] = f"beyond the last {keep_runs} runs of {run['branch']}"
+
+    store_dir = store.store_dir
+
+    def kept_paths():
+        return [store_dir] + [r["path"] for r in runs if r["build_id"] not in remove]
+
+    before = disk_usage([store_dir] + [r["path"] for r in runs])
+    if max_bytes:
+        for run in reversed(runs):
+            if disk_usage(kept_paths()) <= max_bytes:
+                break
+            if run["build_id"] not in remove and run["build_id"] not in newest and run["branch"] is not None:
+                remove[run["build_id"]] = f"size cap of {retention['max_size_gb']} GB"
+
+    with store.lock():
+        for run in runs:
+            if run["build_id"] not in remove:
+                continue
+            log(f"{'Would remove' if dry_run else 'Removing'} {run['build_id']} ({remove[run['build_id']]})")
+            if dry_run:
+                continue
+            shutil.rmtree(run["path"], ignore_errors=True)
+            trace_path = os.path.join(root_dir, f"{run['build_id']}_trace.json")
+            if os.path.exists(trace_path):
+                os.remove(trace_path)
+
+        orphans = 0
+        for dirpath, _, filenames in os.walk(store_dir, topdown=False):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.stat(path).st_nlink > 1:
+                    continue
+                orphans += 1
+                if not dry_run:
+                    os.remove(path)
+            if not dry_run and dirpath != store_dir and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+    if dry_run:
+        log(f"GC dry run: {len(remove)} of {len(runs)} runs and {orphans} unreferenced store objects would be removed")
+        return
+    after = disk_usage(kept_paths())
+    log(f"GC: removed {len(remove)} of {len(runs)} runs and {orphans} unreferenced store objects, "
+        f"{(before - after) / 2**20:.1f} MB freed, {after / 2**20:.1f} MB left")
@@ -1,16 +1,33 @@
 import os
 import re
+import sys
+import json
+import time
+import hashlib
+import datetime
 import shutil
+import argparse
+import threading
+import io
+import urllib.error
 import urllib.request
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 # ==============================================================================
 # CONFIGURATION
 # ==============================================================================
 REPO_OWNER = "TaurusTLS-Developers"
 REPO_NAME = "OpenSSL-Distribution"
+# Release assets are served from <BASE_URL>/<tag>/<asset>
+DEFAULT_BASE_URL = f"https://github.com/{REPO_OWNER}/{REPO_NAME}/releases/download"
 # Where to extract files relative to Repo Root
 TARGET_DIR = os.path.join("lib", "openssl")
+# Record of installed archives, relative to TARGET_DIR
+MANIFEST_NAME = "manifest.json"
+# Installed versions/platforms with their shared libraries, read by build_dcc.py
+INDEX_NAME = "index.json"
+INDEX_FORMAT = 1
 
 # Versions to install
 TARGET_VERSIONS =["3.0.19", "3.3.6", "3.4.4", "3.5.5", "3.6.1"]
@@ -29,29 +46,214 @@ TARGET_PLATFORMS = {
     "iOS-sim-arm64.zip":   "iOSSimARM64"
 }
 
+# Build orchestrator config read by --from-config (relative to Scripts/)
+DEFAULT_BUILD_CONFIG = "build_config_dcc.json"
+
+# Download tuning
+DEFAULT_JOBS = 4
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 2.0      # seconds, doubled after every failed attempt
+CHUNK_SIZE = 256 * 1024
+# Archives up to this size (MB) are downloaded into memory instead of a temp file
+DEFAULT_SPOOL_LIMIT = 64
+
 # ==============================================================================
 # LOGIC
 # ==============================================================================
+_log_lock = threading.Lock()
+
 def log(msg):
-    print(f"[SETUP] {msg}")
+    with _log_lock:
+        print(f"[SETUP] {msg}", flush=True)
 
-def download_file(url, dest_path):
-    log(f"Downloading {url}...")
+class ArchiveSink:
+    """
+    Receives the bytes of one download. Archives up to 'spool_limit' bytes stay in
+    memory; larger ones, or an interrupted download from a previous run, go to
+    '<asset>.part' so they can be resumed later. A memory buffer that outgrows
+    the limit rolls over to the '.part' file. The SHA-256 is computed while the
+    data arrives. 'validator' is the ETag or Last-Modified value of the server's
+    copy that the current content belongs to (see fetch_into()).
+    """
+    def __init__(self, part_path, spool_limit, validator=None):
+        self.part_path = part_path
+        self.name = os.path.basename(part_path)[:-len(".part")]
+        self.spool_limit = spool_limit
+        self.validator = validator
+        self.file = None
+        self.sha256 = hashlib.sha256()
+        if os.path.exists(part_path):
+            self.file = open(part_path, 'a+b')
+            self.file.seek(0)
+            for chunk in iter(lambda: self.file.read(CHUNK_SIZE), b""):
+                self.sha256.update(chunk)
+
+    def size(self):
+        if self.file is None:
+            return 0
+        self.file.seek(0, os.SEEK_END)
+        return self.file.tell()
+
+    def begin(self, total_size, append):
+        """Prepares for a response body; 'append' continues the current content."""
+        if self.file is None:
+            if total_size is not None and total_size <= self.spool_limit:
+                self.file = io.BytesIO()
+            else:
+                self.file = open(self.part_path, 'w+b')
+        elif not append:
+            self.file.seek(0)
+            self.file.truncate()
+            self.sha256 = hashlib.sha256()
+        self.file.seek(0, os.SEEK_END)
+
+    def write(self, chunk):
+        if isinstance(self.file, io.BytesIO) and self.file.tell() + len(chunk) > self.spool_limit:
+            # Spill to disk: the server sent more than it announced
+            on_disk = open(self.part_path, 'w+b')
+            on_disk.write(self.file.getvalue())
+            self.file = on_disk
+        self.file.write(chunk)
+        self.sha256.update(chunk)
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.sha256 = hashlib.sha256()
+
+def response_validator(headers):
+    """Value for an If-Range header: a strong ETag, else Last-Modified, else None."""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+def fetch_into(url, sink):
+    """
+    Downloads 'url' into 'sink', resuming from its current size with an HTTP
+    Range request. The range is sent with 'If-Range: <sink.validator>', so a
+    server whose file changed since the partial download sends the whole new
+    file instead. Partial content without a validator is not resumed. Falls back
+    to a full download if the server ignores the range.
+    """
+    offset = sink.size()
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    if offset and sink.validator:
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = sink.validator
+    else:
+        offset = 0
+
+    req = urllib.request.Request(url, headers=headers)
     try:
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req) as response, open(dest_path, 'wb') as out_file:
-            shutil.copyfileobj(response, out_file)
-        return True
-    except Exception as e:
-        log(f"Download failed: {e}")
-        return False
+        response = urllib.request.urlopen(req, timeout=60)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # Range starts at the end: the previous attempt already got every byte
+            return
+        raise
+
+    with response:
+        append = bool(offset) and response.status == 206
+        if append:
+            log(f"Resuming {sink.name} at {offset} bytes")
+        else:
+            offset = 0
+        sink.validator = response_validator(response.headers)
+        length = response.headers.get("Content-Length")
+        expected = offset + int(length) if length else None
+
+        sink.begin(expected, append)
+        for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+            sink.write(chunk)
+
+    # A dropped connection may look like a normal end of stream
+    received = sink.size()
+    if expected is not None and received < expected:
+        raise IOError(f"Connection closed after {received} of {expected} bytes")
+
+def open_zip(sink):
+    """Opens the downloaded archive; its central directory proves it is complete."""
+    sink.file.seek(0)
+    try:
+        return zipfile.ZipFile(sink.file, 'r')
+    except zipfile.BadZipFile:
+        return None
 
-def extract_archive(archive_path, extract_to):
+def download_archive(url, sink, retries=DEFAULT_RETRIES):
+    """
+    Downloads 'url' into the ArchiveSink 'sink' with retries and exponential backoff.
+    Returns True once it holds a complete zip archive. Partial data of on-disk
+    downloads is kept in its '.part' file for a later attempt (or run).
+    """
+    log(f"Downloading {url}...")
+    for attempt in range(1, retries + 2):
+        try:
+            fetch_into(url, sink)
+            archive = open_zip(sink)
+            if archive is not None:
+                archive.close()
+                return True
+            # Corrupt or mixed content: resuming would not help
+            log(f"Downloaded archive is not a valid zip: {sink.name}")
+            sink.discard()
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                log(f"Download failed: {e}")
+                sink.discard()
+                return False
+            log(f"Download failed: {e}")
+        except Exception as e:
+            log(f"Download failed: {e}")
+
+        if attempt <= retries:
+            delay = RETRY_BACKOFF * (2 ** (attempt - 1))
+            log(f"Retrying {sink.name} in {delay:.0f}s ({attempt}/{retries})")
+            time.sleep(delay)
+
+    # Keep an on-disk '.part' file for the next run
+    sink.close()
+    return False
+
+def select_members(names, subtrees):
+    """
+    Filters archive member names to the given subtrees (e.g. 'shared', 'lib/static').
+    'version.txt' is always kept. No subtrees means everything.
+    """
+    if not subtrees:
+        return list(names)
+    prefixes = tuple(t.strip("/") + "/" for t in subtrees)
+    return [n for n in names if n == "version.txt" or n.startswith(prefixes)]
+
+def extract_archive(archive_file, extract_to, subtrees=None):
+    """
+    Extracts a zip (path or file object) into 'extract_to'. Members are unpacked
+    into a staging folder first; zipfile checks every CRC while reading, so a
+    damaged archive raises before anything replaces the installed files.
+    """
     log(f"Extracting to {extract_to}...")
-    os.makedirs(extract_to, exist_ok=True)
-    
-    with zipfile.ZipFile(archive_path, 'r') as z:
-        z.extractall(extract_to)
+    staging = extract_to + ".extracting"
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    try:
+        with zipfile.ZipFile(archive_file, 'r') as z:
+            z.extractall(staging, select_members(z.namelist(), subtrees))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Clean up existing directory if present before swapping in the fresh extraction
+    if os.path.exists(extract_to):
+        shutil.rmtree(extract_to)
+    os.rename(staging, extract_to)
 
 def generate_version_inc(actual_version, target_dir):
     """
@@ -64,7 +266,7 @@ def generate_version_inc(actual_version, target_dir):
     match = re.match(r'^(\d+)\.(\d+)', actual_version)
     if not match:
         log(f"WARNING: Could not parse version '{actual_version}' for define generation.")
-        return
+        return None
 
     major, minor = match.groups()
     define_str = f"{major}_{minor}"
@@ -74,69 +276,317 @@ def generate_version_inc(actual_version, target_dir):
     os.makedirs(inc_dir, exist_ok=True)
     inc_path = os.path.join(inc_dir, "ossl_version_scope.inc")
 
+    content = (f"// Auto-generated by setup_libs.py for OpenSSL {actual_version}\n"
+               f"{{$DEFINE OSSL_{define_str}}}\n{{$DEFINE OSSL_STRICT_{define_str}}}\n")
     with open(inc_path, "w") as f:
-        f.write(f"// Auto-generated by setup_libs.py for OpenSSL {actual_version}\n")
-        f.write(f"{{$DEFINE OSSL_{define_str}}}\n{{$DEFINE OSSL_STRICT_{define_str}}}\n")
+        f.write(content)
     
     log(f"Generated version include: OSSL_{define_str} and OSSL_STRICT_{define_str}")
+    return content
+
+# ==============================================================================
+# MANIFEST
+# ==============================================================================
+_manifest_lock = threading.Lock()
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def hash_tree(root):
+    """Maps every file below 'root' (relative, '/' separated) to its SHA-256."""
+    result = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            result[os.path.relpath(full, root).replace(os.sep, "/")] = hash_file(full)
+    return result
+
+def count_files(root):
+    return sum(len(filenames) for _, _, filenames in os.walk(root))
+
+def load_manifest(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"WARNING: Ignoring unreadable manifest {path}: {e}")
+    return {"entries": {}}
+
+def update_manifest(path, manifest, key, entry, section="entries"):
+    """
+    Sets (or removes, for entry=None) one entry and rewrites the file atomically.
+    Sections: "entries" (installed archives by '<version>/<platform>') and
+    "downloads" (If-Range validator of a kept '.part' file, by asset name).
+    """
+    with _manifest_lock:
+        if entry is None:
+            manifest.setdefault(section, {}).pop(key, None)
+        else:
+            manifest.setdefault(section, {})[key] = entry
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+def check_installed(entry, url, dest, verify, subtrees=None):
+    """
+    Returns None if 'dest' matches its manifest entry, else the reason to reinstall.
+    'verify' re-hashes every file instead of only counting them.
+    """
+    if not entry:
+        return "not in manifest"
+    if entry.get("url") != url:
+        return "source URL changed"
+    if sorted(entry.get("subtrees") or []) != sorted(subtrees or []):
+        return "extracted subtrees changed"
+    if not os.path.isdir(dest):
+        return "folder missing"
+    if count_files(dest) != entry.get("file_count"):
+        return "file count changed"
+    if verify:
+        files = entry.get("files", {})
+        for rel_path, digest in files.items():
+            full = os.path.join(dest, *rel_path.split("/"))
+            if not os.path.isfile(full) or hash_file(full) != digest:
+                return f"hash mismatch: {rel_path}"
+    return None
+
+def is_shared_library(name):
+    lower = name.lower()
+    return lower.endswith((".dll", ".so", ".dylib")) or ".so." in lower
+
+def write_index(base_lib_dir):
+    """
+    Scans '<base_lib_dir>/<version>/<platform>/' and writes INDEX_NAME: per
+    version and platform the 'version.txt' value and the shared libraries
+    (relative, '/' separated). Reflects the folders on disk, including
+    manually copied ones. Returns the index.
+    """
+    installed = {}
+    versions = sorted(os.listdir(base_lib_dir)) if os.path.isdir(base_lib_dir) else []
+    for version in versions:
+        version_dir = os.path.join(base_lib_dir, version)
+        if not os.path.isdir(version_dir) or version.startswith(("_", ".")):
+            continue
+        for platform in sorted(os.listdir(version_dir)):
+            platform_dir = os.path.join(version_dir, platform)
+            if not os.path.isdir(platform_dir) or platform.endswith(".extracting"):
+                continue
+            libraries = []
+            for dirpath, _, filenames in os.walk(platform_dir):
+                for name in filenames:
+                    if is_shared_library(name):
+                        full = os.path.join(dirpath, name)
+                        libraries.append(os.path.relpath(full, platform_dir).replace(os.sep, "/"))
+            version_txt = None
+            version_txt_path = os.path.join(platform_dir, "version.txt")
+            if os.path.isfile(version_txt_path):
+                with open(version_txt_path, "r") as vf:
+                    version_txt = vf.read().strip()
+            installed.setdefault(version, {})[platform] = {"version_txt": version_txt, "libraries": sorted(libraries)}
+
+    index = {
+        "format": INDEX_FORMAT,
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "installed": installed,
+    }
+    index_path = os.path.join(base_lib_dir, INDEX_NAME)
+    os.makedirs(base_lib_dir, exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, index_path)
+    return index
+
+# ==============================================================================
+# INSTALL
+# ==============================================================================
+def install_asset(expected_version, suffix, local_plat, base_lib_dir, temp_dir, args, manifest, manifest_path):
+    """
+    Downloads and installs one release asset unless the manifest shows it is
+    already installed. Returns True if the asset is installed afterwards.
+    """
+    # Construct Tag Name
+    tag = f"v{expected_version}"
+
+    # Construct Asset Name
+    asset_name = f"openssl-{expected_version}-{suffix}"
+    download_url = f"{args.base_url}/{tag}/{asset_name}"
+
+    # Target: <repo_root>/lib/openssl/<version>/<platform>/
+    final_dest = os.path.join(base_lib_dir, expected_version, local_plat)
+    manifest_key = f"{expected_version}/{local_plat}"
+
+    reason = "forced" if args.force else check_installed(
+        manifest["entries"].get(manifest_key), download_url, final_dest, args.verify, args.subtrees)
+    if reason is None:
+        log(f"Up to date: {expected_version} for {local_plat}")
+        return True
+    if manifest_key in manifest["entries"]:
+        log(f"Reinstalling {expected_version} for {local_plat}: {reason}")
+    
+    part_path = os.path.join(temp_dir, asset_name + ".part")
+    
+    # Download (into memory or a '.part' file, depending on the size)
+    sink = ArchiveSink(part_path, args.spool_limit * 1024 * 1024, manifest.get("downloads", {}).get(asset_name))
+    downloaded = download_archive(download_url, sink, args.retries)
+    # A kept '.part' file is only resumed against the same server copy
+    kept = not downloaded and os.path.exists(part_path)
+    update_manifest(manifest_path, manifest, asset_name, sink.validator if kept else None, section="downloads")
+    if not downloaded:
+        log(f"Skipping {expected_version} {local_plat} (Not found or error)")
+        return False
+    archive_sha256 = sink.sha256.hexdigest()
+
+    # Extract "as is" directly from the downloaded data
+    update_manifest(manifest_path, manifest, manifest_key, None)
+    try:
+        sink.file.seek(0)
+        extract_archive(sink.file, final_dest, args.subtrees)
+    except (zipfile.BadZipFile, OSError) as e:
+        log(f"Extraction of {asset_name} failed: {e}")
+        sink.discard()
+        return False
+    sink.discard()
+    
+    # Check for version.txt
+    version_inc = None
+    actual_version = None
+    version_txt_path = os.path.join(final_dest, "version.txt")
+    if not os.path.exists(version_txt_path):
+        log(f"WARNING: version.txt not found in {asset_name}. Skipping include file generation.")
+    else:
+        with open(version_txt_path, "r") as vf:
+            actual_version = vf.read().strip()
+            
+        # Compare extracted version against expected version
+        if actual_version != expected_version:
+            log(f"WARNING: Version mismatch! Expected '{expected_version}' but found '{actual_version}' in version.txt.")
+            
+        # Generate Version Include File using the version found in version.txt
+        version_inc = generate_version_inc(actual_version, final_dest)
+
+    files = hash_tree(final_dest)
+    update_manifest(manifest_path, manifest, manifest_key, {
+        "url": download_url,
+        "archive_sha256": archive_sha256,
+        "version_txt": actual_version,
+        "version_inc": version_inc,
+        "subtrees": args.subtrees,
+        "file_count": len(files),
+        "files": files,
+        "installed": datetime.datetime.now().isoformat(timespec="seconds"),
+    })
+    
+    log(f"Installed {expected_version} for {local_plat}")
+    return True
+
+def split_list(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+def resolve_selection(args, repo_root):
+    """
+    Returns (versions, {suffix: local_platform}, subtrees) to install.
+    Precedence: defaults < build config (--from-config) < CLI lists.
+    """
+    versions = list(TARGET_VERSIONS)
+    platforms = list(TARGET_PLATFORMS.values())
+    subtrees = []
+
+    if args.from_config is not None:
+        config_path = args.from_config or os.path.join(repo_root, "Scripts", DEFAULT_BUILD_CONFIG)
+        try:
+            with open(config_path, "r") as f:
+                build_cfg = json.load(f)
+        except (OSError, ValueError) as e:
+            log(f"ERROR: Cannot read build config {config_path}: {e}")
+            sys.exit(1)
+        deps = build_cfg.get("dependencies", {})
+        versions = deps.get("openssl_versions", versions)
+        platforms = build_cfg.get("platforms", platforms)
+        subtrees = deps.get("openssl_subtrees", subtrees)
+        log(f"Selection from {config_path}")
+
+    if args.versions:
+        versions = split_list(args.versions)
+    if args.platforms:
+        platforms = split_list(args.platforms)
+    if args.subtrees:
+        subtrees = split_list(args.subtrees)
+
+    by_platform = {local_plat: suffix for suffix, local_plat in TARGET_PLATFORMS.items()}
+    for plat in platforms:
+        if plat not in by_platform:
+            log(f"WARNING: Unknown platform '{plat}' (known: {', '.join(by_platform)})")
+    selected = {by_platform[p]: p for p in platforms if p in by_platform}
+
+    return versions, selected, subtrees
 
 def main():
+    parser = argparse.ArgumentParser(description="Downloads the OpenSSL binaries used by the Ossl4Pas tests")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS, help=f"Parallel downloads (Default: {DEFAULT_JOBS})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help=f"Retries per archive (Default: {DEFAULT_RETRIES})")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="Release download URL (<base-url>/<tag>/<asset>), e.g. a local mirror")
+    parser.add_argument("--spool-limit", type=int, default=DEFAULT_SPOOL_LIMIT, metavar="MB",
+                        help=f"Keep archives up to this size in memory, larger ones go to _temp_deps (Default: {DEFAULT_SPOOL_LIMIT})")
+    parser.add_argument("--verify", action="store_true", help="Re-hash installed files against the manifest and reinstall mismatches")
+    parser.add_argument("--force", action="store_true", help="Reinstall everything, ignoring the manifest")
+    parser.add_argument("--versions", help="Comma separated OpenSSL versions (e.g. 3.0.19,3.6.1)")
+    parser.add_argument("--platforms", help="Comma separated platforms (e.g. Win32,Win64)")
+    parser.add_argument("--subtrees", help="Comma separated archive folders to extract (e.g. shared,lib/static)")
+    parser.add_argument("--from-config", nargs="?", const="", metavar="CONFIG",
+                        help=f"Install only the 'openssl_versions' and 'platforms' of a build config (Default: Scripts/{DEFAULT_BUILD_CONFIG})")
+    parser.add_argument("--index-only", action="store_true", help=f"Only rewrite {INDEX_NAME} from the installed folders, without downloading")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+
     # 1. Resolve Paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     repo_root = os.path.dirname(script_dir)
     base_lib_dir = os.path.join(repo_root, TARGET_DIR)
+    if args.index_only:
+        index = write_index(base_lib_dir)
+        log(f"Index: {os.path.join(base_lib_dir, INDEX_NAME)} "
+            f"({sum(len(p) for p in index['installed'].values())} version/platform folders)")
+        return
+    # Kept between runs: it holds the '.part' files of interrupted downloads
     temp_dir = os.path.join(repo_root, "_temp_deps")
+    os.makedirs(temp_dir, exist_ok=True)
+    manifest_path = os.path.join(base_lib_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
 
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
-    os.makedirs(temp_dir)
-
-    # 2. Iterate Versions
-    for expected_version in TARGET_VERSIONS:
-        # Construct Tag Name
-        tag = f"v{expected_version}"
-        
-        for suffix, local_plat in TARGET_PLATFORMS.items():
-            # Construct Asset Name
-            asset_name = f"openssl-{expected_version}-{suffix}"
-            download_url = f"https://github.com/{REPO_OWNER}/{REPO_NAME}/releases/download/{tag}/{asset_name}"
-            
-            local_archive = os.path.join(temp_dir, asset_name)
-            
-            # Download
-            if download_file(download_url, local_archive):
-                # Target: <repo_root>/lib/openssl/<version>/<platform>/
-                final_dest = os.path.join(base_lib_dir, expected_version, local_plat)
-                
-                # Clean up existing directory if present before fresh extraction
-                if os.path.exists(final_dest):
-                    shutil.rmtree(final_dest)
-                    
-                # Extract "as is" directly to destination
-                extract_archive(local_archive, final_dest)
-                
-                # Check for version.txt
-                version_txt_path = os.path.join(final_dest, "version.txt")
-                if not os.path.exists(version_txt_path):
-                    log(f"WARNING: version.txt not found in {asset_name}. Skipping include file generation.")
-                else:
-                    with open(version_txt_path, "r") as vf:
-                        actual_version = vf.read().strip()
-                        
-                    # Compare extracted version against expected version
-                    if actual_version != expected_version:
-                        log(f"WARNING: Version mismatch! Expected '{expected_version}' but found '{actual_version}' in version.txt.")
-                        
-                    # Generate Version Include File using the version found in version.txt
-                    generate_version_inc(actual_version, final_dest)
-                
-                log(f"Installed {expected_version} for {local_plat}")
-            else:
-                log(f"Skipping {expected_version} {local_plat} (Not found or error)")
+    # 2. Iterate Versions x Platforms
+    versions, platforms, args.subtrees = resolve_selection(args, repo_root)
+    log(f"Versions: {', '.join(versions)} | Platforms: {', '.join(platforms.values())}"
+        + (f" | Subtrees: {', '.join(args.subtrees)}" if args.subtrees else ""))
+    tasks = [(version, suffix, local_plat)
+             for version in versions
+             for suffix, local_plat in platforms.items()]
+
+    def run_task(task):
+        version, suffix, local_plat = task
+        try:
+            return install_asset(version, suffix, local_plat, base_lib_dir, temp_dir, args, manifest, manifest_path)
+        except Exception as e:
+            log(f"Failed to install {version} {local_plat}: {e}")
+            return False
 
-    # Cleanup
-    shutil.rmtree(temp_dir)
-    log("Dependency setup complete.")
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        results = list(pool.map(run_task, tasks))
+
+    # Cleanup (partial downloads stay for the next run)
+    if not os.listdir(temp_dir):
+        shutil.rmtree(temp_dir)
+    log(f"Dependency setup complete: {sum(results)} of {len(tasks)} archives installed.")
+    log(f"Manifest: {manifest_path}")
+    write_index(base_lib_dir)
+    log(f"Index: {os.path.join(base_lib_dir, INDEX_NAME)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
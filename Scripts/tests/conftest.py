@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import bench_dcc
+
+# Small enough for a test run, but with dependencies, tests and matrix legs
+BENCH_PARAMS = dict(bench_dcc.SCENARIOS["matrix"], projects=6, compilers=2, platforms=2, openssl_versions=2,
+                    build_sleep=0.0, test_sleep=0.0, output_lines=5, tests=4, jobs=2)
+
+@pytest.fixture
+def bench_repo(tmp_path, monkeypatch):
+    """
+    Synthetic repository of bench_dcc.py with its stand-in rsvars, msbuild,
+    test executables and OpenSSL folders, as the current directory.
+    Returns (config path, settings, config).
+    """
+    if os.name == "nt":
+        pytest.skip("the bench stand-ins are POSIX scripts")
+    config_path, settings, cfg = bench_dcc.generate_repo(str(tmp_path), BENCH_PARAMS)
+    monkeypatch.chdir(tmp_path)
+    return config_path, settings, cfg
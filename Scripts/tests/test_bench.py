@@ -0,0 +1,37 @@
+import os
+import shutil
+
+import pytest
+
+import bench_dcc
+
+def expected_steps(cfg):
+    """Stand-in builds and test legs of a full run of 'cfg'."""
+    targets = len(cfg["default_compilers"]) * len(cfg["platforms"])
+    win_targets = len(cfg["default_compilers"]) * sum("Win" in p for p in cfg["platforms"])
+    legs = sum(len(cfg["dependencies"]["openssl_versions"]) if p.get("matrix") else 1
+               for p in cfg["projects"] if p["type"] == "test")
+    return targets * len(cfg["projects"]) + win_targets * legs
+
+@pytest.mark.parametrize("extra_args", [[], ["--batch", "--pipeline"]], ids=["default", "batch-pipeline"])
+def test_bench_run(bench_repo, extra_args):
+    config_path, settings, cfg = bench_repo
+    metrics = bench_dcc.run_once(os.getcwd(), config_path, settings, cfg, extra_args, startup=0.0)
+    assert metrics["steps"] == expected_steps(cfg)
+    assert 0 < metrics["critical_path_s"] <= metrics["wall_s"]
+    assert metrics["log_mb"] > 0
+
+def test_bench_fails_when_legs_are_skipped(bench_repo):
+    config_path, settings, cfg = bench_repo
+    version = cfg["dependencies"]["openssl_versions"][-1]
+    shutil.rmtree(os.path.join("lib", "openssl", version, cfg["platforms"][0]))
+    with pytest.raises(RuntimeError, match="matrix leg"):
+        bench_dcc.run_once(os.getcwd(), config_path, settings, cfg, [], startup=0.0)
+
+def test_compare_reports_only_real_regressions():
+    base = {"wall_s": 10.0, "parallelism": 4.0, "step_overhead_ms": 20.0}
+    assert bench_dcc.compare(dict(base, wall_s=10.4), base, 20.0) == []
+    assert [key for key, _ in bench_dcc.compare(dict(base, wall_s=13.0), base, 20.0)] == ["wall_s"]
+    # Higher is better for parallelism
+    assert [key for key, _ in bench_dcc.compare(dict(base, parallelism=2.0), base, 20.0)] == ["parallelism"]
+    assert bench_dcc.compare(dict(base, parallelism=6.0), base, 20.0) == []
@@ -0,0 +1,70 @@
+import os
+
+import build_dcc
+
+def package(tmp_path, name, dproj_suffix=None, dpk_suffix=None):
+    """A project whose .dproj (<DllSuffix>) or .dpk ({$LIBSUFFIX}) declares a suffix."""
+    folder = tmp_path / name
+    folder.mkdir()
+    dproj = "<Project><PropertyGroup>"
+    if dproj_suffix is not None:
+        dproj += f"<DllSuffix>{dproj_suffix}</DllSuffix>"
+    (folder / f"{name}.dproj").write_text(dproj + "</PropertyGroup></Project>\n")
+    if dpk_suffix is not None:
+        (folder / f"{name}.dpk").write_text(f"package {name};\n\n{{$LIBSUFFIX {dpk_suffix}}}\n\nend.\n")
+    return {"name": name, "path": str(folder / f"{name}.dproj")}
+
+OUTPUT_FOLDER = ["Test_API.exe", "Test_API.map", "Test_API_Ext.exe", "Test_API_Ext.map", "Test_APIx.exe",
+                 "Ossl4Pas_rt.bpl", "Ossl4Pas_rt.dcp", "Ossl4Pas_rt290.bpl", "Ossl4Pas_rt_ext.bpl", "Ossl4Pas_rt29a.bpl"]
+
+def test_outputs_match_exact_project_name(tmp_path):
+    project = package(tmp_path, "Test_API")
+    assert build_dcc.project_lib_suffix(project) == ""
+    assert build_dcc.project_outputs(project, OUTPUT_FOLDER) == ["Test_API.exe", "Test_API.map"]
+    assert build_dcc.project_outputs(package(tmp_path, "Test_API_Ext"), OUTPUT_FOLDER) == \
+        ["Test_API_Ext.exe", "Test_API_Ext.map"]
+
+def test_outputs_with_dproj_suffix(tmp_path):
+    project = package(tmp_path, "Ossl4Pas_rt", dproj_suffix="290")
+    assert build_dcc.project_lib_suffix(project) == "290"
+    assert build_dcc.project_outputs(project, OUTPUT_FOLDER) == ["Ossl4Pas_rt.bpl", "Ossl4Pas_rt.dcp", "Ossl4Pas_rt290.bpl"]
+
+def test_outputs_with_auto_suffix(tmp_path):
+    project = package(tmp_path, "Ossl4Pas_rt", dproj_suffix="$(Auto)")
+    assert build_dcc.project_lib_suffix(project) == "auto"
+    # The package version, but not another package or a non-numeric suffix
+    assert build_dcc.project_outputs(project, OUTPUT_FOLDER) == \
+        ["Ossl4Pas_rt.bpl", "Ossl4Pas_rt.dcp", "Ossl4Pas_rt290.bpl"]
+
+def test_dpk_suffix(tmp_path):
+    assert build_dcc.project_lib_suffix(package(tmp_path, "Quoted", dpk_suffix="'_d29'")) == "_d29"
+    assert build_dcc.project_lib_suffix(package(tmp_path, "Auto", dpk_suffix="AUTO")) == "auto"
+    # <DllSuffix> of the .dproj wins over the .dpk
+    assert build_dcc.project_lib_suffix(package(tmp_path, "Both", dproj_suffix="290", dpk_suffix="'_x'")) == "290"
+
+def test_key_covers_libraries_and_compiler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    project = package(tmp_path, "Test_API")
+    (tmp_path / "FastMM5").mkdir()
+    (tmp_path / "FastMM5" / "FastMM5.pas").write_text("unit FastMM5;\n")
+    (tmp_path / "DUnitX" / "Source").mkdir(parents=True)
+    (tmp_path / "DUnitX" / "Source" / "DUnitX.TestFramework.pas").write_text("unit DUnitX.TestFramework;\n")
+    rsvars = tmp_path / "rsvars.bat"
+    rsvars.write_text("@SET BDS=C:\\Delphi\n")
+    cfg = {"build_options": {"common": {"env_vars": {"FASTMM5": "FastMM5"},
+                                        "search_paths": ["DUnitX/Source", "missing"]}}}
+    cache = build_dcc.BuildCache(str(tmp_path / "_cache"), [])
+
+    def key():
+        return cache.compute_key(project, "DCC290", "Win64", "Debug", cfg, str(rsvars))
+
+    keys = [key()]
+    assert key() == keys[0]
+    (tmp_path / "FastMM5" / "FastMM5.pas").write_text("unit FastMM5;\n// changed\n")
+    keys.append(key())
+    (tmp_path / "DUnitX" / "Source" / "DUnitX.TestFramework.pas").write_text("unit DUnitX.TestFramework;\n// changed\n")
+    keys.append(key())
+    stat = rsvars.stat()
+    os.utime(rsvars, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    keys.append(key())
+    assert len(set(keys)) == 4
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import bench_dcc
+import build_dcc
+
+@pytest.fixture
+def captures(monkeypatch):
+    """Fresh capture cache; returns the list of scripts capture_script_env() ran."""
+    ran = []
+    capture = build_dcc.capture_script_env
+
+    def counting(script):
+        ran.append(script)
+        return capture(script)
+
+    monkeypatch.setattr(build_dcc, "_compiler_envs", {})
+    monkeypatch.setattr(build_dcc, "capture_script_env", counting)
+    return ran
+
+def test_env_captured_once_per_script(bench_repo, captures):
+    _, _, cfg = bench_repo
+    for comp_id, comp in cfg["dcc"].items():
+        for _ in range(3):
+            env = build_dcc.compiler_env(comp["path"])
+            assert env["BENCH_COMPILER"] == comp_id
+    assert sorted(captures) == sorted(comp["path"] for comp in cfg["dcc"].values())
+
+def test_env_recaptured_after_script_changes(bench_repo, captures):
+    _, _, cfg = bench_repo
+    rsvars = next(iter(cfg["dcc"].values()))["path"]
+    build_dcc.compiler_env(rsvars)
+    mtime = os.path.getmtime(rsvars)
+    os.utime(rsvars, (mtime + 10, mtime + 10))
+    build_dcc.compiler_env(rsvars)
+    assert captures == [rsvars, rsvars]
+
+def test_failing_script(tmp_path, captures):
+    if os.name == "nt":
+        pytest.skip("POSIX env script")
+    script = str(tmp_path / "rsvars.sh")
+    bench_dcc.write_script(script, ["#!/bin/sh", "exit 3"])
+    assert build_dcc.compiler_env(script) is None
+
+def test_msbuild_runs_with_captured_env(bench_repo, captures, tmp_path):
+    _, settings, cfg = bench_repo
+    comp_id, comp = sorted(cfg["dcc"].items())[-1]
+    project = next(p for p in cfg["projects"] if p["type"] == "package")
+    output_dir = str(tmp_path / "out")
+    outcome = build_dcc.run_msbuild(comp["path"], project, "Win64", "Debug", output_dir,
+                                    str(tmp_path / "build.log"), cfg, step=f"{comp_id} | Win64 | {project['name']}")
+    assert outcome == build_dcc.OUTCOME_OK
+    assert os.path.isfile(os.path.join(output_dir, project["name"] + ".bpl"))
+    # The stand-in msbuild was found on, and ran with, the PATH of the rsvars script
+    events = bench_dcc.load_events(settings["events"])
+    assert [(e["kind"], e["compiler"], e["project"]) for e in events] == [("build", comp_id, project["name"])]
+    assert captures == [comp["path"]]
@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import json
+import threading
+import subprocess
+import http.client
+import http.server
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import bench_dcc
+import build_dcc
+import dcc_coordinator
+
+RUN_TIMEOUT = 120
+
+def start(config_path, *args):
+    return subprocess.Popen([sys.executable, "-u", bench_dcc.BUILD_SCRIPT, "--config", config_path] + list(args),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+def test_two_workers_round_trip(bench_repo):
+    config_path, settings, cfg = bench_repo
+    # Long enough builds that the second worker joins before the first one is done
+    settings["build_sleep"] = 0.2
+    with open(settings["settings_path"], "w") as f:
+        json.dump(settings, f)
+
+    coordinator = start(config_path, "--coordinator", "0")
+    lines = []
+    for line in coordinator.stdout:
+        lines.append(line)
+        match = re.search(r"Coordinator listening on (http://\S+):", line)
+        if match:
+            url = match.group(1)
+            break
+    else:
+        pytest.fail("coordinator did not start:\n" + "".join(lines))
+    workers = [start(config_path, "--worker", url, "--worker-name", name) for name in ("wa", "wb")]
+    try:
+        outputs = [w.communicate(timeout=RUN_TIMEOUT)[0] for w in workers]
+        lines += coordinator.communicate(timeout=RUN_TIMEOUT)[0].splitlines(True)
+    finally:
+        for proc in [coordinator] + workers:
+            proc.kill()
+    output = "".join(lines)
+
+    assert coordinator.returncode == 0, output
+    for worker, worker_output in zip(workers, outputs):
+        assert worker.returncode == 0, worker_output
+        assert "Run complete, worker stops" in worker_output
+    targets = len(cfg["default_compilers"]) * len(cfg["platforms"])
+    done = re.findall(r"\] done on (\w+)", output)
+    assert len(done) == targets
+    assert set(done) == {"wa", "wb"}
+    # Every build and matrix leg ran on a worker, and the results reached the coordinator
+    bench_dcc.check_matrix_legs(bench_dcc.load_events(settings["events"]), cfg)
+    build_dirs = [d for d in os.listdir("_build") if not d.startswith("_")]
+    assert len(build_dirs) == 1
+    summary = ET.parse(os.path.join("_build", build_dirs[0], "junit_summary.xml")).getroot()
+    legs = sum(1 for e in bench_dcc.load_events(settings["events"]) if e["kind"] == "test")
+    assert (summary.get("tests"), summary.get("failures")) == (str(legs * settings["tests"]), "0")
+
+@pytest.mark.parametrize("rel_path", ["../x", "a/../../b", "", ".", os.path.abspath(os.sep)])
+def test_unit_path_rejects_escapes(tmp_path, rel_path):
+    with pytest.raises(ValueError):
+        build_dcc.unit_path(str(tmp_path), rel_path)
+
+def test_unit_path_inside(tmp_path):
+    assert build_dcc.unit_path(str(tmp_path), "DCC/20.0/Win64") == os.path.join(str(tmp_path), "DCC", "20.0", "Win64")
+
+def test_coordinator_address():
+    assert dcc_coordinator.coordinator_address("8765", None) == ("127.0.0.1", 8765)
+    assert dcc_coordinator.coordinator_address("localhost:0", None) == ("localhost", 0)
+    assert dcc_coordinator.coordinator_address("0.0.0.0:8765", "s3cret") == ("0.0.0.0", 8765)
+    with pytest.raises(SystemExit):
+        dcc_coordinator.coordinator_address("0.0.0.0:8765", None)
+    with pytest.raises(SystemExit):
+        dcc_coordinator.coordinator_address("host:port", "s3cret")
+
+def unit_coordinator(tmp_path, token=""):
+    target = {"comp_id": "DCC290", "platform": "Win32", "config": "Debug", "label": "DCC290 | Win32",
+              "defines": [], "openssl_versions": [], "strategy": "Built", "leg_strategy": {},
+              "out_dir": str(tmp_path / "DCC290"), "log_file": str(tmp_path / "DCC290" / "build.log")}
+    cfg = {"projects": [], "distributed": {"token": token}}
+    return dcc_coordinator.Coordinator([target], cfg, set(), {"build_dir": str(tmp_path), "build_id": "b1"},
+                                 ("127.0.0.1", 0))
+
+def test_result_of_another_workers_lease_is_rejected(tmp_path):
+    coordinator = unit_coordinator(tmp_path)
+    owner = coordinator.register({"name": "wa", "compilers": ["DCC290"]})[1]["worker"]
+    other = coordinator.register({"name": "wb", "compilers": ["DCC290"]})[1]["worker"]
+    lease_id = coordinator.lease({"worker": owner})[1]["lease"]
+
+    assert coordinator.result(lease_id, other, b"")[0] == 403
+    assert lease_id in coordinator.leases
+    assert coordinator.result("unknown", owner, b"")[0] == 409
+
+def test_done_is_acknowledged_by_every_worker(tmp_path):
+    coordinator = unit_coordinator(tmp_path)
+    workers = [coordinator.register({"name": name, "compilers": ["DCC290"]})[1]["worker"] for name in ("wa", "wb")]
+    coordinator.finish("0", "Error")
+    assert coordinator.lease({"worker": workers[0]}) == (200, {"done": True})
+    assert set(coordinator.workers) - coordinator.finished == {workers[1]}
+    assert coordinator.lease({"worker": "stranger"}) == (200, {"done": True})
+    coordinator.lease({"worker": workers[1]})
+    assert not set(coordinator.workers) - coordinator.finished
+
+def test_requests_are_checked_before_the_body_is_read(tmp_path):
+    coordinator = unit_coordinator(tmp_path, token="s3cret")
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), dcc_coordinator.coordinator_handler(coordinator))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(headers):
+        # Announces a body that never comes: the reply must not wait for it
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+        try:
+            connection.putrequest("POST", "/register")
+            for name, value in headers.items():
+                connection.putheader(name, value)
+            connection.endheaders()
+            return connection.getresponse().status
+        finally:
+            connection.close()
+    try:
+        assert post({"Content-Length": "100"}) == 403
+        assert post({"Content-Length": "100", "X-Build-Token": "wrong"}) == 403
+        assert post({"Content-Length": str(dcc_coordinator.DIST_MAX_MESSAGE + 1), "X-Build-Token": "s3cret"}) == 413
+        assert post({"Content-Length": "x", "X-Build-Token": "s3cret"}) == 400
+        assert not coordinator.workers
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,48 @@
+import os
+import time
+
+import build_dcc
+import dcc_history
+import dcc_store
+
+DAY = 86400
+
+def make_run(root, build_id, age_days):
+    path = root / build_id
+    (path / "logs").mkdir(parents=True)
+    (path / "logs" / "build.log").write_text(build_id)
+    started = time.time() - age_days * DAY
+    os.utime(path, (started, started))
+    return started
+
+def collect(root, history, **retention):
+    dcc_store.collect_garbage(str(root), history, dcc_store.ArtifactStore(str(root / "_store")), retention)
+    return sorted(name for name in os.listdir(root) if not name.startswith("_"))
+
+def test_runs_are_kept_per_branch(tmp_path):
+    root = tmp_path / "_build"
+    history = dcc_history.RunHistory(str(root / "_cache" / "history.db"))
+    for i, (branch, success) in enumerate([("main", True), ("main", False), ("main", True), ("feature", True)]):
+        build_id = f"2026010{i}_120000_{branch}_AB1{i}"
+        history.save(build_id, branch, make_run(root, build_id, 10 - i), 1.0, success, "Debug")
+
+    assert collect(root, history, keep_runs=1, keep_failed_days=30) == \
+        ["20260101_120000_main_AB11", "20260102_120000_main_AB12", "20260103_120000_feature_AB13"]
+    assert collect(root, history, keep_runs=1) == ["20260102_120000_main_AB12", "20260103_120000_feature_AB13"]
+
+def test_runs_missing_from_the_history_are_unknown(tmp_path):
+    root = tmp_path / "_build"
+    history = dcc_history.RunHistory(str(root / "_cache" / "history.db"))
+    history.save("20260105_120000_main_AB10", "main", make_run(root, "20260105_120000_main_AB10", 1), 1.0, True, "Debug")
+    # Interrupted runs: not recorded, so neither successful nor of another branch
+    make_run(root, "20260101_120000_main_CD10", 5)
+    make_run(root, "20260102_120000_release_1.2_CD11", 4)
+    make_run(root, "20260103_120000_release_1.2_CD12", 3)
+    make_run(root, "copied_by_hand", 40)
+
+    assert collect(root, history, keep_runs=1, keep_failed_days=2) == \
+        ["20260103_120000_release_1.2_CD12", "20260105_120000_main_AB10", "copied_by_hand"]
+    assert collect(root, history, max_size_gb=1e-9) == \
+        ["20260103_120000_release_1.2_CD12", "20260105_120000_main_AB10", "copied_by_hand"]
+    assert build_dcc.build_id_branch("20260102_120000_release_1.2_CD11") == "release_1.2"
+    assert build_dcc.build_id_branch("copied_by_hand") is None
@@ -0,0 +1,75 @@
+import dcc_history
+
+STEP = "DCC290 | Win32 | Test_API"
+
+def add_run(db_path, build_id, started, duration, branch="main", status="Passed", kind="test", step=STEP):
+    history = dcc_history.RunHistory(str(db_path))
+    history.record(kind, step, status, duration, "DCC290", "Win32", "Debug", "Test_API")
+    history.save(build_id, branch, started, duration, status == "Passed", "Debug")
+
+def test_regression_against_median_of_earlier_runs(tmp_path):
+    db = tmp_path / "_cache" / "history.db"
+    for i, duration in enumerate([10.0, 12.0, 11.0]):
+        add_run(db, f"b{i}", i, duration)
+    add_run(db, "slow", 10, 15.0)
+
+    run, found = dcc_history.RunHistory(str(db)).regressions("slow", threshold=25.0)
+    assert run["build_id"] == "slow" and run["branch"] == "main"
+    assert [(r["step"], r["baseline"], r["duration"]) for r in found] == [(STEP, 11.0, 15.0)]
+    assert round(found[0]["change"]) == 36
+
+    # Below the threshold, or the first runs without a baseline
+    assert dcc_history.RunHistory(str(db)).regressions("slow", threshold=40.0)[1] == []
+    assert dcc_history.RunHistory(str(db)).regressions("b2")[1] == []
+
+def test_same_branch_baseline_is_preferred(tmp_path):
+    db = tmp_path / "history.db"
+    for i in range(3):
+        add_run(db, f"main{i}", i, 20.0)
+        add_run(db, f"feat{i}", 10 + i, 10.0, branch="feature")
+    add_run(db, "feat-new", 20, 15.0, branch="feature")
+    add_run(db, "other-new", 21, 15.0, branch="other")
+
+    history = dcc_history.RunHistory(str(db))
+    # 10s on its own branch, although main took 20s
+    assert [r["baseline"] for r in history.regressions("feat-new")[1]] == [10.0]
+    # No runs of its own branch: falls back to the latest runs of any branch
+    assert history.regressions("other-new")[1] == []
+
+def test_small_changes_and_failed_steps_are_ignored(tmp_path):
+    db = tmp_path / "history.db"
+    for i in range(3):
+        add_run(db, f"b{i}", i, 1.0)
+    add_run(db, "noise", 10, 1.9)
+    add_run(db, "failed", 11, 30.0, status="Failed")
+
+    history = dcc_history.RunHistory(str(db))
+    assert history.regressions("noise")[1] == []  # +90%, but below REGRESSION_MIN_SECONDS
+    assert history.regressions("failed")[1] == []
+    assert history.regressions("unknown") == (None, [])
+
+def test_estimates_use_recent_successful_runs(tmp_path):
+    db = tmp_path / "history.db"
+    for i in range(dcc_history.HISTORY_ESTIMATE_RUNS):
+        add_run(db, f"new{i}", 100 + i, 4.0)
+    add_run(db, "old", 0, 100.0)
+    add_run(db, "failed", 200, 50.0, status="Failed")
+    add_run(db, "build", 201, 3.0, kind="build", status="Built", step="DCC290 | Win32 | Ossl4Pas_rt")
+
+    history = dcc_history.RunHistory(str(db))
+    assert history.estimate("test", STEP) == 4.0
+    assert history.estimate("test", "missing", 7) == 7
+    assert history.estimate_target("DCC290 | Win32") == 7.0
+    assert history.estimate_target("DCC290 | Win64") == 0
+
+def test_reading_creates_no_database(tmp_path):
+    db = tmp_path / "_cache" / "history.db"
+    history = dcc_history.RunHistory(str(db))
+    assert history.latest_run() is None
+    assert history.runs() == {}
+    assert history.regressions("b1") == (None, [])
+    assert history.estimate_target("DCC290 | Win32") == 0
+    assert not (tmp_path / "_cache").exists()
+
+    add_run(db, "b1", 0, 10.0)
+    assert dcc_history.RunHistory(str(db)).latest_run() == "b1"
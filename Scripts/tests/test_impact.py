@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import build_dcc
+
+FILES = {
+    "Source/Core.pas": "unit Core;\n\ninterface\n\nuses SysUtils;\n\nimplementation\n\nend.\n",
+    "Source/Ext.pas": "unit Ext;\n\n{$I Ext.inc}\n\ninterface\n\nuses\n  Core, // the base\n  Classes;\n\nimplementation\n\nend.\n",
+    "Source/Ext.inc": "{$DEFINE EXT}\n",
+    "Source/Other.pas": "unit Other;\n\ninterface\n\n{ uses Core; is only a comment }\n\nimplementation\n\nend.\n",
+    "Tests/TestA/TestA.dproj": "<Project><MainSource>TestA.dpr</MainSource></Project>\n",
+    "Tests/TestA/TestA.dpr": "program TestA;\n\nuses\n  Ext in '..\\..\\Source\\Ext.pas';\n\nbegin\nend.\n",
+    "Tests/TestB/TestB.dproj": "<Project><MainSource>TestB.dpr</MainSource></Project>\n",
+    "Tests/TestB/TestB.dpr": "program TestB;\n\nuses\n  {$IFDEF LEGACY} Core, {$ENDIF}\n  Other;\n\nbegin\nend.\n",
+}
+
+PROJECTS = [{"name": "TestA", "path": "Tests/TestA/TestA.dproj"},
+            {"name": "TestB", "path": "Tests/TestB/TestB.dproj"},
+            {"name": "TestC", "path": "Tests/{compiler}/TestC.dproj"}]
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for rel, text in FILES.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def index_of(repo):
+    return build_dcc.load_unit_index(str(repo / "_cache" / "unit_index.json"), ["Source", "Tests"])
+
+def changed(*rel_paths):
+    return {os.path.normcase(os.path.abspath(p)) for p in rel_paths}
+
+def test_parse_uses_includes_and_all_branches(repo):
+    assert build_dcc.parse_pascal_file("Source/Ext.pas") == {"uses": [["Core", None], ["Classes", None]],
+                                                             "includes": ["Ext.inc"]}
+    assert build_dcc.parse_pascal_file("Source/Other.pas")["uses"] == []
+    assert build_dcc.parse_pascal_file("Tests/TestB/TestB.dpr")["uses"] == [["Core", None], ["Other", None]]
+
+@pytest.mark.parametrize("files, expected", [
+    (["Source/Ext.inc"], {"TestA"}),
+    (["Source/Core.pas"], {"TestA", "TestB"}),
+    (["Source/Other.pas"], {"TestB"}),
+    (["Tests/TestA/TestA.dproj"], {"TestA"}),
+    (["Readme.md"], set()),
+])
+def test_impacted_projects(repo, files, expected):
+    assert build_dcc.impacted_projects(PROJECTS, {}, changed(*files), index_of(repo)) == expected
+
+def test_config_change_impacts_everything(repo):
+    assert build_dcc.impacted_projects(PROJECTS, {}, changed("build_config_dcc.json"), index_of(repo),
+                                       always_all=["build_config_dcc.json"]) == {"TestA", "TestB", "TestC"}
+
+def test_index_reparses_only_changed_content(repo, monkeypatch):
+    index_of(repo)
+    parsed = []
+    parse = build_dcc.parse_pascal_file
+    monkeypatch.setattr(build_dcc, "parse_pascal_file", lambda path: parsed.append(path) or parse(path))
+
+    index_of(repo)
+    assert parsed == []
+    # A new mtime with the same content is only re-hashed
+    os.utime("Source/Core.pas", (1, 1))
+    index_of(repo)
+    assert parsed == []
+    (repo / "Source" / "Other.pas").write_text("unit Other;\n\ninterface\n\nuses Core;\n\nimplementation\n\nend.\n")
+    index = index_of(repo)
+    assert parsed == [os.path.abspath("Source/Other.pas")]
+    assert build_dcc.impacted_projects(PROJECTS, {}, changed("Source/Core.pas"), index) == {"TestA", "TestB"}
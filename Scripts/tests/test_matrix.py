@@ -0,0 +1,79 @@
+import itertools
+
+import build_dcc
+
+DIMS = [("compiler", ["D11", "D12"]),
+        ("platform", ["Win32", "Win64"]),
+        ("config", ["Debug", "Release"]),
+        ("defines", [""]),
+        ("openssl", ["1.1.1", "3.0", "3.5"])]
+
+def config(**matrix):
+    return {"platforms": ["Win32", "Win64"], "default_config": "Debug",
+            "dependencies": {"openssl_versions": ["1.1.1", "3.0", "3.5"]},
+            "matrix": dict(matrix, dimensions={"config": ["Debug", "Release"]})}
+
+def all_pairs(dims):
+    return {(a, va, b, vb) for (a, avs), (b, bvs) in itertools.combinations(dims, 2)
+            for va in avs for vb in bvs}
+
+def covered(rows, dims):
+    names = [d for d, _ in dims]
+    return {(a, row[a], b, row[b]) for row in rows for a, b in itertools.combinations(names, 2)}
+
+def plain(combo):
+    return {k: v for k, v in combo.items() if k != "strategy"}
+
+def test_pairwise_covers_every_pair():
+    rows = build_dcc.pairwise_rows(DIMS)
+    assert covered([r for r, _ in rows], DIMS) == all_pairs(DIMS)
+    assert len(rows) < 2 * 2 * 2 * 3
+    assert all(not pinned for _, pinned in rows)
+    assert rows == build_dcc.pairwise_rows(DIMS)
+
+def test_pairwise_pins_come_first_and_are_completed():
+    pins = [{"compiler": "D12", "openssl": "3.5"}, {"platform": "Win32", "config": "Release"}]
+    rows = build_dcc.pairwise_rows(DIMS, pins)
+    assert [pinned for _, pinned in rows[:2]] == [True, True]
+    assert not any(pinned for _, pinned in rows[2:])
+    for (row, _), pin in zip(rows, pins):
+        assert set(row) == {d for d, _ in DIMS}
+        assert build_dcc.matches(row, pin)
+    assert covered([r for r, _ in rows], DIMS) == all_pairs(DIMS)
+
+def test_full_strategy_is_the_whole_product():
+    combos, dims, define_sets = build_dcc.expand_matrix(config(), ["D11", "D12"])
+    assert dims == DIMS
+    assert define_sets == {"": []}
+    assert len(combos) == 24
+    assert {c["strategy"] for c in combos} == {"full"}
+    # Report order follows the dimension values
+    assert plain(combos[0]) == {"compiler": "D11", "platform": "Win32", "config": "Debug", "defines": "",
+                                "openssl": "1.1.1"}
+    assert plain(combos[-1]) == {"compiler": "D12", "platform": "Win64", "config": "Release", "defines": "",
+                                 "openssl": "3.5"}
+
+def test_pinned_combinations_always_run():
+    pins = [{"compiler": "D12", "platform": "Win64", "openssl": "3.5"}, {"compiler": "D13"}]
+    combos, _, _ = build_dcc.expand_matrix(config(strategy="pairwise", pinned=pins), ["D11", "D12"])
+    pinned = [c for c in combos if c["strategy"] == "pinned"]
+    assert len(pinned) == 1 and build_dcc.matches(pinned[0], pins[0])
+    assert covered(combos, DIMS) == all_pairs(DIMS)
+
+def test_sample_is_seeded_and_sized():
+    pin = {"compiler": "D12", "platform": "Win64", "config": "Release", "openssl": "3.5"}
+    cfg = config(strategy="sample", sample=6, seed=7, pinned=[pin, {"compiler": "D11"}, dict(pin)])
+    combos, _, _ = build_dcc.expand_matrix(cfg, ["D11", "D12"])
+    assert combos == build_dcc.expand_matrix(cfg, ["D11", "D12"])[0]
+    assert len(combos) == 6
+    pinned = [c for c in combos if c["strategy"] == "pinned"]
+    assert len(pinned) == 2  # the repeated pin runs once
+    assert any(build_dcc.matches(c, pin) for c in pinned)
+    assert any(c["compiler"] == "D11" for c in pinned)
+    assert len({tuple(plain(c).items()) for c in combos}) == len(combos)
+
+    other, _, _ = build_dcc.expand_matrix(dict(cfg, matrix=dict(cfg["matrix"], seed=8)), ["D11", "D12"])
+    assert [plain(c) for c in other] != [plain(c) for c in combos]
+
+    everything, _, _ = build_dcc.expand_matrix(config(strategy="sample", sample=100), ["D11", "D12"])
+    assert len(everything) == 24
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import build_dcc
+
+DEPS = {"openssl_root": os.path.join("lib", "openssl", "{version}", "{platform}", "shared")}
+LIBRARIES = ["shared/libcrypto-3-x64.dll", "shared/libssl-3-x64.dll"]
+
+@pytest.fixture
+def libs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    shared = tmp_path / "lib" / "openssl" / "3.0" / "Win64" / "shared"
+    shared.mkdir(parents=True)
+    for lib in LIBRARIES:
+        (shared.parent / lib).write_text("")
+    return tmp_path
+
+def index(**entry):
+    return {"installed": {"3.0": {"Win64": dict({"libraries": LIBRARIES}, **entry)}}}
+
+def check(idx, version="3.0", platform="Win64", deps=DEPS):
+    return build_dcc.check_openssl_leg(deps, idx, build_dcc.openssl_index_path(deps), version, platform)
+
+def test_index_path_next_to_the_versions(libs):
+    assert build_dcc.openssl_index_path(DEPS) == str(libs / "lib" / "openssl" / "index.json")
+    assert build_dcc.openssl_index_path({"openssl_root": "lib/openssl/shared"}) is None
+
+def test_installed_leg(libs):
+    assert check(index()) == (None, None)
+    assert check(index(version_txt="3.0")) == (None, None)
+
+def test_version_txt_mismatch_is_a_note(libs):
+    assert check(index(version_txt="3.0.19")) == (None, "version.txt says 3.0.19")
+
+def test_leg_not_in_the_index(libs):
+    assert check(index(), platform="Win32") == ("not installed", None)
+    assert check(index(), version="3.5") == ("not installed", None)
+
+def test_missing_libraries(libs):
+    os.remove(libs / "lib" / "openssl" / "3.0" / "Win64" / "shared" / "libssl-3-x64.dll")
+    problem, _ = check(index())
+    assert problem == "1 of 2 libraries missing (e.g. shared/libssl-3-x64.dll)"
+    # Only the libraries below the leg folder of the template count
+    problem, _ = check(index(libraries=["static/libcrypto.lib"]))
+    assert problem.startswith("no shared libraries in ")
+
+def test_without_index_the_folder_is_checked(libs):
+    assert check(None) == (None, None)
+    problem, _ = check(None, platform="Win32")
+    assert problem.endswith("is missing or empty")
+
+def test_other_layouts_and_variables(libs):
+    # A template outside the <version>\<platform> layout of the index: folder check only
+    deps = {"openssl_root": os.path.join("lib", "openssl", "{version}", "{platform}", "shared"),
+            "openssl_index": str(libs / "elsewhere" / "index.json")}
+    assert check(index(), deps=deps) == (None, None)
+    assert check(index(), platform="Win32", deps=deps)[0].endswith("is missing or empty")
+    # Other template variables cannot be checked before the build
+    assert check(index(), deps={"openssl_root": "lib/{compiler}/{version}"}) == (None, None)
+
+def test_available_versions(libs):
+    idx = {"installed": {"3.0": {"Win64": {"libraries": LIBRARIES}, "Win32": {"libraries": LIBRARIES}}}}
+    assert build_dcc.available_openssl(DEPS, idx, build_dcc.openssl_index_path(DEPS)) == {"Win64": ["3.0"]}
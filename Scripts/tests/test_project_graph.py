@@ -0,0 +1,37 @@
+import build_dcc
+
+def project(name, depends_on=(), tags=()):
+    return {"name": name, "path": f"Projects/{name}/{name}.dproj", "depends_on": list(depends_on), "tags": list(tags)}
+
+def names(projects):
+    return [p["name"] for p in projects]
+
+def test_valid_graph():
+    projects = [project("Core"), project("Ext", ["Core"]), project("Tests", ["Core", "Ext"])]
+    assert build_dcc.validate_project_graph(projects) == []
+
+def test_unknown_dependency():
+    errors = build_dcc.validate_project_graph([project("Core"), project("Tests", ["Core", "Mocks"])])
+    assert errors == ["Project 'Tests' depends on unknown project 'Mocks'"]
+
+def test_cycle():
+    projects = [project("Core"), project("A", ["Core", "C"]), project("B", ["A"]), project("C", ["B"]),
+                project("Tests", ["Core"])]
+    errors = build_dcc.validate_project_graph(projects)
+    assert len(errors) == 1
+    assert errors[0].startswith("Dependency cycle between projects: ")
+    assert set(errors[0].split(": ")[1].split(", ")) == {"A", "B", "C"}
+
+def test_self_dependency_is_a_cycle():
+    assert build_dcc.validate_project_graph([project("Core", ["Core"])]) != []
+
+def test_select_without_tags_keeps_everything_in_config_order():
+    projects = [project("Tests", ["Core"]), project("Core"), project("Tool")]
+    assert names(build_dcc.select_projects(projects, set())) == ["Tests", "Core", "Tool"]
+
+def test_select_pulls_in_prerequisites_of_tagged_projects():
+    projects = [project("Core"), project("Ext", ["Core"]), project("Tool"),
+                project("Tests", ["Ext"], tags=["tests"]), project("Other", tags=["other"])]
+    assert names(build_dcc.select_projects(projects, {"tests"})) == ["Core", "Ext", "Tests"]
+    assert names(build_dcc.select_projects(projects, {"tests", "other"})) == ["Core", "Ext", "Tests", "Other"]
+    assert build_dcc.select_projects(projects, {"none"}) == []
@@ -0,0 +1,109 @@
+import xml.etree.ElementTree as ET
+
+import build_dcc
+
+NUNIT = """<?xml version="1.0" encoding="UTF-8"?>
+<test-results total="5" failures="1" errors="1" not-run="1">
+  <test-suite type="Assembly" name="Test_API.exe" executed="True" success="False" time="{total}">
+    <results>
+      <test-suite type="Namespace" name="Ossl4Pas.Tests" executed="True" success="False">
+        <results>
+          <test-suite type="TestFixture" name="TTestApi" executed="True" success="False">
+            <results>
+              <test-case name="Ossl4Pas.Tests.TTestApi.TestLoad" executed="True" result="Success" success="True" time="{load}"/>
+              <test-case name="Ossl4Pas.Tests.TTestApi.TestVersion" executed="True" result="Failure" success="False" time="0,250">
+                <failure><message><![CDATA[Expected 3.0 <but> was 1.1]]></message></failure>
+              </test-case>
+              <test-case name="Ossl4Pas.Tests.TTestApi.TestCrash" executed="True" result="Error" success="False" time="0.010">
+                <failure><message>Access violation</message></failure>
+              </test-case>
+            </results>
+          </test-suite>
+          <test-suite type="TestFixture" name="TTestDigest" executed="True" success="True">
+            <results>
+              <test-case name="Ossl4Pas.Tests.TTestDigest.TestSha256" executed="True" result="Success" success="True" time="0.040"/>
+              <test-case name="Ossl4Pas.Tests.TTestDigest.TestLegacy" executed="False" result="Ignored" success="True" time="0">
+                <reason><message>No legacy provider</message></reason>
+              </test-case>
+            </results>
+          </test-suite>
+        </results>
+      </test-suite>
+    </results>
+  </test-suite>
+</test-results>
+"""
+
+def write_xml(tmp_path, name, load="1.500"):
+    path = tmp_path / name
+    path.write_text(NUNIT.format(total="1.8", load=load), encoding="utf-8")
+    return str(path)
+
+def test_iter_nunit_results(tmp_path):
+    cases = list(build_dcc.iter_nunit_results(write_xml(tmp_path, "a.xml")))
+    assert [(c["fixture"], c["status"]) for c in cases] == [
+        ("TTestApi", "passed"), ("TTestApi", "failed"), ("TTestApi", "error"),
+        ("TTestDigest", "passed"), ("TTestDigest", "skipped")]
+    assert cases[1]["time"] == 0.25
+    assert {c["class"] for c in cases} == {"Ossl4Pas.Tests.TTestApi", "Ossl4Pas.Tests.TTestDigest"}
+    assert cases[1]["message"] == "Expected 3.0 <but> was 1.1"
+    assert cases[4]["message"] == "No legacy provider"
+
+def test_runs_are_merged(tmp_path):
+    results = build_dcc.TestResults(str(tmp_path / "work"), slowest=2)
+    first = results.add_run("Test_API [3.0]", "Test_API", "3.0", [write_xml(tmp_path, "a.xml")], project="Test_API")
+    results.add_run("Test_API [3.5]", "Test_API", "3.5", [write_xml(tmp_path, "b.xml", load="3.000")])
+    assert results.add_run("Test_API [1.1]", "Test_API", "1.1", [str(tmp_path / "missing.xml")]) is None
+
+    assert {k: first[k] for k in ("tests", "failures", "errors", "skipped")} == \
+        {"tests": 5, "failures": 1, "errors": 1, "skipped": 1}
+    assert round(first["time"], 3) == 1.8
+    assert [name for _, _, name in sorted(results.slowest, reverse=True)] == \
+        ["Ossl4Pas.Tests.TTestApi.TestLoad"] * 2
+    assert results.failures[("Test_API [3.0]", "TTestApi")]["count"] == 2
+    assert results.durations[("Test_API", "TTestApi")] == {"3.0": 1.76, "3.5": 3.26}
+
+def test_write_junit(tmp_path):
+    work_dir = tmp_path / "work"
+    results = build_dcc.TestResults(str(work_dir))
+    results.add_run("Test_API [3.0]", "Test_API", "3.0", [write_xml(tmp_path, "a.xml")])
+    results.add_run("Test_API [3.5]", "Test_API", "3.5", [write_xml(tmp_path, "b.xml")])
+
+    out = tmp_path / "junit.xml"
+    results.write_junit(str(out), ["Test_API [3.5]", "Test_API [3.0]", "Test_API [1.1]"])
+    root = ET.parse(out).getroot()
+    assert {k: root.get(k) for k in ("tests", "failures", "errors", "skipped")} == \
+        {"tests": "10", "failures": "2", "errors": "2", "skipped": "2"}
+    assert [s.get("name") for s in root] == ["Test_API [3.5]", "Test_API [3.0]"]
+    cases = root[0].findall("testcase")
+    assert len(cases) == 5
+    assert cases[1].find("failure").get("message") == "Expected 3.0 <but> was 1.1"
+    assert cases[2].find("error") is not None
+    assert cases[4].find("skipped") is not None
+    assert not work_dir.exists()
+
+def test_shards_form_one_run(tmp_path):
+    results = build_dcc.TestResults(str(tmp_path / "work"))
+    shards = [write_xml(tmp_path, "shard1.xml"), write_xml(tmp_path, "shard2.xml", load="2.000"),
+              str(tmp_path / "shard3.xml")]
+    (tmp_path / "shard3.xml").write_text("<test-results><test-suite", encoding="utf-8")
+    summary = results.add_run("Test_API [3.0]", "Test_API", "3.0", shards, project="Test_API")
+    assert (summary["tests"], summary["failures"]) == (10, 2)
+    assert list(results.runs) == ["Test_API [3.0]"]
+    # Both shards ran TTestApi: its time in the run, kept for shard balancing
+    assert round(results.fixture_times["Test_API"]["Ossl4Pas.Tests.TTestApi"], 2) == 4.02
+
+def test_shards_balance_by_unit_and_class():
+    fixtures = ["UnitA.TTestSlow", "UnitB.TTestSlow", "UnitA.TTestFast", "UnitB.TTestFast"]
+    # Same class name in two units: each one keeps its own time
+    times = {"UnitA.TTestSlow": 10.0, "UnitB.TTestSlow": 1.0, "UnitA.TTestFast": 9.0, "UnitB.TTestFast": 1.0}
+    assert build_dcc.plan_shards(fixtures, 2, times) == [["UnitA.TTestSlow", "UnitB.TTestSlow"],
+                                                         ["UnitA.TTestFast", "UnitB.TTestFast"]]
+
+def test_fixtures_missing_from_their_shard(tmp_path):
+    plan = [["Ossl4Pas.Tests.TTestApi", "Ossl4Pas.Tests.TTestDigest"], ["Ossl4Pas.Tests.TTestCipher"]]
+    assert build_dcc.shard_coverage_gaps(plan, [write_xml(tmp_path, "shard1.xml"), None]) == \
+        ["Ossl4Pas.Tests.TTestCipher"]
+    plan = [["Ossl4Pas.Tests.TTestApi"], ["Ossl4Pas.Tests.TTestDigest", "Other.TTestApi"]]
+    assert build_dcc.shard_coverage_gaps(plan, [write_xml(tmp_path, "shard1.xml"), write_xml(tmp_path, "shard2.xml")]) == \
+        ["Other.TTestApi"]
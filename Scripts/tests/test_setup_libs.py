@@ -0,0 +1,143 @@
+import os
+import hashlib
+import threading
+import http.server
+
+import pytest
+
+import setup_libs
+
+PAYLOAD = bytes(range(256)) * 1024  # 256 KiB
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves 'payload' at any path with the ETag 'etag', honouring
+    "Range: bytes=N-" (with a matching If-Range) unless the server ignores
+    ranges, and closing the connection after 'send_limit' bytes.
+    """
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get("Range"))
+        self.server.if_ranges.append(self.headers.get("If-Range"))
+        payload = self.server.payload
+        start = 0
+        value = self.headers.get("Range")
+        if value and self.server.honour_range and self.headers.get("If-Range", self.server.etag) == self.server.etag:
+            start = int(value[len("bytes="):].rstrip("-"))
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        body = payload[start:]
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # A dropped connection: fewer bytes than announced
+        self.wfile.write(body[:self.server.send_limit])
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.ranges = []
+    httpd.if_ranges = []
+    httpd.payload = PAYLOAD
+    httpd.etag = '"v1"'
+    httpd.honour_range = True
+    httpd.send_limit = None
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url_of(server):
+    return f"http://127.0.0.1:{server.server_port}/openssl.zip"
+
+def partial_sink(tmp_path, size, validator='"v1"'):
+    part_path = str(tmp_path / "openssl.zip.part")
+    with open(part_path, "wb") as f:
+        f.write(PAYLOAD[:size])
+    return setup_libs.ArchiveSink(part_path, spool_limit=0, validator=validator)
+
+def content(sink):
+    sink.file.seek(0)
+    return sink.file.read()
+
+def test_fetch_resumes_part_file(server, tmp_path):
+    sink = partial_sink(tmp_path, 1000)
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.ranges == ["bytes=1000-"]
+    assert server.if_ranges == ['"v1"']
+    assert content(sink) == PAYLOAD
+    # The digest covers the bytes of the previous run as well
+    assert sink.sha256.hexdigest() == hashlib.sha256(PAYLOAD).hexdigest()
+    sink.close()
+
+def test_fetch_restarts_when_range_ignored(server, tmp_path):
+    server.honour_range = False
+    sink = partial_sink(tmp_path, 1000)
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.ranges == ["bytes=1000-"]
+    assert content(sink) == PAYLOAD
+    sink.close()
+
+def test_fetch_dropped_connection_then_resume(server, tmp_path):
+    server.send_limit = 5000
+    sink = setup_libs.ArchiveSink(str(tmp_path / "openssl.zip.part"), spool_limit=0)
+    with pytest.raises(IOError):
+        setup_libs.fetch_into(url_of(server), sink)
+    assert sink.size() == 5000
+    server.send_limit = None
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.ranges == [None, "bytes=5000-"]
+    assert server.if_ranges == [None, '"v1"']
+    assert content(sink) == PAYLOAD
+    sink.close()
+
+def test_fetch_restarts_when_file_changed(server, tmp_path):
+    # Released again since the partial download: If-Range fails, the new file comes whole
+    server.payload = PAYLOAD[::-1]
+    server.etag = '"v2"'
+    sink = partial_sink(tmp_path, 1000)
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.if_ranges == ['"v1"']
+    assert content(sink) == PAYLOAD[::-1]
+    assert sink.sha256.hexdigest() == hashlib.sha256(PAYLOAD[::-1]).hexdigest()
+    assert sink.validator == '"v2"'
+    sink.close()
+
+def test_fetch_restarts_without_validator(server, tmp_path):
+    sink = partial_sink(tmp_path, 1000, validator=None)
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.ranges == [None]
+    assert content(sink) == PAYLOAD
+    assert sink.validator == '"v1"'
+    sink.close()
+
+def test_response_validator():
+    assert setup_libs.response_validator({"ETag": '"abc"', "Last-Modified": "Tue, 01 Sep 2026 10:00:00 GMT"}) == '"abc"'
+    # Weak ETags are not allowed in If-Range
+    assert setup_libs.response_validator({"ETag": 'W/"abc"', "Last-Modified": "Tue, 01 Sep 2026 10:00:00 GMT"}) == \
+        "Tue, 01 Sep 2026 10:00:00 GMT"
+    assert setup_libs.response_validator({}) is None
+
+def test_fetch_complete_part_file(server, tmp_path):
+    sink = partial_sink(tmp_path, len(PAYLOAD))
+    setup_libs.fetch_into(url_of(server), sink)
+    assert content(sink) == PAYLOAD
+    sink.close()
+
+def test_fetch_small_download_stays_in_memory(server, tmp_path):
+    sink = setup_libs.ArchiveSink(str(tmp_path / "openssl.zip.part"), spool_limit=len(PAYLOAD))
+    setup_libs.fetch_into(url_of(server), sink)
+    assert server.ranges == [None]
+    assert content(sink) == PAYLOAD
+    assert not os.path.exists(sink.part_path)
+    sink.close()
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import build_dcc
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+def run(tmp_path, cmd, **kwargs):
+    with open(tmp_path / "step.log", "w") as log_file:
+        code, usage, stopped, _ = build_dcc.run_child(cmd, log_file, **kwargs)
+    return code, usage, stopped
+
+def test_child_exit_code_and_usage(tmp_path):
+    code, usage, stopped = run(tmp_path, [sys.executable, "-c", "raise SystemExit(3)"])
+    assert (code, stopped) == (3, None)
+    assert "cpu_s" in usage
+    assert build_dcc.outcome_of(code, stopped) == build_dcc.OUTCOME_FAILED
+    assert build_dcc.outcome_of(0, None) == build_dcc.OUTCOME_OK
+
+def test_timeout_kills_the_child(tmp_path):
+    start = time.monotonic()
+    code, _, stopped = run(tmp_path, SLEEPER, timeout=0.3)
+    assert stopped == build_dcc.OUTCOME_TIMEOUT
+    assert code != 0
+    assert time.monotonic() - start < 10
+    assert build_dcc.outcome_of(code, stopped) == build_dcc.OUTCOME_TIMEOUT
+
+@pytest.mark.skipif(os.name == "nt", reason="checks the POSIX process group")
+def test_timeout_kills_the_whole_tree(tmp_path):
+    pid_file = tmp_path / "grandchild.pid"
+    script = ("import subprocess, sys, time\n"
+              "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])\n"
+              f"open({str(pid_file)!r}, 'w').write(str(p.pid))\n"
+              "time.sleep(30)\n")
+    _, _, stopped = run(tmp_path, [sys.executable, "-c", script], timeout=1)
+    assert stopped == build_dcc.OUTCOME_TIMEOUT
+    grandchild = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            with open(f"/proc/{grandchild}/stat") as f:
+                if f.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    break
+        except FileNotFoundError:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("grandchild still running")
+
+def test_cancelled_control_stops_the_child(tmp_path):
+    control = build_dcc.RunControl()
+    threading.Timer(0.3, control.cancel, ("run timeout", build_dcc.OUTCOME_TIMEOUT)).start()
+    _, _, stopped = run(tmp_path, SLEEPER, control=control)
+    assert stopped == build_dcc.OUTCOME_TIMEOUT
+    assert control.reason == "run timeout"
+
+def test_fail_fast_cancels_once(tmp_path):
+    control = build_dcc.RunControl()
+    control.step_failed("Test_API")
+    assert not control.cancelled
+
+    control.fail_fast = True
+    control.step_failed("Test_API")
+    control.step_failed("Test_Ext")
+    assert control.cancelled
+    assert control.outcome == build_dcc.OUTCOME_CANCELLED
+    assert control.reason == "Test_API failed (--fail-fast)"
+
+    _, _, stopped = run(tmp_path, SLEEPER, control=control)
+    assert stopped == build_dcc.OUTCOME_CANCELLED
+
+def test_project_timeouts_override_the_config():
+    cfg = {"timeouts": {"build": 900, "test": 300, "run": 0}}
+    assert build_dcc.step_timeout(cfg, {}, "build") == 900
+    assert build_dcc.step_timeout(cfg, {"timeouts": {"test": 60}}, "test") == 60
+    assert build_dcc.step_timeout(cfg, {"timeouts": {"test": 60}}, "build") == 900
+    assert build_dcc.step_timeout(cfg, {"timeouts": {"test": 0}}, "test") is None
+    assert build_dcc.step_timeout({}, {}, "test") is None
+
+def test_output_is_logged_and_scanned(tmp_path):
+    script = ("print('Unit1.pas(28): error E2003: Undeclared identifier: x [Project1.dproj]')\n"
+              "print('Unit1.pas(28): error E2003: Undeclared identifier: x [Project1.dproj]')\n"
+              "raise SystemExit(1)\n")
+    with open(tmp_path / "step.log", "w") as log_file:
+        code, _, stopped, scanner = build_dcc.run_child([sys.executable, "-c", script], log_file)
+    assert (code, stopped) == (1, None)
+    assert (tmp_path / "step.log").read_text().count("E2003") == 2
+    assert scanner.first_errors() == ["Unit1.pas(28): E2003 Undeclared identifier: x"]
+
+def test_batch_timeout_follows_the_levels():
+    projects = [{"name": "Core"}, {"name": "Ext", "depends_on": ["Core"], "timeouts": {"build": 600}},
+                {"name": "Tools", "depends_on": ["Core"]}, {"name": "Test_API", "depends_on": ["Ext", "Tools"]}]
+    cfg = {"timeouts": {"build": 300}}
+    # Levels: Core, Ext + Tools, Test_API
+    assert build_dcc.batch_timeout(cfg, projects) == 300 + 2 * 600 + 300
+    assert build_dcc.batch_timeout(cfg, projects, jobs=2) == 300 + 600 + 300
+    assert build_dcc.batch_timeout({"timeouts": {"build": 300, "batch": 1000}}, projects) == 1000
+    assert build_dcc.batch_timeout({"timeouts": {"build": 300, "batch": 0}}, projects) is None
+    assert build_dcc.batch_timeout({"timeouts": {"build": 0}}, projects) is None
@@ -0,0 +1,43 @@
+import os
+import copy
+
+import build_dcc
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "traversal_Win64_Debug.proj")
+
+def traversal(cfg, build_id):
+    """Traversal project of every project of 'cfg' for Win64/Debug, as build_batch() writes it."""
+    out_dir = os.path.abspath(os.path.join("_build", build_id, "DCC", "20.0", "Win64"))
+    dcu_dirs = {p["name"]: os.path.join(out_dir, "DCU", p["name"]) for p in cfg["projects"]}
+    text = build_dcc.traversal_project(cfg["projects"], "Win64", "Debug", cfg, out_dir, os.getcwd(), dcu_dirs)
+    # The golden file uses '/', as written on POSIX
+    return text.replace(os.sep, "/")
+
+def golden_config(cfg):
+    """The bench config with search paths, special characters and project env vars."""
+    cfg = copy.deepcopy(cfg)
+    cfg["build_options"]["common"]["search_paths"] = ["Source", "lib/3rd party;x"]
+    cfg["build_options"]["common"]["defines"].append("VER=$(Ver)")
+    projects = cfg["projects"]
+    projects[1]["env_vars"] = {"BENCH_OUT": os.path.abspath("_stage"), "BENCH_MODE": "50%"}
+    return cfg
+
+def test_traversal_matches_golden_file(bench_repo):
+    _, _, cfg = bench_repo
+    with open(GOLDEN, "r", encoding="utf-8") as f:
+        assert traversal(golden_config(cfg), "20260101_000000_main_AAAA") == f.read()
+
+def test_traversal_independent_of_build_id(bench_repo):
+    _, _, cfg = bench_repo
+    cfg = golden_config(cfg)
+    assert traversal(cfg, "20260101_000000_main_AAAA") == traversal(cfg, "20260102_120000_main_BBBB")
+
+def test_traversal_levels_follow_dependencies(bench_repo):
+    _, _, cfg = bench_repo
+    level = {}
+    for number, wave in enumerate(build_dcc.project_waves(cfg["projects"])):
+        for proj in wave:
+            level[proj["name"]] = number
+    assert len(level) == len(cfg["projects"])
+    for proj in cfg["projects"]:
+        assert all(level[d] < level[proj["name"]] for d in proj["depends_on"])